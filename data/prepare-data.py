@@ -1,27 +1,23 @@
 import os
 import re
-import urllib.parse
+import sys
 import json
 
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.masking import masker
+
 # --- CONFIG ---
 INPUT_FOLDER = "../output_logs/_csic_2010_raw"
 OUTPUT_FOLDER = "training_data"
 TARGET_SIZE_KB = 6  # every output jsonl file ~6 KB
 
 def preprocess_log(log_string):
-    """Masking giống lúc training model"""
+    """Masking giống lúc suy luận (dùng chung masker với analyzer và Drain3)"""
     try:
-        # URL decode
-        log_string = urllib.parse.unquote(log_string).strip()
-
-        # Mask Session ID
-        log_string = re.sub(r'(JSESSIONID=)[a-fA-F0-9]{32}', r'\1<UUID>', log_string)
-
-        # Mask Host
-        log_string = re.sub(r'http://[\w\-\.]+:\d+', 'http://<HOST>', log_string)
-        log_string = re.sub(r'Host:\s+[\w\-\.]+:\d+', 'Host: <HOST>', log_string)
-
-        return log_string
+        return masker.mask(log_string).strip()
     except:
         return log_string
 
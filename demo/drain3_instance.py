@@ -1,8 +1,46 @@
+import os
+import time
+from pathlib import Path
+
 from drain3 import TemplateMiner
+from drain3.file_persistence import FilePersistence
 from drain3.template_miner_config import TemplateMinerConfig
 
-CONFIG_PATH = 'drain3.ini'
+ROOT_DIR = Path(__file__).resolve().parent.parent
+CONFIG_PATH = ROOT_DIR / "drain3.ini"
+# Snapshot lúc train LogBERT (chỉ đọc) và state của miner đang chạy (ghi đè định kỳ)
+SEED_STATE_PATH = ROOT_DIR / "models" / "drain3_state.bin"
+LIVE_STATE_PATH = ROOT_DIR / "models" / "drain3_live_state.bin"
+
+
+class SnapshotPersistence(FilePersistence):
+    """
+    Lưu state Drain3 ra file:
+    - Khởi động: đọc state đang chạy, chưa có thì đọc snapshot lúc train (seed_path),
+      seed_path không bao giờ bị ghi đè.
+    - Ghi ra file tạm rồi os.replace, tắt giữa chừng cũng không làm hỏng snapshot cũ.
+    """
+
+    def __init__(self, file_path=LIVE_STATE_PATH, seed_path=SEED_STATE_PATH):
+        super().__init__(str(file_path))
+        self.seed_path = str(seed_path)
+
+    def load_state(self):
+        for path in (self.file_path, self.seed_path):
+            if os.path.exists(path):
+                return Path(path).read_bytes()
+        return None
+
+    def save_state(self, state):
+        tmp_path = self.file_path + ".tmp"
+        Path(tmp_path).write_bytes(state)
+        os.replace(tmp_path, self.file_path)
+
 
 config = TemplateMinerConfig()
-config.load(CONFIG_PATH)
-drain3_instance = TemplateMiner(config=config)
+config.load(str(CONFIG_PATH))
+
+start = time.perf_counter()
+drain3_instance = TemplateMiner(SnapshotPersistence(), config)
+restore_ms = (time.perf_counter() - start) * 1000
+print(f"[Drain3] Khôi phục {len(drain3_instance.drain.clusters)} cluster trong {restore_ms:.1f} ms")
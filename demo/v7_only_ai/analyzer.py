@@ -1,11 +1,10 @@
 import shutil
 import os, time, random, json
 from pathlib import Path
-import requests
 import threading
 import asyncio
 import websockets
-from queue import Queue
+from queue import Empty, Queue
 from dotenv import load_dotenv
 import glob
 from collections import deque
@@ -15,7 +14,7 @@ ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
 
-from src import LogBertAnalyzer, parsing_http_requests, process_log_string, LlmExplainer
+from src import parsing_http_requests, process_log_string, LlmExplainer, RiskRuleWatcher, TemplateMatcher
 
 gemini_explainer = LlmExplainer()
 
@@ -54,6 +53,11 @@ SERVICE_CONCURRENCY = 2  # mỗi service tối đa 2 request đồng thời
 
 service_semaphores = {srv: threading.Semaphore(SERVICE_CONCURRENCY) for srv in SERVICES}
 
+# Kết nối keep-alive tới từng service, pool theo SERVICE_CONCURRENCY (dùng cho cả routing lẫn health check)
+from src.llm_client import AsyncServiceClient, ServiceSessions
+
+llm_sessions = ServiceSessions(SERVICES, SERVICE_CONCURRENCY)
+
 # ==========================
 # CONFIG
 # ==========================
@@ -71,9 +75,20 @@ os.makedirs(MALICIOUS_FOLDER, exist_ok=True)
 os.makedirs(SAFE_FOLDER, exist_ok=True)
 
 
+RISK_RULES_PATH = os.path.join(ROOT_DIR, "risk_rules.json")
+
 UPDATE_CHART_EVERY = 100
 WORKER_COUNT = 4  # số worker xử lý song song
 REQUEST_TIMEOUT = 8  # timeout khi gọi service
+# LLM_DISPATCH: thread (WORKER_COUNT worker, mỗi request LLM giữ 1 thread) | async (aiohttp trên event loop của main_async,
+# tối đa ASYNC_MAX_IN_FLIGHT job cùng lúc, request quá REQUEST_TIMEOUT bị hủy) — xem benchmark_llm_async.py
+LLM_DISPATCH = os.getenv("LLM_DISPATCH", "thread")
+ASYNC_MAX_IN_FLIGHT = int(os.getenv("ASYNC_MAX_IN_FLIGHT", "256"))
+# Tạo trong main_async (phải thuộc event loop đang chạy)
+async_llm_client = None
+# LLM_BATCH_SIZE > 1: mỗi lần gọi LLM phân loại tối đa N request đang chờ (1 prompt đánh số) thay vì 1 request / lần;
+# N thực tế tự co theo LLM_CONTEXT_TOKENS (context của model) — xem benchmark_llm_batch.py
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "1"))
 
 throughput_stats = {
     "tokens": 0,  # tổng số token output
@@ -118,21 +133,15 @@ def log_missed(path, gt, pred, req_text):
 
 
 # ==========================
-# SERVICE HEALTH
+# SERVICE HEALTH + ROUTING
 # ==========================
-service_status = {s: True for s in SERVICES}
-RR = 0
+# Chọn service theo in-flight + EWMA latency / trọng số (src/load_balancer.py), bỏ qua service đang lỗi
+# LLM_ROUTING: p2c (mặc định) | least | round_robin — xem benchmark_llm_balancer.py
+# LLM_WEIGHTS: trọng số theo thứ tự SERVICES (GPU không đều nhau), vd "3,1"
+from src.load_balancer import LoadBalancer
 
-
-def route_smart():
-    """Round-robin thông minh: bỏ qua service đang lỗi."""
-    global RR
-    for _ in range(len(SERVICES)):
-        RR = (RR + 1) % len(SERVICES)
-        srv = SERVICES[RR]
-        if service_status.get(srv, True):
-            return srv
-    return SERVICES[0]  # fallback cuối
+LLM_WEIGHTS = [float(w) for w in os.getenv("LLM_WEIGHTS", "").split(",") if w.strip()] or None
+llm_balancer = LoadBalancer(SERVICES, weights=LLM_WEIGHTS, policy=os.getenv("LLM_ROUTING", "p2c"))
 
 
 # ==========================
@@ -143,11 +152,10 @@ def healthcheck():
         for srv in SERVICES:
             try:
                 # health = GET /
-                url = srv.replace("/api/v1/generate", "/")
-                requests.get(url, timeout=2)
-                service_status[srv] = True
+                llm_sessions.health(srv, timeout=2)
+                llm_balancer.mark(srv, True)
             except:
-                service_status[srv] = False
+                llm_balancer.mark(srv, False)
         time.sleep(5)
 
 
@@ -155,6 +163,7 @@ def healthcheck():
 # MASKING NÂNG CAO
 # ==========================
 import re, urllib.parse, base64
+from src.masking import masker
 
 
 def safe_b64_decode(s):
@@ -164,154 +173,20 @@ def safe_b64_decode(s):
         return s
 
 
-def selective_mask(text):
-    text = text.replace("\r", "").replace("\t", " ")
-    decoded = urllib.parse.unquote(text)
-
-    decoded = re.sub(r"\b\d{1,3}(\.\d{1,3}){3}\b", "<IP>", decoded)
-    decoded = re.sub(
-        r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b",
-        "<UUID>",
-        decoded,
-    )
-    decoded = re.sub(
-        r"(token|sessionid|jwt|auth)=([A-Za-z0-9\-_]{20,})",
-        r"\1=<TOKEN>",
-        decoded,
-        flags=re.IGNORECASE,
-    )
-    decoded = re.sub(r"\b\d{2}:\d{2}:\d{2}\b", "<TIME>", decoded)
-
-    return decoded
-
-
 # ==========================
 # RISK SCORING NÂNG CAO
 # ==========================
+# Rule + ngưỡng HIGH/LOW nằm trong risk_rules.json, sửa file là tự nạp lại (không cần restart)
+risk_rules = RiskRuleWatcher(RISK_RULES_PATH).start()
+
+
 def risk_score_advanced(text):
     """
     Risk scoring nâng cao: rule-based detection.
     Trả về số điểm nguy cơ dựa trên SQLi, XSS, RCE, traversal, scanning.
+    Toàn bộ rule nằm trong risk_rules.json, được biên dịch 1 lần và quét request 1 lần.
     """
-
-    score = 0
-    low = text.lower()
-
-    # ===== SQL Injection =====
-    sql_patterns = [
-        ("' or '1'='1", 8),
-        (" or 1=1", 6),
-        ("union select", 10),
-        ("--", 4),
-        ("sleep(", 6),
-        ("@@version", 4),
-        ("information_schema", 6),
-        ("'||", 3),
-        ("'%20or%20", 6),
-    ]
-    for pat, w in sql_patterns:
-        if pat in low:
-            score += w
-
-    # ===== XSS =====
-    xss_patterns = [
-        ("<script", 10),
-        ("javascript:", 6),
-        ("onerror=", 6),
-        ("onload=", 5),
-        ("<img", 3),
-        ("svg/on", 6),
-    ]
-    for pat, w in xss_patterns:
-        if pat in low:
-            score += w
-
-    # ===== PATH TRAVERSAL =====
-    traversal_patterns = [
-        ("../", 8),
-        ("%2e%2e%2f", 8),
-        ("%2e%2e/", 7),
-        ("/etc/passwd", 10),
-        ("c:\\windows", 7),
-    ]
-    for pat, w in traversal_patterns:
-        if pat in low:
-            score += w
-
-    # ===== COMMAND INJECTION =====
-    cmd_patterns = [
-        (";ls", 8),
-        ("| ls", 8),
-        ("| id", 8),
-        ("| whoami", 8),
-        ("wget http", 6),
-        ("curl http", 6),
-        ("$(id)", 10),
-        ("||", 4),
-    ]
-    for pat, w in cmd_patterns:
-        if pat in low:
-            score += w
-
-    # ===== SCANNING / BRUTEFORCE =====
-    brute_patterns = [
-        ("/phpmyadmin", 5),
-        ("/wp-admin", 5),
-        ("admin", 1),
-        ("login", 1),
-    ]
-
-    ssi_patterns = [
-        ("<!--#exec", 10),
-        ("<!--#include", 10),
-        ("<!--#", 6),
-    ]
-
-    for pat, w in ssi_patterns:
-        if pat in low:
-            score += w
-
-    html_inject_patterns = [
-        ('"><', 8),
-        ("</script>", 8),
-        ("<script", 8),
-    ]
-
-    for pat, w in html_inject_patterns:
-        if pat in low:
-            score += w
-
-    encoded_traversal = [
-        ("%2e%2e%2f", 10),
-        ("%2e%2e/", 10),
-        ("%2e/", 8),
-    ]
-
-    for pat, w in encoded_traversal:
-        if pat in low:
-            score += w
-
-    faulty_body_patterns = [
-        ("precio=", 1),
-        ("B1=", 1),
-    ]
-
-    for pat, w in faulty_body_patterns:
-        if pat in low:
-            score += w
-
-    for pat, w in brute_patterns:
-        if pat in low:
-            score += w
-
-    # ===== RARE HTTP METHODS =====
-    if low.startswith(("trace", "connect", "debug")):
-        score += 10
-
-    if ".jsp/" in low:
-        score += 5
-    
-    return score
+    return risk_rules.current.score(text)
 
 
 # ==========================
@@ -328,41 +203,91 @@ def extract_label_from_line(block):
 # ==========================
 # SMART SEND REQUEST (Retry + Skip + Auto-mark unhealthy)
 # ==========================
-def send_request(prompt, retries=2):
-    payload = {"prompt": prompt, "temperature": 0.0, "top_p": 1.0, "max_length": 32}
+def build_payload(prompt, max_length=32):
+    return {"prompt": prompt, "temperature": 0.0, "top_p": 1.0, "max_length": max_length}
+
+
+def parse_label(text):
+    """Nhãn của prompt đơn: model phải trả đúng 1 trong 3 từ, ngược lại None"""
+    clean = text.strip().lower()
+    # Accept direct output
+    if clean in ("safe", "malicious", "unknown"):
+        return clean
+    return None
+
+
+def read_llm_text(srv, body):
+    """Đọc output KoboldCPP, cập nhật throughput"""
+    text = body["results"][0]["text"].strip()
+    # Estimate token count (approx)
+    token_est = len(text.split())
+    throughput_stats["tokens"] += token_est
+    # print('Token used:', token_est)
+    throughput_stats["requests"] += 1
+
+    print(f"[LLM {srv}] RAW:", repr(text))
+    return text
+
+
+def send_request(prompt, retries=2, max_length=32, parse=parse_label):
+    """parse(text) -> kết quả, None = output không hợp lệ (thử service khác)"""
+    payload = build_payload(prompt, max_length)
 
     for _ in range(retries):
-        srv = route_smart()
+        srv = llm_balancer.acquire()
         sem = service_semaphores[srv]
         # if service is busy, skip to next
         acquired = sem.acquire(timeout=REQUEST_TIMEOUT)
         if not acquired:
+            llm_balancer.release(srv)
             continue
+        latency, ok = None, True
         try:
             start = time.time()
-            resp = requests.post(srv, json=payload, timeout=REQUEST_TIMEOUT)
+            resp = llm_sessions.post(srv, payload, timeout=REQUEST_TIMEOUT)
             latency = time.time() - start
 
             if resp.status_code == 200:
-                text = resp.json()["results"][0]["text"].strip()
-                # Estimate token count (approx)
-                token_est = len(text.split())
-                throughput_stats["tokens"] += token_est
-                # print('Token used:', token_est)
-                throughput_stats["requests"] += 1
+                label = parse(read_llm_text(srv, resp.json()))
+                if label is not None:
+                    return label, latency
+
+        except Exception as e:
+            print(f"[ERROR] {srv}:{e}")
+            llm_balancer.mark(srv, False)
+            ok = False
+        finally:
+            sem.release()
+            llm_balancer.release(srv, latency, ok)
+
+    return None, 0
 
-                clean = text.strip().lower()
-                print(f"[LLM {srv}] RAW:", repr(text))
 
-                # Accept direct output
-                if clean in ("safe", "malicious", "unknown"):
-                    return clean, latency
+async def send_request_async(prompt, retries=2, max_length=32, parse=parse_label):
+    """Bản async của send_request (LLM_DISPATCH=async): giới hạn mỗi service + timeout nằm trong async_llm_client"""
+    payload = build_payload(prompt, max_length)
+
+    for _ in range(retries):
+        srv = llm_balancer.acquire()
+        latency, ok = None, True
+        try:
+            result = await async_llm_client.post(srv, payload)
+            # if service is busy, skip to next
+            if result is None:
+                continue
+            status, body, latency = result
+
+            if status == 200:
+                label = parse(read_llm_text(srv, body))
+                if label is not None:
+                    return label, latency
 
         except Exception as e:
             print(f"[ERROR] {srv}:{e}")
-            service_status[srv] = False
+            llm_balancer.mark(srv, False)
+            ok = False
         finally:
-            sem.release()
+            llm_balancer.release(srv, latency, ok)
 
     return None, 0
 
@@ -370,6 +295,12 @@ def send_request(prompt, retries=2):
 # ==========================
 # PROMPT BUILDERS
 # ==========================
+# Prompt đánh số nhiều request (LLM_BATCH_SIZE > 1) — src/prompt_batch.py
+from src.prompt_batch import CONTEXT_TOKENS, answer_tokens, build_prompt_batch, parse_batch_labels, plan_batches
+
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", str(CONTEXT_TOKENS)))
+
+
 def build_prompt_simple(masked):
     return (
         "Classify the HTTP request.\n"
@@ -380,20 +311,144 @@ def build_prompt_simple(masked):
     )
 
 
+# ==========================
+# LLM VERDICT CACHE
+# ==========================
+# Verdict LLM theo hash(request đã mask + phiên bản prompt): request trùng không gọi LLM lại
+# LLM_CACHE_PATH: file sqlite giữ verdict qua các lần chạy (mặc định chỉ cache trong RAM); LLM_CACHE_SIZE=0 + không path = tắt
+from src.llm_cache import LLM_CACHE_SIZE, LLM_CACHE_TTL, LlmVerdictCache, cache_key, prompt_version
+
+LLM_PROMPT_VERSION = prompt_version(build_prompt_simple("{masked}"), build_prompt_batch(["{masked}"]))
+llm_verdict_cache = LlmVerdictCache(
+    max_size=int(os.getenv("LLM_CACHE_SIZE", str(LLM_CACHE_SIZE))),
+    path=os.getenv("LLM_CACHE_PATH") or None,
+    ttl=float(os.getenv("LLM_CACHE_TTL", str(LLM_CACHE_TTL))),
+)
+
+
+def recall_verdict(masked):
+    """(label, latency của lần gọi LLM gốc, đã chia theo số request nếu gọi theo lô) nếu đã có verdict, ngược lại None"""
+    return llm_verdict_cache.get(cache_key(masked, LLM_PROMPT_VERSION))
+
+
+def remember_verdict(masked, label, latency):
+    # Chỉ lưu nhãn model thật sự trả về (không lưu "unknown" do service lỗi / output sai định dạng)
+    if label in ("safe", "malicious", "unknown"):
+        llm_verdict_cache.put(cache_key(masked, LLM_PROMPT_VERSION), label, latency)
+
+
+def remember_verdicts(entries):
+    for masked, label, latency in entries:
+        remember_verdict(masked, label, latency)
+
+
+def recall_verdicts(req_texts):
+    """Mask + tra cache cho cả lô -> (masked, [verdict hoặc None]); bản async chạy hàm này ngoài event loop (sqlite chặn)"""
+    masked = [masker.mask(r) for r in req_texts]
+    return masked, [recall_verdict(m) for m in masked]
+
+
 # ==========================
 # LLM ANALYSIS PIPELINE
 # ==========================
 def analyze_log(req_text):
-    masked = selective_mask(req_text)
+    return analyze_logs([req_text])[0]
+
 
+def analyze_masked(masked):
     p1 = build_prompt_simple(masked)
     label, lat = send_request(p1)
+    remember_verdict(masked, label, lat)
+
+    if label not in ("safe", "malicious", "unknown"):
+        label = "unknown"
+    return label, lat
+
+
+async def analyze_masked_async(masked):
+    p1 = build_prompt_simple(masked)
+    label, lat = await send_request_async(p1)
+    # Ghi cache (có thể là sqlite) ngoài event loop
+    await asyncio.to_thread(remember_verdict, masked, label, lat)
 
     if label not in ("safe", "malicious", "unknown"):
         label = "unknown"
     return label, lat
 
 
+def batch_parser(n):
+    return lambda text: parse_batch_labels(text, n)
+
+
+def analyze_logs(req_texts):
+    """
+    Phân tích nhiều request, trả về [(label, latency)] cùng thứ tự.
+    Request đã có verdict trong llm_verdict_cache không gọi LLM; request trùng nhau trong lô chỉ hỏi 1 lần.
+    """
+    masked, cached = recall_verdicts(req_texts)
+    misses = list(dict.fromkeys(m for m, v in zip(masked, cached) if v is None))
+    fresh = dict(zip(misses, classify_masked(misses))) if misses else {}
+    return [v if v is not None else fresh[m] for m, v in zip(masked, cached)]
+
+
+async def analyze_logs_async(req_texts):
+    masked, cached = await asyncio.to_thread(recall_verdicts, req_texts)
+    misses = list(dict.fromkeys(m for m, v in zip(masked, cached) if v is None))
+    fresh = dict(zip(misses, await classify_masked_async(misses))) if misses else {}
+    return [v if v is not None else fresh[m] for m, v in zip(masked, cached)]
+
+
+def classify_masked(masked):
+    """
+    Gọi LLM cho các request đã mask, trả về [(label, latency)] cùng thứ tự.
+    LLM_BATCH_SIZE > 1: gom thành prompt đánh số theo ngân sách LLM_CONTEXT_TOKENS;
+    request không đọc được nhãn trong câu trả lời lô thì hỏi lại riêng bằng prompt đơn.
+    """
+    verdicts = [None] * len(masked)
+
+    for group in plan_batches(masked, LLM_CONTEXT_TOKENS, LLM_BATCH_SIZE):
+        if len(group) > 1:
+            labels, lat = send_request(
+                build_prompt_batch([masked[i] for i in group]),
+                max_length=answer_tokens(len(group)),
+                parse=batch_parser(len(group)),
+            )
+            # 1 lần gọi phục vụ cả lô -> mỗi request chỉ tính phần của mình, stats latency không bị nhân lên
+            share = lat / len(group)
+            for i, label in zip(group, labels or ()):
+                if label is not None:
+                    verdicts[i] = (label, share)
+                    remember_verdict(masked[i], label, share)
+        for i in group:
+            if verdicts[i] is None:
+                verdicts[i] = analyze_masked(masked[i])
+    return verdicts
+
+
+async def classify_masked_async(masked):
+    verdicts = [None] * len(masked)
+
+    for group in plan_batches(masked, LLM_CONTEXT_TOKENS, LLM_BATCH_SIZE):
+        if len(group) > 1:
+            labels, lat = await send_request_async(
+                build_prompt_batch([masked[i] for i in group]),
+                max_length=answer_tokens(len(group)),
+                parse=batch_parser(len(group)),
+            )
+            # 1 lần gọi phục vụ cả lô -> mỗi request chỉ tính phần của mình, stats latency không bị nhân lên
+            share = lat / len(group)
+            fresh = []
+            for i, label in zip(group, labels or ()):
+                if label is not None:
+                    verdicts[i] = (label, share)
+                    fresh.append((masked[i], label, share))
+            await asyncio.to_thread(remember_verdicts, fresh)
+        for i in group:
+            if verdicts[i] is None:
+                verdicts[i] = await analyze_masked_async(masked[i])
+    return verdicts
+
+
 # ==========================
 # SPLIT requests from file
 # ==========================
@@ -442,126 +497,230 @@ def split_requests_rfc(content, filename):
 job_queue = Queue(maxsize=500)
 incident_queue = Queue()
 
+# Ngữ cảnh cho file unknown: 4 request trước + request hiện tại
+CONTEXT_REQUESTS = 5
+# LOGBERT_SESSION_WINDOWS=1: ngữ cảnh lấy từ các request cùng session (JSESSIONID / IP / User-Agent)
+# thay vì 4 dòng liền trước trong file (nhiều client xen kẽ nhau)
+sessionizer = None
+if os.getenv("LOGBERT_SESSION_WINDOWS") == "1":
+    from src.sessionizer import Sessionizer
+
+    sessionizer = Sessionizer(max_items=CONTEXT_REQUESTS)
 
-def worker():
-    while True:
-        job = job_queue.get()
-        src_file = job["file"]
-        src_path = job["path"]
-        raw_line = job["request"]
-        current_idx = job["index"]
-        all_req = job["all_request"]
 
+def prepare_job(job):
+    """
+    Phần trước LLM của 1 job (dùng chung cho worker thread và dispatch async).
+    Trả về (gt, req_text, session_context, pred); pred = "malicious" nếu risk đủ cao (không cần hỏi LLM), ngược lại None.
+    """
+    src_file = job["file"]
+    raw_line = job["request"]
+
+    # Khởi tạo state nếu chưa có
+    if src_file not in file_state:
+        file_state[src_file] = {
+            "has_mal": False,
+            "has_unknown": False,
+            "first_seen": True,
+        }
+
+    # gt: ground truth label. pred: predicted label
+    gt, req_text = extract_label_from_line(raw_line)
+    # Mọi request đều vào session (kể cả safe), để request unknown sau đó có đủ ngữ cảnh
+    session_context = sessionizer.add(req_text, raw_line)[1] if sessionizer is not None else None
+    # Lấy bộ rule hiện tại 1 lần cho cả job (rule pack có thể được swap bất cứ lúc nào)
+    scorer = risk_rules.current
+    risk = job.get("risk")
+    if risk is None or job.get("risk_scorer") is not scorer:
+        # Rule pack đã đổi sau khi job được đưa vào queue -> chấm lại
+        risk = scorer.score(req_text)
+
+    HIGH, LOW = scorer.thresholds["high"], scorer.thresholds["low"]
+    # If rish is very high, so we mark it as malicious directly and send incident alert
+    if risk >= HIGH:
+        if gt == "malicious":
+            eval_stats_l1["TP"] += 1
+        else:
+            eval_stats_l1["FP"] += 1
+        return gt, req_text, session_context, "malicious"
+    return gt, req_text, session_context, None
+
+
+def finish_job(job, gt, req_text, session_context, pred, latency):
+    """Phần sau LLM của 1 job: log unknown/FN/FP, confusion matrix, incident theo file, stats"""
+    src_file = job["file"]
+    src_path = job["path"]
+    current_idx = job["index"]
+    all_req = job["all_request"]
+
+    # --- LOG UNKNOWN ---
+    # If the resutl is UNKNOWN, so we send incident alert and write to log about the case
+    if pred == "unknown":
+        
+        log_missed(UNK_PATH, gt, pred, req_text)
+        stats_l1["unknown"] += 1
+        
+        if session_context is not None:
+            context_win = session_context
+        else:
+            start_idx = max(0, current_idx - (CONTEXT_REQUESTS - 1))
+            context_win = all_req[start_idx:current_idx + 1]
+        
+        context_content = "\n".join(context_win)
+        snippet_filename = f"{src_file}_line{current_idx}.txt"
+        incident_queue.put({
+            "type": "unknown",
+            "file": snippet_filename,
+            "path": src_path,
+            "request": req_text,
+            "timestamp": time.time(),
+            "custom_content": context_content
+        })
+
+    # --- LOG FALSE NEGATIVE (VERY DANGER) ---
+    # If the resutl is malicious, so we send incident alert and write to log about the case
+    if gt == "malicious" and pred == "safe":
+        eval_stats_l1["FN"] += 1
+        log_missed(FN_PATH, gt, pred, req_text)
+
+    # --- LOG FALSE POSITIVE ---
+    if gt == "safe" and pred == "malicious":
+        eval_stats_l1["FP"] += 1
+        log_missed(FP_PATH, gt, pred, req_text)
+
+    # Update confusion matrix
+    if gt == "malicious" and pred == "malicious":
+        eval_stats_l1["TP"] += 1
+        # else: eval_stats_l1["FN"] += 1
+    elif gt == "safe" and pred == "safe":
+        eval_stats_l1["TN"] += 1
+    # else: eval_stats_l1["FP"] += 1
+
+    # === UPDATE FILE-LEVEL STATE ===
+    if pred == "malicious":
+        file_state[src_file]["has_mal"] = True
+    elif pred == "unknown":
+        file_state[src_file]["has_unknown"] = True
+
+    # === CHỈ INCIDENT 1 LẦN CHO MỖI FILE ===
+    if file_state[src_file]["first_seen"]:
+        # Đánh dấu đã incident
+        file_state[src_file]["first_seen"] = False
+
+        # Đưa file vào đúng bucket ban đầu
+        if file_state[src_file]["has_mal"]:
+            tag = "malicious"
+        elif file_state[src_file]["has_unknown"]:
+            tag = "unknown"
+        else:
+            tag = "safe"
+
+        incident_queue.put(
+            {
+                "type": tag,
+                "file": src_file,
+                "path": src_path,
+                "request": req_text,
+                "timestamp": time.time(),
+            }
+        )
+    # Update stats
+    stats_l1["total"] += 1
+    stats_l1["latencies"].append(latency if latency is not None else 0)
+    stats_l1[pred] += 1
+
+    # if stats["total"] % UPDATE_CHART_EVERY == 0:
+    #     push_stats_safe()
+
+
+def prepare_jobs(jobs):
+    """prepare_job cho cả lô -> [(job, gt, req_text, session_context, pred)]; job lỗi bị bỏ qua"""
+    prepared = []
+    for job in jobs:
         try:
-            # Khởi tạo state nếu chưa có
-            if src_file not in file_state:
-                file_state[src_file] = {
-                    "has_mal": False,
-                    "has_unknown": False,
-                    "first_seen": True,
-                }
-
-            # gt: ground truth label. pred: predicted label
-            gt, req_text = extract_label_from_line(raw_line)
-            risk = risk_score_advanced(req_text)
-            
-            HIGH, LOW = 12, 1
-            # If rish is very high, so we mark it as malicious directly and send incident alert
-            if risk >= HIGH:
-                if gt == "malicious":
-                    eval_stats_l1["TP"] += 1
-                else:
-                    eval_stats_l1["FP"] += 1
-                pred = "malicious"
-                latency = 0
-            else:
-                pred, latency = analyze_log(req_text)
+            prepared.append((job, *prepare_job(job)))
+        except Exception as e:
+            print("Worker error:", e)
+    return prepared
 
-            # --- LOG UNKNOWN ---
-            # If the resutl is UNKNOWN, so we send incident alert and write to log about the case
-            if pred == "unknown":
-                
-                log_missed(UNK_PATH, gt, pred, req_text)
-                stats_l1["unknown"] += 1
-                
-                start_idx = max(0, current_idx - 4)
-                context_win = all_req[start_idx:current_idx + 1]
-                
-                context_content = "\n".join(context_win)
-                snippet_filename = f"{src_file}_line{current_idx}.txt"
-                incident_queue.put({
-                    "type": "unknown",
-                    "file": snippet_filename,
-                    "path": src_path,
-                    "request": req_text,
-                    "timestamp": time.time(),
-                    "custom_content": context_content
-                })
-
-            # --- LOG FALSE NEGATIVE (VERY DANGER) ---
-            # If the resutl is malicious, so we send incident alert and write to log about the case
-            if gt == "malicious" and pred == "safe":
-                eval_stats_l1["FN"] += 1
-                log_missed(FN_PATH, gt, pred, req_text)
-
-            # --- LOG FALSE POSITIVE ---
-            if gt == "safe" and pred == "malicious":
-                eval_stats_l1["FP"] += 1
-                log_missed(FP_PATH, gt, pred, req_text)
-
-            # Update confusion matrix
-            if gt == "malicious" and pred == "malicious":
-                eval_stats_l1["TP"] += 1
-                # else: eval_stats_l1["FN"] += 1
-            elif gt == "safe" and pred == "safe":
-                eval_stats_l1["TN"] += 1
-            # else: eval_stats_l1["FP"] += 1
-
-            # === UPDATE FILE-LEVEL STATE ===
-            if pred == "malicious":
-                file_state[src_file]["has_mal"] = True
-            elif pred == "unknown":
-                file_state[src_file]["has_unknown"] = True
-
-            # === CHỈ INCIDENT 1 LẦN CHO MỖI FILE ===
-            if file_state[src_file]["first_seen"]:
-                # Đánh dấu đã incident
-                file_state[src_file]["first_seen"] = False
-
-                # Đưa file vào đúng bucket ban đầu
-                if file_state[src_file]["has_mal"]:
-                    tag = "malicious"
-                elif file_state[src_file]["has_unknown"]:
-                    tag = "unknown"
-                else:
-                    tag = "safe"
-
-                incident_queue.put(
-                    {
-                        "type": tag,
-                        "file": src_file,
-                        "path": src_path,
-                        "request": req_text,
-                        "timestamp": time.time(),
-                    }
-                )
-            # Update stats
-            stats_l1["total"] += 1
-            stats_l1["latencies"].append(latency if latency is not None else 0)
-            stats_l1[pred] += 1
 
-            # if stats["total"] % UPDATE_CHART_EVERY == 0:
-            #     push_stats_safe()
+def finish_jobs(prepared, verdicts):
+    """verdicts: (pred, latency) của các job chưa có pred, theo thứ tự"""
+    verdicts = iter(verdicts)
+    for job, gt, req_text, session_context, pred in prepared:
+        latency = 0
+        if pred is None:
+            pred, latency = next(verdicts)
+        try:
+            finish_job(job, gt, req_text, session_context, pred, latency)
+        except Exception as e:
+            print("Worker error:", e)
+
+
+def take_jobs(job, limit):
+    """job + tối đa limit - 1 job đang có sẵn trong queue (không chờ thêm)"""
+    jobs = [job]
+    while len(jobs) < limit:
+        try:
+            jobs.append(job_queue.get_nowait())
+        except Empty:
+            break
+    return jobs
+
+
+def worker():
+    while True:
+        jobs = take_jobs(job_queue.get(), LLM_BATCH_SIZE)
+
+        try:
+            prepared = prepare_jobs(jobs)
+            verdicts = analyze_logs([p[2] for p in prepared if p[4] is None])
+            finish_jobs(prepared, verdicts)
 
         except Exception as e:
             print("Worker error:", e)
 
-        job_queue.task_done()
+        for _ in jobs:
+            job_queue.task_done()
 
 
-# Chạy các workers (threads)
-for _ in range(WORKER_COUNT):
-    threading.Thread(target=worker, daemon=True).start()
+async def handle_jobs_async(jobs, slots):
+    # prepare/finish chấm rule, ghi file log (log_missed) -> chạy ngoài event loop, loop chỉ chờ LLM
+    try:
+        prepared = await asyncio.to_thread(prepare_jobs, jobs)
+        verdicts = await analyze_logs_async([p[2] for p in prepared if p[4] is None])
+        await asyncio.to_thread(finish_jobs, prepared, verdicts)
+
+    except Exception as e:
+        print("Worker error:", e)
+
+    finally:
+        for _ in jobs:
+            slots.release()
+            job_queue.task_done()
+
+
+def async_dispatcher(loop, slots):
+    """
+    Chế độ LLM_DISPATCH=async: chuyển job từ job_queue sang event loop (tối đa LLM_BATCH_SIZE job / coroutine).
+    slots giới hạn số job đang chạy; hết slot thì dừng lấy job -> job_queue đầy -> producer chờ như bản thread.
+    """
+    while True:
+        slots.acquire()
+        jobs = [job_queue.get()]
+        while len(jobs) < LLM_BATCH_SIZE and slots.acquire(blocking=False):
+            try:
+                jobs.append(job_queue.get_nowait())
+            except Empty:
+                slots.release()
+                break
+        asyncio.run_coroutine_threadsafe(handle_jobs_async(jobs, slots), loop)
+
+
+# Chạy các workers (threads); chế độ async dùng async_dispatcher (khởi động trong main_async)
+if LLM_DISPATCH != "async":
+    for _ in range(WORKER_COUNT):
+        threading.Thread(target=worker, daemon=True).start()
 
 # ==========================
 # INCIDENT HANDLER
@@ -664,24 +823,96 @@ def calc_throughput():
 # ================================
 # using LogBertAnalyzer from src/detector.py
 VOCAB_SIZE = 3551
+# EventId dành riêng cho request không khớp template nào (VOCAB_SIZE = [MASK], VOCAB_SIZE + 1 = [PAD])
+UNKNOWN_EVENT_ID = VOCAB_SIZE + 2
 ANOMALY_THRESHOLD = 3
-try:
-    analyzer = LogBertAnalyzer(vocab_size=VOCAB_SIZE)
-except Exception as e:
-    print(f"⚠️ Không thể tải LogBertAnalyzer: {e}")
-    analyzer = None
+# LOGBERT_RUNTIME: eager (checkpoint gốc) | int8 (TorchScript int8) | onnx — xem benchmark_bert_export.py
+LOGBERT_RUNTIME = os.getenv("LOGBERT_RUNTIME", "eager")
+# LOGBERT_THREADS: số intra-op thread torch của mỗi worker process (chế độ trong process giữ mặc định của torch)
+# LOGBERT_PROCESSES > 0: forward chạy ở process pool riêng (src/inference_pool.py) thay vì thread trong process này
+# -> LogBERT không tranh GIL với worker L1 / event loop asyncio — xem benchmark_bert_pool.py
+LOGBERT_THREADS = int(os.getenv("LOGBERT_THREADS", "1"))
+LOGBERT_PROCESSES = int(os.getenv("LOGBERT_PROCESSES", "0"))
+# Thời gian tối đa chờ verdict LogBERT của 1 file (pool treo / hết worker -> bỏ qua file, scanner chạy tiếp)
+LOGBERT_TIMEOUT = float(os.getenv("LOGBERT_TIMEOUT", "120"))
+
+# Model, batcher, TemplateMatcher, Drain3 fallback, Gemini client đều tạo trong warm_up() chứ không lúc import:
+# websocket + worker L1 chạy ngay, LogBERT nạp ở thread nền, scanner chờ logbert_ready
+analyzer = None
+inference_batcher = None
+template_matcher = None
+# Gom cửa sổ của nhiều file unknown vào chung 1 forward pass (flush theo kích thước hoặc deadline)
+SCAN_BATCH_FILES = 64
+logbert_ready = threading.Event()
+warm_up_lock = threading.Lock()
+
+
+def warm_up():
+    """Nạp toàn bộ model/client và chạy thử 1 forward. Gọi nhiều lần chỉ nạp 1 lần."""
+    global analyzer, inference_batcher, template_matcher, SCAN_BATCH_FILES
+    with warm_up_lock:
+        if logbert_ready.is_set():
+            return
+        start = time.perf_counter()
+
+        from src import InferenceBatcher
+        from src.serving import load_analyzer
+        from src.inference_pool import ProcessInferencePool
+        from src.parser import get_template_cache
+
+        # Bật pool: model chỉ nạp trong các worker process, process chính không giữ thêm 1 bản
+        if LOGBERT_PROCESSES > 0:
+            try:
+                # Mỗi worker nhận 1 lô SCAN_BATCH_FILES file, quét 1 lần đủ việc cho mọi worker
+                inference_batcher = ProcessInferencePool(
+                    VOCAB_SIZE, processes=LOGBERT_PROCESSES, threads=LOGBERT_THREADS, runtime=LOGBERT_RUNTIME,
+                    max_batch=SCAN_BATCH_FILES, max_wait=0.02, confidence_threshold=0.05,
+                ).start()
+                SCAN_BATCH_FILES *= LOGBERT_PROCESSES
+            except Exception as e:
+                print(f"⚠️ Không khởi động được LogBERT process pool, chạy trong process: {e}")
+        if inference_batcher is None:
+            # Trong process: giữ số thread mặc định của torch (LOGBERT_THREADS chỉ áp cho worker của pool)
+            try:
+                analyzer = load_analyzer(VOCAB_SIZE, LOGBERT_RUNTIME).warm_up()
+                inference_batcher = InferenceBatcher(analyzer, max_batch=256, max_wait=0.02, confidence_threshold=0.05).start()
+            except Exception as e:
+                print(f"⚠️ Không thể tải LogBertAnalyzer: {e}")
+                analyzer = None
+
+        # Drain3 chỉ đọc từ snapshot lúc train: không làm cây phình ra, các worker dùng chung không cần lock
+        try:
+            template_matcher = TemplateMatcher(unknown_event_id=UNKNOWN_EVENT_ID)
+        except Exception as e:
+            print(f"⚠️ Không thể nạp snapshot Drain3, dùng add_log_message: {e}")
+            template_matcher = None
+
+        # LOGBERT_EVENT_SUBSET=1: MLM head chỉ chiếu lên các EventId TemplateMatcher có thể trả về
+        # (rank/prob tính trong tập này thay vì cả vocab)
+        if inference_batcher is not None and template_matcher is not None and os.getenv("LOGBERT_EVENT_SUBSET") == "1":
+            # Pool: áp cho mọi worker; trong process: áp cho analyzer
+            (analyzer or inference_batcher).restrict_to_events(template_matcher.event_ids())
+
+        # Drain3 đang chạy (fallback ở trên) tự lưu state nền, lần chạy sau khôi phục lại cây đã học
+        get_template_cache().start_snapshots()
+
+        try:
+            gemini_explainer.warm_up()
+        except Exception as e:
+            print(f"⚠️ Không thể khởi tạo Gemini client: {e}")
+
+        logbert_ready.set()
+        print(f"[Warm-up] LogBERT + Drain3 + Gemini sẵn sàng sau {time.perf_counter() - start:.1f} s")
+
 
 scored_files = set()
 
 resolved_history = deque(maxlen=20)
-def process_single_file(file_path, stats):
-    if analyzer is None:
-        return None
-    
+def load_event_ids(file_path):
+    """Đọc file unknown -> (event_ids, display_content). Trả về None nếu lỗi hoặc không có EventId."""
     if stats_l1["unknown"] > 0: 
         stats_l1["unknown"] -= 1
 
-    fname = os.path.basename(file_path)
     display_content = ""
     event_ids = []
     
@@ -696,7 +927,10 @@ def process_single_file(file_path, stats):
 
             
             for log_string in log_req:
-                result = process_log_string(log_string)
+                if template_matcher is not None:
+                    result = template_matcher.match(log_string)
+                else:
+                    result = process_log_string(log_string)
                 e_id = result.get("EventId")
                 if e_id is not None:
                     event_ids.append(e_id)
@@ -708,9 +942,30 @@ def process_single_file(file_path, stats):
         try: os.remove(file_path)
         except: pass
         return None
-    
+
+    return event_ids, display_content
+
+
+def process_single_file(file_path, stats):
+    if inference_batcher is None:
+        return None
+
+    loaded = load_event_ids(file_path)
+    if loaded is None:
+        return None
+    event_ids, display_content = loaded
+
+    try:
+        # Chỉ cần verdict của request cuối (target_line_id), không chấm lại cả lịch sử
+        detection_result = inference_batcher.detect_anomalies(event_ids, last_n=1, timeout=LOGBERT_TIMEOUT)
+    except Exception as e:
+        print(f"❌ Lỗi khi chạy model cho {file_path}: {e}")
+        return None
+    apply_verdict(file_path, event_ids, display_content, detection_result, stats)
+
+
+def apply_verdict(file_path, event_ids, display_content, detection_result, stats):
     try:
-        detection_result = analyzer.detect_anomalies(event_ids, confidence_threshold=0.05)
         anomalies = detection_result.get("anomalies", [])
         target_line_id = len(event_ids)
         target_is_anomalous = False
@@ -774,7 +1029,9 @@ def process_single_file(file_path, stats):
             "file": fname,
             "content": display_content,
             "status": final_verdict,
-            "score": confidence
+            "score": confidence,
+            # Rank của request cuối trong dự đoán LogBERT (0 = đúng dự đoán số 1, càng lớn càng lạ)
+            "rank": detection_result.get("ranks", {}).get(target_line_id)
         })
 
     except Exception as e:
@@ -786,6 +1043,7 @@ def unknow_scan_batch(stop_event, stats):
         os.makedirs(UNKNOWN_FOLDER)
 
     print("LogBERT Scanner started monitoring:", UNKNOWN_FOLDER)
+    logbert_ready.wait()
 
     while not stop_event.is_set():
         # 1. Lấy danh sách file mới nhất
@@ -801,30 +1059,50 @@ def unknow_scan_batch(stop_event, stats):
         # 3. Sort theo tên (mặc định sort string đường dẫn là sort theo tên)
         files_to_scan.sort()
 
-        # 4. Lấy file ở đầu danh sách (file cũ nhất hoặc tên nhỏ nhất tùy cách đặt tên)
-        target_file = files_to_scan[0]
+        # 4. Lấy tối đa SCAN_BATCH_FILES file ở đầu danh sách (file cũ nhất hoặc tên nhỏ nhất tùy cách đặt tên)
+        target_files = files_to_scan[:SCAN_BATCH_FILES]
 
-        try:
-            # Xử lý file đầu tiên này
-            if stop_event.is_set():
-                break
-            process_single_file(target_file, stats)
+        if stop_event.is_set():
+            break
+        if inference_batcher is None:
+            time.sleep(2)
+            continue
 
-            # Lưu ý: Không dùng vòng lặp for duyệt hết list ở đây.
-            # Việc quay lại đầu vòng while sẽ giúp code cập nhật lại danh sách file
-            # và sort lại ngay lập tức nếu có file mới ưu tiên hơn chèn vào.
+        # Gửi cửa sổ của cả lô vào batcher -> LogBERT chạy ít forward pass với batch lớn
+        pending = []
+        for target_file in target_files:
+            try:
+                loaded = load_event_ids(target_file)
+                if loaded is not None:
+                    pending.append((target_file, loaded, inference_batcher.submit(loaded[0], last_n=1)))
+            except Exception as e:
+                print(f"Error processing {target_file}: {e}")
 
-        except Exception as e:
-            print(f"Error processing {target_file}: {e}")
-            time.sleep(1)  # Sleep nhẹ nếu lỗi để tránh spam CPU
+        for target_file, (event_ids, display_content), future in pending:
+            try:
+                detection_result = future.result(timeout=LOGBERT_TIMEOUT)
+            except Exception as e:
+                print(f"❌ Lỗi khi chạy model cho {target_file}: {e}")
+                time.sleep(1)  # Sleep nhẹ nếu lỗi để tránh spam CPU
+                continue
+            apply_verdict(target_file, event_ids, display_content, detection_result, stats)
 
-        # Nghỉ ngắn giữa các lần check để nhường CPU
-        time.sleep(0.1)
+        # Lưu ý: Không duyệt hết list ở đây, quay lại đầu vòng while để cập nhật lại danh sách file
+        # và sort lại ngay nếu có file mới ưu tiên hơn chèn vào.
+        # Lô chưa đầy nghĩa là đã hết việc -> nghỉ ngắn để nhường CPU
+        if len(target_files) < SCAN_BATCH_FILES:
+            time.sleep(0.1)
 
 
 # ==========================
 # WEBSOCKET
 # ==========================
+def verdict_cache_stats():
+    """Counter VerdictCache của LogBERT (nằm ở process pool nếu bật LOGBERT_PROCESSES), None nếu chưa warm-up"""
+    cache = getattr(inference_batcher, "verdict_cache", None) or getattr(analyzer, "verdict_cache", None)
+    return cache.stats() if cache is not None else None
+
+
 async def push_stats():
     """
     Coroutine bất đồng bộ:
@@ -894,6 +1172,9 @@ async def push_stats():
             "rps": rps,                         # Request / second
             "tps": tps,                         # Token / second (LLM)
             "avg_latency": avg_lat,             # Latency trung bình L1
+            "l2_cache": verdict_cache_stats(),  # Hit-rate cache verdict cửa sổ LogBERT
+            "llm_cache": llm_verdict_cache.stats(),  # Hit-rate cache verdict LLM (L1)
+            "llm_routing": llm_balancer.stats(),  # Service được chọn cho từng request, in-flight, EWMA latency
 
             # ==========================
             # LỊCH SỬ FILE ĐÃ ĐƯỢC RESOLVE (L2)
@@ -960,9 +1241,19 @@ def start_simulation():
         content = file.read_text(errors="ignore")
         reqs = split_requests_rfc(content, file.name)
 
+        # Chấm điểm rule cho cả file trong 1 lần gọi, worker chỉ việc đọc lại điểm
+        scorer = risk_rules.current
+        try:
+            risks = [int(r) for r in scorer.score_batch([extract_label_from_line(r)[1] for r in reqs])[0]]
+        except Exception as e:
+            # Block hỏng (vd. rỗng) không được làm chết thread mô phỏng:
+            # risk = None -> prepare_job chấm lại từng request, lỗi chỉ ảnh hưởng đúng job đó
+            print(f"[WARN] Không chấm điểm rule theo lô được cho {file.name}: {e}")
+            risks = [None] * len(reqs)
+
         for i,req in enumerate(reqs):
             # We will take some infomation when scanning any request from the log file.
-            job_queue.put({"file": file.name, "path": str(file), "request": req, "index": i, "all_request": reqs })
+            job_queue.put({"file": file.name, "path": str(file), "request": req, "index": i, "all_request": reqs, "risk": risks[i], "risk_scorer": scorer })
             time.sleep(random.uniform(0.01, 0.05))
         time.sleep(random.uniform(0.05, 0.2))
 
@@ -1021,7 +1312,17 @@ async def ws_handler(websocket):
 # ENTRY
 # ==========================
 async def main_async():
-    
+    global async_llm_client
+
+    if LLM_DISPATCH == "async":
+        async_llm_client = await AsyncServiceClient(SERVICES, SERVICE_CONCURRENCY, REQUEST_TIMEOUT).open()
+        threading.Thread(
+            target=async_dispatcher,
+            args=(asyncio.get_running_loop(), threading.Semaphore(ASYNC_MAX_IN_FLIGHT)),
+            daemon=True,
+        ).start()
+        print(f"LLM dispatch async: tối đa {ASYNC_MAX_IN_FLIGHT} job đang chạy")
+
     # Start websocket server
     server = await websockets.serve(ws_handler, "0.0.0.0", 8765)
 
@@ -1044,6 +1345,8 @@ unknown_stop_event = threading.Event()
 if __name__ == "__main__":
     # global SYSTEM_START
     SYSTEM_START = time.time()
+    # Nạp model ở nền: websocket + worker L1 không phải chờ LogBERT
+    threading.Thread(target=warm_up, daemon=True).start()
     # start LogBERT scanner
     threading.Thread(
         target=unknow_scan_batch, args=(unknown_stop_event, stats_l2), daemon=True
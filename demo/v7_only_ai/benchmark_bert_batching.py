@@ -0,0 +1,75 @@
+import os
+import random
+import sys
+import time
+
+# Thêm đường dẫn root để import được các module trong src
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.detector import LogBertAnalyzer, InferenceBatcher
+
+# ================= CONFIG =================
+VOCAB_SIZE = 3551
+CONFIDENCE_THRESHOLD = 0.05  # Ngưỡng giống trong analyzer.py
+N_FILES = 2000
+MAX_REQUESTS_PER_FILE = 5    # File unknown thường chỉ có 1-5 request
+SEED = 7
+
+
+# ================= HELPER FUNCTIONS =================
+def synthetic_files(n, seed=SEED):
+    """Mỗi file = 1 list EventId (giống event_ids trong process_single_file)"""
+    rnd = random.Random(seed)
+    return [
+        [rnd.randint(1, VOCAB_SIZE - 1) for _ in range(rnd.randint(1, MAX_REQUESTS_PER_FILE))]
+        for _ in range(n)
+    ]
+
+
+def same_result(a, b, tol=1e-5):
+    """Cùng các dòng bất thường; Confidence chỉ lệch sai số float do batch khác kích thước"""
+    if [x["LineId"] for x in a["anomalies"]] != [x["LineId"] for x in b["anomalies"]]:
+        return False
+    return all(abs(x["Confidence"] - y["Confidence"]) <= tol for x, y in zip(a["anomalies"], b["anomalies"]))
+
+
+# ================= MAIN BENCHMARK =================
+def main():
+    analyzer = LogBertAnalyzer(vocab_size=VOCAB_SIZE, cache_size=0)
+    files = synthetic_files(N_FILES)
+    n_windows = sum(len(f) for f in files)
+
+    # Warm-up
+    analyzer.detect_anomalies(files[0], confidence_threshold=CONFIDENCE_THRESHOLD)
+
+    start = time.perf_counter()
+    per_file = [analyzer.detect_anomalies(f, confidence_threshold=CONFIDENCE_THRESHOLD) for f in files]
+    t_per_file = time.perf_counter() - start
+
+    results = {}
+    for max_batch in (64, 256, 1024):
+        batcher = InferenceBatcher(analyzer, max_batch=max_batch, confidence_threshold=CONFIDENCE_THRESHOLD).start()
+        start = time.perf_counter()
+        futures = [batcher.submit(f) for f in files]
+        batched = [fut.result() for fut in futures]
+        results[max_batch] = (time.perf_counter() - start, batched, batcher.batches)
+        batcher.stop()
+
+    print("=" * 40)
+    print("📊 BENCHMARK LOGBERT MICRO-BATCHING")
+    print("=" * 40)
+    print(f"Files:          {N_FILES} ({n_windows} cửa sổ)")
+    print(f"Từng file:      {t_per_file / N_FILES * 1000:.2f} ms/file")
+    for max_batch, (elapsed, batched, n_batches) in results.items():
+        mismatches = sum(1 for a, b in zip(per_file, batched) if not same_result(a, b))
+        print(
+            f"Batch {max_batch:>4}:     {elapsed / N_FILES * 1000:.2f} ms/file "
+            f"({t_per_file / elapsed:.1f}x, {n_batches} forward, {mismatches} mismatch)"
+        )
+    print("=" * 40)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import gc
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Thêm đường dẫn root để import được các module trong src
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.detector import LogBertAnalyzer, MODEL_PATH
+from src.serving import (
+    INT8_PATH, ONNX_PATH, OnnxLogBertAnalyzer, TorchScriptLogBertAnalyzer,
+    export_onnx, export_torchscript, onnxruntime,
+)
+
+# ================= CONFIG =================
+load_dotenv()
+LOG_FOLDER = os.getenv("LOG_FOLDER", "logs")
+VOCAB_SIZE = 3551
+CONFIDENCE_THRESHOLD = 0.05  # Ngưỡng giống trong analyzer.py
+N_SYNTHETIC_WINDOWS = 5000
+BATCH_SIZES = [1, 256]
+REPEAT = 5
+SEED = 7
+
+
+# ================= HELPER FUNCTIONS =================
+def rss_bytes():
+    """RSS hiện tại của process (Linux), 0 nếu không đọc được"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def benchmark_windows(analyzer):
+    """Cửa sổ từ bộ benchmark (LOG_FOLDER, giống benchmark_bert_only.py) + cửa sổ ngẫu nhiên"""
+    sequences, labels = [], []
+
+    if os.path.exists(LOG_FOLDER):
+        from src import TemplateMatcher, parsing_http_requests
+        from benchmark_bert_only import split_requests_rfc
+
+        matcher = TemplateMatcher(unknown_event_id=analyzer.unknown_token_id)
+        for file_path in sorted(Path(LOG_FOLDER).glob("*.txt")):
+            requests, _ = split_requests_rfc(file_path.read_text(errors="ignore"), file_path.name)
+            for req_text in requests:
+                event_ids = [matcher.match(s)["EventId"] for s in parsing_http_requests(req_text.splitlines())]
+                seqs, labs, _ = analyzer.prepare_sequences(event_ids)
+                sequences.extend(seqs)
+                labels.extend(labs)
+
+    rnd = random.Random(SEED)
+    event_ids = [rnd.randint(1, VOCAB_SIZE - 1) for _ in range(N_SYNTHETIC_WINDOWS)]
+    seqs, labs, _ = analyzer.prepare_sequences(event_ids)
+    return sequences + seqs, labels + labs
+
+
+def latency_ms(analyzer, sequences, batch_size):
+    """ms trên mỗi cửa sổ khi chấm theo lô batch_size"""
+    batches = [sequences[i:i + batch_size] for i in range(0, min(len(sequences), batch_size * 50), batch_size)]
+    analyzer._last_token_logits(batches[0])
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for b in batches:
+            analyzer._last_token_logits(b)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / sum(len(b) for b in batches) * 1000
+
+
+def load_runtime(factory):
+    gc.collect()
+    before = rss_bytes()
+    analyzer = factory()
+    analyzer._last_token_logits([[0] * analyzer.max_len])
+    return analyzer, rss_bytes() - before
+
+
+# ================= MAIN BENCHMARK =================
+def main():
+    eager, eager_rss = load_runtime(lambda: LogBertAnalyzer(vocab_size=VOCAB_SIZE, cache_size=0))
+
+    # 1. Export (file nằm cạnh checkpoint gốc)
+    export_torchscript(eager, INT8_PATH)
+    print(f"✅ Export int8 TorchScript: {INT8_PATH}")
+    runtimes = [("eager", eager, eager_rss, MODEL_PATH)]
+
+    int8, int8_rss = load_runtime(lambda: TorchScriptLogBertAnalyzer(vocab_size=VOCAB_SIZE, cache_size=0))
+    runtimes.append(("int8 jit", int8, int8_rss, INT8_PATH))
+
+    try:
+        export_onnx(eager, ONNX_PATH)
+        print(f"✅ Export ONNX: {ONNX_PATH}")
+        if onnxruntime is not None:
+            onnx, onnx_rss = load_runtime(lambda: OnnxLogBertAnalyzer(vocab_size=VOCAB_SIZE, cache_size=0))
+            runtimes.append(("onnx", onnx, onnx_rss, ONNX_PATH))
+        else:
+            print("⚠️ Chưa cài onnxruntime, bỏ qua đo bản ONNX")
+    except Exception as e:
+        print(f"⚠️ Không export được ONNX (cần package onnx): {e}")
+
+    # 2. Parity + latency + memory
+    sequences, labels = benchmark_windows(eager)
+    reference = eager.score_windows(sequences, labels, confidence_threshold=CONFIDENCE_THRESHOLD)
+
+    print("=" * 60)
+    print("📊 BENCHMARK LOGBERT EXPORT (CPU)")
+    print("=" * 60)
+    print(f"Cửa sổ parity: {len(sequences)}")
+    header = "Runtime     Verdict khớp   Δprob max   " + "   ".join(f"batch {b:>3}" for b in BATCH_SIZES) + "   File      RSS"
+    print(header)
+    for name, analyzer, rss, path in runtimes:
+        results = analyzer.score_windows(sequences, labels, confidence_threshold=CONFIDENCE_THRESHOLD)
+        agree = sum(a[0] == b[0] for a, b in zip(reference, results)) / len(results)
+        max_diff = max(abs(a[1] - b[1]) for a, b in zip(reference, results))
+        latencies = "   ".join(f"{latency_ms(analyzer, sequences, b):>6.3f} ms" for b in BATCH_SIZES)
+        print(
+            f"{name:<10}  {agree:>11.2%}   {max_diff:>9.2e}   {latencies}"
+            f"   {os.path.getsize(path) / 2**20:>4.1f}MB   {rss / 2**20:>4.0f}MB"
+        )
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,7 +12,7 @@ ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
 
-from src import LogBertAnalyzer, parsing_http_requests, process_log_string
+from src import LogBertAnalyzer, parsing_http_requests, process_log_string, TemplateMatcher
 
 # ================= CONFIG =================
 load_dotenv()
@@ -60,11 +60,17 @@ def split_requests_rfc(content, filename):
 def main():
     print(f"🚀 Đang khởi tạo LogBERT Analyzer (Vocab: {VOCAB_SIZE})...")
     try:
-        analyzer = LogBertAnalyzer(vocab_size=VOCAB_SIZE)
+        analyzer = LogBertAnalyzer(vocab_size=VOCAB_SIZE, cache_size=0)
     except Exception as e:
         print(f"❌ Lỗi load model: {e}")
         return
 
+    try:
+        template_matcher = TemplateMatcher(unknown_event_id=analyzer.unknown_token_id)
+    except Exception as e:
+        print(f"⚠️ Không nạp được snapshot Drain3, dùng add_log_message: {e}")
+        template_matcher = None
+
     # Lấy danh sách file log gốc
     if not os.path.exists(LOG_FOLDER):
         print(f"❌ Không tìm thấy thư mục log: {LOG_FOLDER}")
@@ -100,7 +106,10 @@ def main():
                 # Ở đây ta parse trực tiếp string cho nhanh
                 log_lines = list(parsing_http_requests(req_text.splitlines()))
                 for log_string in log_lines:
-                    result = process_log_string(log_string)
+                    if template_matcher is not None:
+                        result = template_matcher.match(log_string)
+                    else:
+                        result = process_log_string(log_string)
                     if result.get("EventId"):
                         event_ids.append(result.get("EventId"))
                 
@@ -0,0 +1,98 @@
+import os
+import sys
+import threading
+import time
+
+# Thêm đường dẫn root để import được các module trong src
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.detector import LogBertAnalyzer, InferenceBatcher
+from src.inference_pool import ProcessInferencePool
+from benchmark_bert_batching import same_result, synthetic_files
+
+# ================= CONFIG =================
+VOCAB_SIZE = 3551
+CONFIDENCE_THRESHOLD = 0.05  # Ngưỡng giống trong analyzer.py
+N_FILES = 4000
+MAX_BATCH = 64               # = SCAN_BATCH_FILES trong analyzer.py
+# (số process, số intra-op thread mỗi process)
+POOL_CONFIGS = [(1, 1), (2, 1), (4, 1), (2, 2)]
+TICK = 0.001                 # Thread giả lập event loop asyncio: ngủ 1 ms rồi đo độ trễ thức dậy
+
+
+# ================= HELPER FUNCTIONS =================
+class LoopTicker:
+    """Đo độ trễ lớn nhất của 1 thread ngủ TICK giây (GIL bị giữ -> thức dậy trễ)"""
+
+    def __init__(self):
+        self.max_lag = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            time.sleep(TICK)
+            self.max_lag = max(self.max_lag, time.perf_counter() - start - TICK)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run(batcher, files):
+    """(kết quả, giây wall, giây CPU của process chính, độ trễ lớn nhất của ticker)"""
+    with LoopTicker() as ticker:
+        wall, cpu = time.perf_counter(), time.process_time()
+        futures = [batcher.submit(f) for f in files]
+        results = [fut.result() for fut in futures]
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return results, wall, cpu, ticker.max_lag
+
+
+# ================= MAIN BENCHMARK =================
+def main():
+    files = synthetic_files(N_FILES)
+
+    analyzer = LogBertAnalyzer(vocab_size=VOCAB_SIZE, cache_size=0)
+    batcher = InferenceBatcher(analyzer, max_batch=MAX_BATCH, confidence_threshold=CONFIDENCE_THRESHOLD).start()
+    run(batcher, files[:100])  # Warm-up
+    reference, t_ref, cpu_ref, lag_ref = run(batcher, files)
+    batcher.stop()
+
+    rows = []
+    for processes, threads in POOL_CONFIGS:
+        start = time.perf_counter()
+        pool = ProcessInferencePool(
+            VOCAB_SIZE, processes=processes, threads=threads,
+            max_batch=MAX_BATCH, confidence_threshold=CONFIDENCE_THRESHOLD, cache_size=0,
+        ).start()
+        t_start = time.perf_counter() - start
+        run(pool, files[:100])
+        results, wall, cpu, lag = run(pool, files)
+        pool.stop()
+        mismatches = sum(1 for a, b in zip(reference, results) if not same_result(a, b))
+        rows.append((f"{processes} proc x {threads} thread", wall, cpu, lag, mismatches, t_start))
+
+    print("=" * 72)
+    print("📊 BENCHMARK LOGBERT PROCESS POOL")
+    print("=" * 72)
+    print(f"Files: {N_FILES}, CPU: {os.cpu_count()} core, max_batch {MAX_BATCH}")
+    print("Chế độ                 ms/file    CPU process chính   Trễ loop max   Mismatch   Khởi động")
+    print(f"{'Thread (batcher)':<20}   {t_ref / N_FILES * 1000:>7.3f}   {cpu_ref:>13.2f} s   {lag_ref * 1000:>9.1f} ms   {0:>8}")
+    for name, wall, cpu, lag, mismatches, t_start in rows:
+        print(
+            f"{name:<20}   {wall / N_FILES * 1000:>7.3f}   {cpu:>13.2f} s   {lag * 1000:>9.1f} ms   "
+            f"{mismatches:>8}   {t_start:>7.1f} s"
+        )
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
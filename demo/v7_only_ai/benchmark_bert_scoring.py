@@ -0,0 +1,140 @@
+import os
+import random
+import sys
+import time
+
+import torch
+
+# Thêm đường dẫn root để import được các module trong src
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.detector import LogBertAnalyzer
+
+# ================= CONFIG =================
+VOCAB_SIZE = 3551
+CONFIDENCE_THRESHOLD = 0.05  # Ngưỡng giống trong analyzer.py
+HISTORY_LENGTHS = [5, 50, 500, 5000]
+N_PARITY_FILES = 500
+N_WINDOWS = 10000
+N_LIVE_EVENTS = 100  # cỡ snapshot Drain3 (max_clusters = 100)
+TOP_K = 20
+SEED = 7
+
+
+# ================= LEGACY (Copy từ detector.py, vòng lặp từng dòng) =================
+def score_logits_legacy(last_token_logits, labels, top_k=TOP_K, confidence_threshold=0.0):
+    with torch.no_grad():
+        probs = torch.softmax(last_token_logits, dim=-1)
+        top_preds = torch.topk(probs, k=top_k, dim=-1).indices
+
+    results = []
+    for idx, (real_token, pred_tokens) in enumerate(zip(labels, top_preds)):
+        current_prob = probs[idx, real_token].item()
+        is_anomalous = (real_token not in pred_tokens.tolist()) or (current_prob < confidence_threshold)
+        results.append((is_anomalous, current_prob))
+    return results
+
+
+# ================= HELPER FUNCTIONS =================
+def random_events(rnd, n):
+    return [rnd.randint(1, VOCAB_SIZE - 1) for _ in range(n)]
+
+
+def target_verdict(result, event_ids):
+    """(is_anomalous, confidence) của request cuối, giống apply_verdict trong analyzer.py"""
+    for a in result["anomalies"]:
+        if a["LineId"] == len(event_ids):
+            return True, a["Confidence"]
+    return False, None
+
+
+def same_verdict(a, b, tol=1e-5):
+    if a[0] != b[0]:
+        return False
+    return a[1] is None or abs(a[1] - b[1]) <= tol
+
+
+def timeit(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+# ================= MAIN BENCHMARK =================
+def main():
+    analyzer = LogBertAnalyzer(vocab_size=VOCAB_SIZE, cache_size=0)
+    rnd = random.Random(SEED)
+
+    # Verdict request cuối: quét toàn bộ vs chỉ chấm vị trí cuối
+    files = [random_events(rnd, rnd.randint(1, 20)) for _ in range(N_PARITY_FILES)]
+    mismatches = 0
+    for event_ids in files:
+        full = target_verdict(analyzer.detect_anomalies(event_ids, confidence_threshold=CONFIDENCE_THRESHOLD), event_ids)
+        last = target_verdict(analyzer.detect_last(event_ids, confidence_threshold=CONFIDENCE_THRESHOLD), event_ids)
+        mismatches += not same_verdict(full, last)
+
+    print("=" * 40)
+    print("📊 BENCHMARK LOGBERT SCORING")
+    print("=" * 40)
+    print(f"Verdict mismatch: {mismatches}/{N_PARITY_FILES} (detect_last vs detect_anomalies)")
+    print("-" * 40)
+    print("Lịch sử   detect_anomalies   detect_last")
+    for n in HISTORY_LENGTHS:
+        event_ids = random_events(rnd, n)
+        t_full = timeit(lambda: analyzer.detect_anomalies(event_ids, confidence_threshold=CONFIDENCE_THRESHOLD))
+        t_last = timeit(lambda: analyzer.detect_last(event_ids, confidence_threshold=CONFIDENCE_THRESHOLD))
+        print(f"{n:>7}   {t_full * 1000:>13.2f} ms   {t_last * 1000:>8.2f} ms")
+    print("-" * 40)
+
+    # Hậu xử lý trên 10k cửa sổ (logits tính sẵn 1 lần, chỉ đo phần sau forward)
+    sequences, labels, _ = analyzer.prepare_sequences(random_events(rnd, N_WINDOWS))
+    logits = analyzer._last_token_logits(sequences)
+    legacy = score_logits_legacy(logits, labels, confidence_threshold=CONFIDENCE_THRESHOLD)
+
+    topk_analyzer = LogBertAnalyzer(vocab_size=VOCAB_SIZE, scoring="topk", cache_size=0)
+    vector = topk_analyzer.score_logits(logits, labels, TOP_K, CONFIDENCE_THRESHOLD)
+    ranked = analyzer.score_logits(logits, labels, TOP_K, CONFIDENCE_THRESHOLD)
+    mismatch_vector = sum(1 for a, b in zip(legacy, vector) if a != b[:2])
+    mismatch_rank = sum(1 for a, b in zip(legacy, ranked) if a[0] != b[0] or abs(a[1] - b[1]) > 1e-5)
+
+    t_legacy = timeit(lambda: score_logits_legacy(logits, labels, confidence_threshold=CONFIDENCE_THRESHOLD))
+    t_vector = timeit(lambda: topk_analyzer.score_logits(logits, labels, TOP_K, CONFIDENCE_THRESHOLD))
+    t_rank = timeit(lambda: analyzer.score_logits(logits, labels, TOP_K, CONFIDENCE_THRESHOLD))
+    # Phần softmax + topk chung cho 2 cách đầu, phần còn lại là chi phí hậu xử lý thật sự
+    t_kernels = timeit(lambda: torch.topk(torch.softmax(logits, dim=-1), k=TOP_K, dim=-1))
+    print(f"Hậu xử lý {N_WINDOWS} cửa sổ")
+    print(f"softmax + topk:    {t_kernels * 1000:.1f} ms (chung)")
+    print(f"Vòng lặp .item():  {t_legacy * 1000:.1f} ms (+{(t_legacy - t_kernels) * 1000:.1f} ms)")
+    print(f"Tensor (topk):     {t_vector * 1000:.1f} ms (+{(t_vector - t_kernels) * 1000:.1f} ms, {mismatch_vector} mismatch)")
+    print(f"Rank từ logits:    {t_rank * 1000:.1f} ms ({t_legacy / t_rank:.1f}x, {mismatch_rank} mismatch)")
+    print("-" * 40)
+
+    # Forward 10k cửa sổ: logits mọi vị trí (bản gốc) vs chỉ vị trí cuối vs chỉ tập event đang dùng
+    masked_input = analyzer.make_input(sequences)
+    with torch.no_grad():
+        t_full_head = timeit(lambda: analyzer.model(masked_input).logits[:, -1, :])
+        full_logits = analyzer.model(masked_input).logits
+    t_trimmed = timeit(lambda: analyzer._last_token_logits(sequences))
+    trim_diff = (full_logits[:, -1, :] - analyzer._last_token_logits(sequences)).abs().max().item()
+
+    live_events = rnd.sample(range(1, VOCAB_SIZE), N_LIVE_EVENTS)
+    analyzer.restrict_to_events(live_events)
+    t_subset = timeit(lambda: analyzer._last_token_logits(sequences))
+    subset_logits = analyzer._last_token_logits(sequences)
+    analyzer.restrict_to_events(None)
+
+    print(f"Forward {N_WINDOWS} cửa sổ")
+    print(f"Head mọi vị trí:   {t_full_head * 1000:.1f} ms, logits {full_logits.numel() * 4 / 2**20:.1f} MB")
+    print(f"Head vị trí cuối:  {t_trimmed * 1000:.1f} ms, logits {full_logits[:, -1, :].numel() * 4 / 2**20:.1f} MB (Δ {trim_diff:.1e})")
+    print(f"Head {N_LIVE_EVENTS} event:     {t_subset * 1000:.1f} ms, logits {subset_logits.numel() * 4 / 2**20:.2f} MB")
+    print("=" * 40)
+
+
+if __name__ == "__main__":
+    main()
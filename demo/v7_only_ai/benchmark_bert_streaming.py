@@ -0,0 +1,81 @@
+import os
+import random
+import sys
+import time
+
+# Thêm đường dẫn root để import được các module trong src
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.detector import LogBertAnalyzer, InferenceBatcher
+from src.streaming import StreamingDetector
+
+# ================= CONFIG =================
+VOCAB_SIZE = 3551
+CONFIDENCE_THRESHOLD = 0.05  # Ngưỡng giống trong analyzer.py
+N_EVENTS = 20000
+N_SOURCES = 50
+SEED = 7
+
+
+# ================= HELPER FUNCTIONS =================
+def event_stream(rnd):
+    """(source, event_id) xen kẽ giữa N_SOURCES nguồn"""
+    return [(f"host-{rnd.randrange(N_SOURCES)}", rnd.randint(1, VOCAB_SIZE - 1)) for _ in range(N_EVENTS)]
+
+
+def per_file_verdicts(analyzer, stream):
+    """Cách hiện tại: mỗi event dựng lại cả lịch sử của nguồn rồi detect_last (batch 1)"""
+    histories = {}
+    verdicts = []
+    for source, event_id in stream:
+        history = histories.setdefault(source, [])
+        history.append(event_id)
+        event_ids = list(history)  # process_single_file đọc lại cả file
+        report = analyzer.detect_last(event_ids, confidence_threshold=CONFIDENCE_THRESHOLD)
+        verdicts.append(any(a["LineId"] == len(event_ids) for a in report["anomalies"]))
+    return verdicts
+
+
+# ================= MAIN BENCHMARK =================
+def main():
+    stream = event_stream(random.Random(SEED))
+    # Tắt verdict cache để chỉ đo phần tiền xử lý + batching
+    analyzer = LogBertAnalyzer(vocab_size=VOCAB_SIZE, cache_size=0).warm_up()
+
+    start = time.perf_counter()
+    reference = per_file_verdicts(analyzer, stream)
+    t_per_file = time.perf_counter() - start
+
+    batcher = InferenceBatcher(analyzer, max_batch=256, max_wait=0.02, confidence_threshold=CONFIDENCE_THRESHOLD).start()
+    detector = StreamingDetector(batcher)
+    start = time.perf_counter()
+    futures = [detector.push(source, event_id) for source, event_id in stream]
+    verdicts = [f.result()["is_anomalous"] for f in futures]
+    t_stream = time.perf_counter() - start
+    batcher.stop()
+
+    # Tiền xử lý riêng (không chấm): ring buffer vs dựng lại lịch sử
+    start = time.perf_counter()
+    histories = {}
+    for source, event_id in stream:
+        history = histories.setdefault(source, [])
+        history.append(event_id)
+        analyzer.prepare_sequences(list(history), range(len(history) - 1, len(history)))
+    t_prep_file = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(reference, verdicts) if a != b)
+    print("=" * 50)
+    print("📊 BENCHMARK LOGBERT STREAMING")
+    print("=" * 50)
+    print(f"Events: {N_EVENTS} từ {N_SOURCES} nguồn ({N_EVENTS // N_SOURCES} event/nguồn)")
+    print(f"Dựng lại lịch sử + detect_last: {t_per_file / N_EVENTS * 1000:.3f} ms/event")
+    print(f"  (riêng tiền xử lý:            {t_prep_file / N_EVENTS * 1000:.3f} ms/event)")
+    print(f"StreamingDetector + batcher:    {t_stream / N_EVENTS * 1000:.3f} ms/event ({t_per_file / t_stream:.1f}x)")
+    print(f"Verdict mismatch: {mismatches}/{N_EVENTS}, {batcher.batches} forward")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
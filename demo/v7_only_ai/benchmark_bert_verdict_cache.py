@@ -0,0 +1,90 @@
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Thêm đường dẫn root để import được các module trong src
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.detector import LogBertAnalyzer
+
+# ================= CONFIG =================
+load_dotenv()
+LOG_FOLDER = os.getenv("LOG_FOLDER", "logs")
+VOCAB_SIZE = 3551
+CONFIDENCE_THRESHOLD = 0.05  # Ngưỡng giống trong analyzer.py
+N_FILES = 5000
+N_BOILERPLATE = 200          # Số chuỗi request boilerplate khác nhau ở cuối file
+BOILERPLATE_SHARE = 0.8      # Tỉ lệ file kết thúc bằng 1 chuỗi boilerplate
+SEED = 7
+
+
+# ================= HELPER FUNCTIONS =================
+def synthetic_files(rnd):
+    """File unknown giả lập: phần lớn kết thúc bằng 1 trong N_BOILERPLATE chuỗi, còn lại ngẫu nhiên"""
+    boilerplate = [[rnd.randint(1, VOCAB_SIZE - 1) for _ in range(6)] for _ in range(N_BOILERPLATE)]
+    files = []
+    for _ in range(N_FILES):
+        head = [rnd.randint(1, VOCAB_SIZE - 1) for _ in range(rnd.randint(0, 4))]
+        tail = rnd.choice(boilerplate) if rnd.random() < BOILERPLATE_SHARE else [rnd.randint(1, VOCAB_SIZE - 1)]
+        files.append(head + tail)
+    return files
+
+
+def benchmark_files(analyzer):
+    """Event ID thật của từng request trong LOG_FOLDER (file = lịch sử tới request đó, giống file unknown)"""
+    if not os.path.exists(LOG_FOLDER):
+        return []
+    from src import TemplateMatcher, parsing_http_requests
+    from benchmark_bert_only import split_requests_rfc
+
+    matcher = TemplateMatcher(unknown_event_id=analyzer.unknown_token_id)
+    files = []
+    for file_path in sorted(Path(LOG_FOLDER).glob("*.txt")):
+        requests, _ = split_requests_rfc(file_path.read_text(errors="ignore"), file_path.name)
+        event_ids = []
+        for req_text in requests:
+            event_ids.extend(matcher.match(s)["EventId"] for s in parsing_http_requests(req_text.splitlines()))
+            files.append(list(event_ids))
+    return files
+
+
+def run(analyzer, files):
+    start = time.perf_counter()
+    results = [analyzer.detect_last(f, confidence_threshold=CONFIDENCE_THRESHOLD) for f in files]
+    return results, time.perf_counter() - start
+
+
+# ================= MAIN BENCHMARK =================
+def main():
+    plain = LogBertAnalyzer(vocab_size=VOCAB_SIZE, cache_size=0).warm_up()
+
+    datasets = [("Giả lập boilerplate", synthetic_files(random.Random(SEED)))]
+    real = benchmark_files(plain)
+    if real:
+        datasets.append((f"LOG_FOLDER ({LOG_FOLDER})", real))
+
+    print("=" * 60)
+    print("📊 BENCHMARK LOGBERT VERDICT CACHE (detect_last từng file)")
+    print("=" * 60)
+    for name, files in datasets:
+        cached = LogBertAnalyzer(vocab_size=VOCAB_SIZE).warm_up()
+        reference, t_plain = run(plain, files)
+        results, t_cached = run(cached, files)
+        mismatches = sum(1 for a, b in zip(reference, results) if a != b)
+        stats = cached.verdict_cache.stats()
+        print(f"{name}: {len(files)} file")
+        print(f"  Không cache: {t_plain / len(files) * 1000:.3f} ms/file")
+        print(
+            f"  Có cache:    {t_cached / len(files) * 1000:.3f} ms/file ({t_plain / t_cached:.1f}x), "
+            f"hit-rate {stats['hit_rate']:.1%}, {stats['size']} entry, {mismatches} mismatch"
+        )
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+# Thêm đường dẫn root để import được các module trong src
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.llm_client import AsyncServiceClient, ServiceSessions, aiohttp
+from llm_stub_server import StubServer
+
+# ================= CONFIG =================
+N_SERVICES = 2
+SERVICE_CONCURRENCY = 32      # backend có batching (vLLM / KoboldCPP nhiều slot) nhận nhiều request song song
+WORKER_COUNT = 4              # = analyzer.py (chế độ thread)
+ASYNC_MAX_IN_FLIGHT = 256     # = analyzer.py (chế độ async)
+N_REQUESTS = 2000
+STUB_DELAY = 0.05             # Thời gian sinh giả lập mỗi request
+REQUEST_TIMEOUT = 8
+SLOW_DELAY = 1.0              # Service treo để kiểm tra hủy theo timeout
+SLOW_TIMEOUT = 0.2
+SLOW_REQUESTS = 50
+PAYLOAD = {"prompt": "Classify the HTTP request.\nRequest:\nGET /tienda1/index.jsp HTTP/1.1\n\nAnswer:",
+           "temperature": 0.0, "top_p": 1.0, "max_length": 32}
+
+
+# ================= HELPER FUNCTIONS =================
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run_threads(services, worker_count):
+    """worker_count thread như worker() trong analyzer.py: mỗi thread giữ 1 request tới khi có kết quả"""
+    sessions = ServiceSessions(services, SERVICE_CONCURRENCY)
+    semaphores = {srv: threading.Semaphore(SERVICE_CONCURRENCY) for srv in services}
+    latencies = []
+    counter = iter(range(N_REQUESTS))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            srv = services[i % len(services)]
+            with semaphores[srv]:
+                start = time.perf_counter()
+                sessions.post(srv, PAYLOAD, REQUEST_TIMEOUT).json()["results"][0]["text"]
+                elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(worker_count)]
+    for t in threads:
+        t.start()
+    peak_threads = threading.active_count()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    sessions.close()
+    return latencies, elapsed, peak_threads
+
+
+async def run_async(services):
+    """Tối đa ASYNC_MAX_IN_FLIGHT request cùng lúc trên 1 event loop (như LLM_DISPATCH=async)"""
+    client = await AsyncServiceClient(services, SERVICE_CONCURRENCY, REQUEST_TIMEOUT).open()
+    slots = asyncio.Semaphore(ASYNC_MAX_IN_FLIGHT)
+    latencies = []
+
+    async def one(i):
+        async with slots:
+            status, body, latency = await client.post(services[i % len(services)], PAYLOAD)
+            body["results"][0]["text"]
+            latencies.append(latency)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(N_REQUESTS)))
+    elapsed = time.perf_counter() - start
+    peak_threads = threading.active_count()
+    await client.close()
+    return latencies, elapsed, peak_threads
+
+
+async def run_timeouts(service):
+    """Service treo: request quá SLOW_TIMEOUT phải bị hủy chứ không giữ slot tới khi server trả lời"""
+    client = await AsyncServiceClient([service], SERVICE_CONCURRENCY, SLOW_TIMEOUT).open()
+
+    async def one():
+        try:
+            await client.post(service, PAYLOAD)
+        except asyncio.TimeoutError:
+            pass
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(SLOW_REQUESTS)))
+    elapsed = time.perf_counter() - start
+    in_flight = client.in_flight[service]
+    await client.close()
+    return client.timeouts, elapsed, in_flight
+
+
+def print_row(name, result):
+    latencies, elapsed, peak_threads = result
+    print(
+        f"{name:<26} {percentile(latencies, 50) * 1000:>7.1f} ms  {percentile(latencies, 99) * 1000:>7.1f} ms"
+        f"  {N_REQUESTS / elapsed:>7.0f}   {peak_threads:>6}"
+    )
+
+
+# ================= MAIN BENCHMARK =================
+def main():
+    servers = [StubServer(delay=STUB_DELAY).start() for _ in range(N_SERVICES)]
+    services = [s.url for s in servers]
+
+    print("=" * 70)
+    print("📊 BENCHMARK LLM DISPATCH: THREAD vs ASYNC (stub KoboldCPP, localhost)")
+    print("=" * 70)
+    print(f"{N_REQUESTS} request, {N_SERVICES} service x {SERVICE_CONCURRENCY} đồng thời, sinh {STUB_DELAY * 1000:.0f} ms/request")
+    print("Dispatch                       p50         p99     req/s   Thread")
+    print_row(f"thread ({WORKER_COUNT} worker)", run_threads(services, WORKER_COUNT))
+    print_row(f"thread ({ASYNC_MAX_IN_FLIGHT} worker)", run_threads(services, ASYNC_MAX_IN_FLIGHT))
+
+    if aiohttp is None:
+        print("⚠️  Chưa cài aiohttp -> bỏ qua chế độ async (pip install aiohttp)")
+    else:
+        print_row(f"async ({ASYNC_MAX_IN_FLIGHT} in-flight)", asyncio.run(run_async(services)))
+
+        slow = StubServer(delay=SLOW_DELAY).start()
+        timeouts, elapsed, in_flight = asyncio.run(run_timeouts(slow.url))
+        print(
+            f"Hủy theo timeout: {timeouts}/{SLOW_REQUESTS} request quá {SLOW_TIMEOUT * 1000:.0f} ms"
+            f" (service trả lời sau {SLOW_DELAY * 1000:.0f} ms), xong sau {elapsed * 1000:.0f} ms, còn treo {in_flight}"
+        )
+        slow.stop()
+    print("=" * 70)
+    for s in servers:
+        s.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import os
+import random
+import sys
+import threading
+import time
+
+# Thêm đường dẫn root để import được các module trong src
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.llm_client import ServiceSessions
+from src.load_balancer import LoadBalancer
+from llm_stub_server import StubServer
+
+# ================= CONFIG =================
+# GPU không đều nhau: thời gian sinh mỗi service (giây)
+SERVICE_DELAYS = [0.02, 0.04, 0.08]
+SERVICE_CONCURRENCY = 2       # = analyzer.py
+WORKER_COUNT = 8
+N_REQUESTS = 1200
+REQUEST_TIMEOUT = 8
+SEED = 7
+# (tên, policy, trọng số); trọng số ~ tốc độ tương đối của từng GPU
+MODES = [
+    ("round_robin", "round_robin", None),
+    ("least", "least", None),
+    ("p2c", "p2c", None),
+    ("p2c + weights 4,2,1", "p2c", [4, 2, 1]),
+]
+PAYLOAD = {"prompt": "Classify the HTTP request.\nRequest:\nGET /tienda1/index.jsp HTTP/1.1\n\nAnswer:",
+           "temperature": 0.0, "top_p": 1.0, "max_length": 32}
+
+
+# ================= HELPER FUNCTIONS =================
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(services, balancer):
+    """send_request của analyzer.py: chọn service qua balancer, semaphore mỗi service, latency tính cả lúc chờ slot"""
+    sessions = ServiceSessions(services, SERVICE_CONCURRENCY)
+    semaphores = {srv: threading.Semaphore(SERVICE_CONCURRENCY) for srv in services}
+    latencies = []
+    counter = iter(range(N_REQUESTS))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            queued = time.perf_counter()
+            srv = balancer.acquire()
+            latency = None
+            try:
+                with semaphores[srv]:
+                    start = time.perf_counter()
+                    sessions.post(srv, PAYLOAD, REQUEST_TIMEOUT).json()["results"][0]["text"]
+                    latency = time.perf_counter() - start
+            finally:
+                balancer.release(srv, latency)
+            with lock:
+                latencies.append(time.perf_counter() - queued)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(WORKER_COUNT)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    sessions.close()
+    return latencies, elapsed
+
+
+def race_check():
+    """Nhiều thread acquire/release cùng lúc: picks phải khớp tổng, in-flight phải về 0"""
+    balancer = LoadBalancer(["a", "b", "c"], policy="p2c", rng=random.Random(SEED))
+    per_thread = 20000
+
+    def hammer():
+        for _ in range(per_thread):
+            srv = balancer.acquire()
+            balancer.release(srv, 0.001)
+
+    threads = [threading.Thread(target=hammer) for _ in range(WORKER_COUNT)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stats = balancer.stats()["services"]
+    picks = sum(s["picks"] for s in stats.values())
+    in_flight = sum(s["in_flight"] for s in stats.values())
+    return picks == WORKER_COUNT * per_thread and in_flight == 0, elapsed / (WORKER_COUNT * per_thread) * 1e6
+
+
+# ================= MAIN BENCHMARK =================
+def main():
+    servers = [StubServer(delay=delay).start() for delay in SERVICE_DELAYS]
+    services = [s.url for s in servers]
+
+    print("=" * 78)
+    print("📊 BENCHMARK LLM LOAD BALANCER (stub KoboldCPP, localhost)")
+    print("=" * 78)
+    print(f"{N_REQUESTS} request, {WORKER_COUNT} worker, {len(services)} service x {SERVICE_CONCURRENCY} đồng thời,"
+          f" sinh {', '.join(f'{d * 1000:.0f}' for d in SERVICE_DELAYS)} ms")
+    print("Policy                    p50         p99     req/s   Tỉ lệ request theo service")
+    for name, policy, weights in MODES:
+        balancer = LoadBalancer(services, weights=weights, policy=policy, rng=random.Random(SEED))
+        latencies, elapsed = run(services, balancer)
+        shares = " / ".join(f"{s['share']:.0%}" for s in balancer.stats()["services"].values())
+        print(
+            f"{name:<22} {percentile(latencies, 50) * 1000:>7.1f} ms {percentile(latencies, 99) * 1000:>7.1f} ms"
+            f" {N_REQUESTS / elapsed:>8.1f}   {shares}"
+        )
+
+    ok, cost = race_check()
+    print(f"Thread-safety ({WORKER_COUNT} thread): {'OK' if ok else 'SAI LỆCH'}, {cost:.1f} µs / acquire+release")
+    print("=" * 78)
+    for s in servers:
+        s.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import os
+import random
+import sys
+import threading
+import time
+
+# Thêm đường dẫn root để import được các module trong src
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.llm_client import ServiceSessions
+from src.masking import masker
+from src.prompt_batch import answer_tokens, build_prompt_batch, parse_batch_labels, plan_batches
+from llm_stub_server import StubServer, stub_answer
+
+# ================= CONFIG =================
+N_SERVICES = 2
+SERVICE_CONCURRENCY = 2       # = analyzer.py
+WORKER_COUNT = 4              # = analyzer.py
+N_REQUESTS = 600
+REQUEST_TIMEOUT = 30
+SEED = 7
+# Mô hình thời gian của stub: mỗi lần gọi cố định + prefill theo ký tự prompt + decode theo ký tự trả lời
+STUB_DELAY = 0.03
+STUB_DELAY_PER_CHAR = 0.00002
+STUB_DELAY_PER_OUTPUT_CHAR = 0.001
+# (LLM_BATCH_SIZE, LLM_CONTEXT_TOKENS) cần đo; batch 1 = prompt đơn như analyzer.py mặc định
+MODES = [(1, 2048), (4, 2048), (16, 2048), (16, 1024)]
+# Stub "lỗi": bỏ mất 1 dòng mỗi DROP_EVERY dòng trả lời lô -> đo số lần phải hỏi lại riêng
+DROP_EVERY = 5
+
+PAGES = ["/tienda1/index.jsp", "/tienda1/publico/productos.jsp", "/tienda1/publico/anadir.jsp",
+         "/tienda1/publico/pagar.jsp", "/tienda1/miembros/editar.jsp", "/tienda1/publico/autenticar.jsp"]
+PAYLOADS = ["", "", "", "id=1+union+select+password+from+usuarios--", "nombre=<script>alert(1)</script>",
+            "B1=Pasar+por+caja&" + "a" * 300]
+
+
+# ================= HELPER FUNCTIONS =================
+def build_prompt_simple(masked):
+    # Copy từ analyzer.py
+    return (
+        "Classify the HTTP request.\n"
+        "Answer with one of the following words exactly:\n"
+        "safe\nmalicious\nunknown\n\n"
+        f"Request:\n{masked}\n\n"
+        "Answer:"
+    )
+
+
+def synthetic_requests(rnd):
+    reqs = []
+    for _ in range(N_REQUESTS):
+        query = rnd.choice(PAYLOADS)
+        reqs.append(
+            f"GET http://localhost:8080{rnd.choice(PAGES)}{'?' + query if query else ''} HTTP/1.1\n"
+            "User-Agent: Mozilla/5.0 (compatible; Konqueror/3.5; Linux) KHTML/3.5.8 (like Gecko)\n"
+            f"Host: localhost:8080\nCookie: JSESSIONID={rnd.getrandbits(128):032X}\nConnection: close"
+        )
+    return reqs
+
+
+def drop_lines(prompt):
+    answer = stub_answer(prompt)
+    lines = answer.split("\n")
+    if len(lines) == 1:
+        return answer
+    return "\n".join(line for i, line in enumerate(lines, 1) if i % DROP_EVERY)
+
+
+class Client:
+    """send_request + analyze_logs của analyzer.py, rút gọn (round-robin service, semaphore mỗi service)"""
+
+    def __init__(self, services):
+        self.services = services
+        self.sessions = ServiceSessions(services, SERVICE_CONCURRENCY)
+        self.semaphores = {srv: threading.Semaphore(SERVICE_CONCURRENCY) for srv in services}
+        self.lock = threading.Lock()
+        self.rr = 0
+        self.calls = 0
+        self.fallbacks = 0
+
+    def send(self, prompt, max_length=32):
+        with self.lock:
+            srv = self.services[self.rr % len(self.services)]
+            self.rr += 1
+            self.calls += 1
+        payload = {"prompt": prompt, "temperature": 0.0, "top_p": 1.0, "max_length": max_length}
+        with self.semaphores[srv]:
+            return self.sessions.post(srv, payload, REQUEST_TIMEOUT).json()["results"][0]["text"].strip()
+
+    def classify(self, masked_list, batch_size, context_tokens):
+        verdicts = [None] * len(masked_list)
+        for group in plan_batches(masked_list, context_tokens, batch_size):
+            if len(group) > 1:
+                text = self.send(build_prompt_batch([masked_list[i] for i in group]), answer_tokens(len(group)))
+                for i, label in zip(group, parse_batch_labels(text, len(group)) or ()):
+                    verdicts[i] = label
+            for i in group:
+                if verdicts[i] is None:
+                    if len(group) > 1:
+                        with self.lock:
+                            self.fallbacks += 1
+                    verdicts[i] = self.send(build_prompt_simple(masked_list[i])).lower()
+        return verdicts
+
+
+def run(client, masked, batch_size, context_tokens):
+    """WORKER_COUNT worker, mỗi worker lấy tối đa batch_size request 1 lần (như take_jobs khi queue đầy)"""
+    results = [None] * len(masked)
+    position = [0]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                start = position[0]
+                position[0] += batch_size
+            if start >= len(masked):
+                return
+            chunk = masked[start:start + batch_size]
+            results[start:start + len(chunk)] = client.classify(chunk, batch_size, context_tokens)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(WORKER_COUNT)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - start
+
+
+# ================= MAIN BENCHMARK =================
+def main():
+    masked = [masker.mask(r) for r in synthetic_requests(random.Random(SEED))]
+    delays = dict(delay=STUB_DELAY, delay_per_char=STUB_DELAY_PER_CHAR, delay_per_output_char=STUB_DELAY_PER_OUTPUT_CHAR)
+
+    print("=" * 72)
+    print("📊 BENCHMARK LLM BATCH PROMPT (stub KoboldCPP, localhost)")
+    print("=" * 72)
+    print(f"{N_REQUESTS} request, {WORKER_COUNT} worker, {N_SERVICES} service x {SERVICE_CONCURRENCY} đồng thời")
+    print(f"Stub: {STUB_DELAY * 1000:.0f} ms/lần gọi + {STUB_DELAY_PER_CHAR * 1e6:.0f} µs/ký tự prompt"
+          f" + {STUB_DELAY_PER_OUTPUT_CHAR * 1000:.0f} ms/ký tự trả lời")
+    print("Stub trả lời      Batch  Context   Lần gọi  Hỏi lại     req/s   Speedup  Sai khác")
+
+    baseline = None
+    for name, answer in (("đầy đủ", stub_answer), (f"mất 1/{DROP_EVERY} dòng", drop_lines)):
+        servers = [StubServer(answer=answer, **delays).start() for _ in range(N_SERVICES)]
+        for batch_size, context_tokens in MODES:
+            client = Client([s.url for s in servers])
+            labels, elapsed = run(client, masked, batch_size, context_tokens)
+            client.sessions.close()
+            if baseline is None:
+                baseline = (labels, elapsed)
+            mismatches = sum(a != b for a, b in zip(labels, baseline[0]))
+            print(
+                f"{name:<17} {batch_size:>5} {context_tokens:>8} {client.calls:>9} {client.fallbacks:>8}"
+                f" {N_REQUESTS / elapsed:>9.1f} {baseline[1] / elapsed:>8.1f}x {mismatches:>9}"
+            )
+        for s in servers:
+            s.stop()
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
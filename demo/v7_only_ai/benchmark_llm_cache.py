@@ -0,0 +1,169 @@
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+# Thêm đường dẫn root để import được các module trong src
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.llm_cache import LlmVerdictCache, cache_key, prompt_version
+from src.llm_client import ServiceSessions
+from src.masking import masker
+from llm_stub_server import StubServer
+
+# ================= CONFIG =================
+N_SERVICES = 2
+SERVICE_CONCURRENCY = 2       # = analyzer.py
+WORKER_COUNT = 4              # = analyzer.py
+N_REQUESTS = 2000
+STUB_DELAY = 0.03             # Thời gian 1 lần gọi LLM giả lập
+REQUEST_TIMEOUT = 8
+TTL = 3600
+LOOKUPS = 20000               # Số lần tra để đo chi phí 1 lookup
+SEED = 7
+
+PAGES = ["/tienda1/index.jsp", "/tienda1/publico/productos.jsp", "/tienda1/publico/anadir.jsp",
+         "/tienda1/publico/pagar.jsp", "/tienda1/miembros/editar.jsp", "/tienda1/publico/autenticar.jsp"]
+# Payload tấn công bị replay nhiều lần + request bình thường có tham số thay đổi
+ATTACKS = ["id=1+union+select+password+from+usuarios--", "nombre=<script>alert(1)</script>",
+           "file=../../../../etc/passwd", "cmd=;cat+/etc/shadow"]
+
+
+# ================= HELPER FUNCTIONS =================
+def build_prompt_simple(masked):
+    # Copy từ analyzer.py
+    return (
+        "Classify the HTTP request.\n"
+        "Answer with one of the following words exactly:\n"
+        "safe\nmalicious\nunknown\n\n"
+        f"Request:\n{masked}\n\n"
+        "Answer:"
+    )
+
+
+def synthetic_requests(rnd):
+    reqs = []
+    for _ in range(N_REQUESTS):
+        if rnd.random() < 0.3:
+            query = rnd.choice(ATTACKS)
+        else:
+            query = f"id={rnd.randint(1, 20)}&nombre=Producto+{rnd.randint(1, 50)}&cantidad={rnd.randint(1, 9)}"
+        reqs.append(
+            f"GET http://localhost:8080{rnd.choice(PAGES)}?{query} HTTP/1.1\n"
+            "User-Agent: Mozilla/5.0 (compatible; Konqueror/3.5; Linux) KHTML/3.5.8 (like Gecko)\n"
+            f"Host: localhost:8080\nCookie: JSESSIONID={rnd.getrandbits(128):032X}\nConnection: close"
+        )
+    return reqs
+
+
+def run(services, masked, cache, version):
+    """analyze_masked của analyzer.py + tra/ghi cache; trả về (nhãn, latency ghi vào stats, số lần gọi LLM, thời gian)"""
+    sessions = ServiceSessions(services, SERVICE_CONCURRENCY)
+    semaphores = {srv: threading.Semaphore(SERVICE_CONCURRENCY) for srv in services}
+    results = [None] * len(masked)
+    counter = iter(range(len(masked)))
+    calls = [0]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            key = cache_key(masked[i], version)
+            verdict = cache.get(key) if cache is not None else None
+            if verdict is None:
+                srv = services[i % len(services)]
+                payload = {"prompt": build_prompt_simple(masked[i]), "temperature": 0.0, "top_p": 1.0, "max_length": 32}
+                with semaphores[srv]:
+                    start = time.time()
+                    text = sessions.post(srv, payload, REQUEST_TIMEOUT).json()["results"][0]["text"].strip()
+                    verdict = (text, time.time() - start)
+                with lock:
+                    calls[0] += 1
+                if cache is not None:
+                    cache.put(key, *verdict)
+            results[i] = verdict
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(WORKER_COUNT)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    sessions.close()
+    return results, calls[0], elapsed
+
+
+def lookup_cost(cache, keys):
+    start = time.perf_counter()
+    for i in range(LOOKUPS):
+        cache.get(keys[i % len(keys)])
+    return (time.perf_counter() - start) / LOOKUPS * 1e6
+
+
+def print_row(name, labels, baseline, calls, elapsed, base_elapsed):
+    mismatches = sum(a[0] != b[0] for a, b in zip(labels, baseline))
+    avg_latency = sum(lat for _, lat in labels) / len(labels) * 1000
+    print(
+        f"{name:<24} {calls:>9} {N_REQUESTS / elapsed:>9.1f} {base_elapsed / elapsed:>8.1f}x"
+        f" {avg_latency:>10.1f} ms {mismatches:>9}"
+    )
+
+
+# ================= MAIN BENCHMARK =================
+def main():
+    servers = [StubServer(delay=STUB_DELAY).start() for _ in range(N_SERVICES)]
+    services = [s.url for s in servers]
+    masked = [masker.mask(r) for r in synthetic_requests(random.Random(SEED))]
+    version = prompt_version(build_prompt_simple("{masked}"))
+    db_path = os.path.join(tempfile.mkdtemp(), "llm_verdicts.sqlite")
+
+    print("=" * 72)
+    print("📊 BENCHMARK LLM VERDICT CACHE (stub KoboldCPP, localhost)")
+    print("=" * 72)
+    print(f"{N_REQUESTS} request, {len(set(masked))} request khác nhau sau mask, LLM {STUB_DELAY * 1000:.0f} ms/lần gọi")
+    print("Chế độ                   Lần gọi     req/s   Speedup   Latency stats  Sai khác")
+
+    baseline, calls, base_elapsed = run(services, masked, None, version)
+    print_row("không cache", baseline, baseline, calls, base_elapsed, base_elapsed)
+
+    memory = LlmVerdictCache(path=db_path, ttl=TTL)
+    labels, calls, elapsed = run(services, masked, memory, version)
+    print_row("RAM + sqlite (lạnh)", labels, baseline, calls, elapsed, base_elapsed)
+    memory.close()
+
+    # Khởi động lại: RAM trống, verdict đọc từ sqlite
+    restarted = LlmVerdictCache(path=db_path, ttl=TTL)
+    labels, calls, elapsed = run(services, masked, restarted, version)
+    print_row("sau restart (sqlite)", labels, baseline, calls, elapsed, base_elapsed)
+    stats = restarted.stats()
+    print(f"Cache sau restart: hit-rate {stats['hit_rate']:.1%}, {stats['disk_hits']} hit từ đĩa,"
+          f" tiết kiệm {stats['saved_latency']:.1f} s gọi LLM")
+
+    keys = [cache_key(m, version) for m in set(masked)]
+    ram_cost = lookup_cost(restarted, keys)
+    disk_only = LlmVerdictCache(max_size=0, path=db_path, ttl=TTL)
+    disk_cost = lookup_cost(disk_only, keys)
+    print(f"Chi phí 1 lookup: RAM {ram_cost:.1f} µs, sqlite {disk_cost:.1f} µs")
+
+    # TTL: đồng hồ vượt TTL -> verdict cũ không còn dùng
+    now = [time.time() + TTL + 1]
+    expired = LlmVerdictCache(path=db_path, ttl=TTL, clock=lambda: now[0])
+    print(f"Sau TTL: {sum(expired.get(k) is not None for k in keys)}/{len(keys)} verdict còn dùng được")
+    restarted.close()
+    disk_only.close()
+    expired.close()
+    print("=" * 72)
+    for s in servers:
+        s.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import os
+import sys
+import threading
+import time
+
+import requests
+
+# Thêm đường dẫn root để import được các module trong src
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.llm_client import ServiceSessions
+from llm_stub_server import StubServer
+
+# ================= CONFIG =================
+N_SERVICES = 2
+SERVICE_CONCURRENCY = 2       # = analyzer.py
+WORKER_COUNT = 4              # = analyzer.py
+N_REQUESTS = 2000
+STUB_DELAY = 0.0              # 0: chỉ đo chi phí kết nối/HTTP, không có thời gian sinh
+REQUEST_TIMEOUT = 8
+PAYLOAD = {"prompt": "Classify the HTTP request.\nRequest:\nGET /tienda1/index.jsp HTTP/1.1\n\nAnswer:",
+           "temperature": 0.0, "top_p": 1.0, "max_length": 32}
+
+
+# ================= HELPER FUNCTIONS =================
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(post, services):
+    """WORKER_COUNT thread gửi N_REQUESTS request, round-robin service, semaphore như send_request"""
+    semaphores = {srv: threading.Semaphore(SERVICE_CONCURRENCY) for srv in services}
+    latencies = []
+    counter = iter(range(N_REQUESTS))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            srv = services[i % len(services)]
+            with semaphores[srv]:
+                start = time.perf_counter()
+                resp = post(srv, PAYLOAD, REQUEST_TIMEOUT)
+                resp.json()["results"][0]["text"]
+                elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(WORKER_COUNT)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, time.perf_counter() - start
+
+
+# ================= MAIN BENCHMARK =================
+def main():
+    servers = [StubServer(delay=STUB_DELAY).start() for _ in range(N_SERVICES)]
+    services = [s.url for s in servers]
+
+    fresh = run(lambda srv, payload, timeout: requests.post(srv, json=payload, timeout=timeout), services)
+    fresh_connections = sum(s.connections for s in servers)
+
+    sessions = ServiceSessions(services, SERVICE_CONCURRENCY)
+    pooled = run(sessions.post, services)
+    pooled_connections = sum(s.connections for s in servers) - fresh_connections
+    sessions.close()
+
+    print("=" * 60)
+    print("📊 BENCHMARK LLM CLIENT (stub KoboldCPP, localhost)")
+    print("=" * 60)
+    print(f"{N_REQUESTS} request, {WORKER_COUNT} worker, {N_SERVICES} service x {SERVICE_CONCURRENCY} đồng thời")
+    print("Client                   p50        p99        req/s   Kết nối TCP")
+    rows = (("requests.post (mới)", fresh, fresh_connections), ("ServiceSessions", pooled, pooled_connections))
+    for name, (latencies, elapsed), connections in rows:
+        print(
+            f"{name:<22} {percentile(latencies, 50) * 1000:>6.2f} ms  {percentile(latencies, 99) * 1000:>6.2f} ms"
+            f"  {N_REQUESTS / elapsed:>8.0f}   {connections:>8}"
+        )
+    print("=" * 60)
+    for s in servers:
+        s.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import os
+import re
+import sys
+import time
+import tracemalloc
+import urllib.parse
+
+# Thêm đường dẫn root để import được các module trong src
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from drain3.masking import LogMasker
+from drain3.template_miner_config import TemplateMinerConfig
+from src.masking import CONFIG_PATH, Masker
+
+# ================= CONFIG =================
+DATA_FILES = [
+    os.path.join(ROOT_DIR, "data", "anomalousTrafficTest.txt"),
+    os.path.join(ROOT_DIR, "data", "normalTrafficTest.txt"),
+]
+REPEAT = 5
+
+# Masker gốc của Drain3 (chuẩn để so khớp kết quả)
+config = TemplateMinerConfig()
+config.load(str(CONFIG_PATH))
+drain3_masker = LogMasker(config.masking_instructions, config.mask_prefix, config.mask_suffix)
+
+# Request kiểu CSIC có IP/session/host để các instruction mask đều chạy
+SAMPLE_REQUESTS = [
+    "GET http://localhost:8080/tienda1/index.jsp HTTP/1.1\r\nUser-Agent: Mozilla/5.0 (compatible; Konqueror/3.5; Linux) KHTML/3.5.8 (like Gecko)\r\nHost: localhost:8080\r\nCookie: JSESSIONID=EA414B3E327DED6875848530C864BD8F\r\nConnection: close",
+    "GET http://192.168.1.20:8080/tienda1/publico/anadir.jsp?id=2&nombre=Jam%F3n+Ib%E9rico&precio=85&cantidad=%27%3B+DROP+TABLE+usuarios HTTP/1.1\r\nX-Forwarded-For: 10.0.0.7\r\nDate: 12:31:05",
+    # Query ở cuối dòng đầu: rule SAFE_VAL neo "$" chỉ khớp cuối cả request, không phải cuối từng dòng
+    "GET http://localhost:8080/tienda1/publico/anadir.jsp?id=3&cantidad=4\r\nHost: localhost:8080",
+    "POST http://localhost:8080/api/login?token=eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9abc HTTP/1.1\r\n\r\nsessionid=0123456789abcdefghijKLMNOP&request_id=550e8400-e29b-41d4-a716-446655440000",
+]
+
+
+# ================= LEGACY (Copy từ analyzer.py, trước khi dùng masker chung) =================
+def selective_mask_legacy(text):
+    text = text.replace("\r", "").replace("\t", " ")
+    decoded = urllib.parse.unquote(text)
+
+    decoded = re.sub(r"\b\d{1,3}(\.\d{1,3}){3}\b", "<IP>", decoded)
+    decoded = re.sub(
+        r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b",
+        "<UUID>",
+        decoded,
+    )
+    decoded = re.sub(
+        r"(token|sessionid|jwt|auth)=([A-Za-z0-9\-_]{20,})",
+        r"\1=<TOKEN>",
+        decoded,
+        flags=re.IGNORECASE,
+    )
+    decoded = re.sub(r"\b\d{2}:\d{2}:\d{2}\b", "<TIME>", decoded)
+
+    return decoded
+
+
+def drain3_mask(text):
+    """preprocess-log.py cũ (tạo drain3_state.bin + vocab LogBERT): unquote + drain3 masker trên cả request"""
+    return drain3_masker.mask(urllib.parse.unquote(text))
+
+
+# ================= HELPER FUNCTIONS =================
+def load_requests():
+    reqs = []
+    for path in DATA_FILES:
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                reqs.extend(line.rstrip("\n") for line in f if line.strip())
+    # Trộn thêm request đầy đủ header để giống traffic thật
+    return reqs + SAMPLE_REQUESTS * max(1, len(reqs) // 10)
+
+
+def bench(fn, reqs):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for r in reqs:
+            fn(r)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def alloc_peak(fn, reqs):
+    """Peak bộ nhớ (bytes) cấp phát thêm trung bình cho mỗi request"""
+    peak = 0
+    tracemalloc.start()
+    for r in reqs:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        out = fn(r)
+        peak += tracemalloc.get_traced_memory()[1] - base
+        del out
+    tracemalloc.stop()
+    return peak / len(reqs)
+
+
+# ================= MAIN BENCHMARK =================
+def main():
+    reqs = load_requests()
+    masker = Masker()
+
+    mismatches = [r for r in reqs if drain3_mask(r) != masker.mask(r)]
+
+    # Warm-up cache regex của module re cho bản cũ
+    selective_mask_legacy(reqs[0])
+
+    t_legacy = bench(selective_mask_legacy, reqs)
+    t_drain3 = bench(drain3_mask, reqs)
+    t_cold = bench(lambda r: masker._mask_uncached(r), reqs)
+    # Hit rate sau đúng 1 lượt (các lượt lặp của bench() thì lần nào cũng hit)
+    masker.cache_clear()
+    masker.mask_many(reqs)
+    info = masker.cache_info()
+    t_warm = bench(masker.mask, reqs)
+    t_many = bench(lambda _: masker.mask_many(reqs), [None])
+
+    sample = SAMPLE_REQUESTS * 20
+    peak_legacy = alloc_peak(selective_mask_legacy, sample)
+    peak_new = alloc_peak(masker.mask, sample)
+
+    print("=" * 40)
+    print("📊 BENCHMARK MASKING")
+    print("=" * 40)
+    print(f"Requests:        {len(reqs)}")
+    print(f"Mismatches:      {len(mismatches)} (so với drain3 masker)")
+    print(f"selective_mask:  {t_legacy / len(reqs) * 1e6:.2f} µs/request (bản cũ trong analyzer)")
+    print(f"drain3 masker:   {t_drain3 / len(reqs) * 1e6:.2f} µs/request")
+    print(f"Masker no cache: {t_cold / len(reqs) * 1e6:.2f} µs/request")
+    print(f"Masker cached:   {t_warm / len(reqs) * 1e6:.2f} µs/request")
+    print(f"mask_many:       {t_many / len(reqs) * 1e6:.2f} µs/request")
+    print(f"Cache hit rate:  {info.hits / max(1, info.hits + info.misses):.2%} ({info.currsize} request)")
+    print("-" * 40)
+    print(f"selective_mask:  {peak_legacy:.0f} B peak/request")
+    print(f"Masker cached:   {peak_new:.0f} B peak/request")
+    print("=" * 40)
+
+    for r in mismatches[:5]:
+        print("❌ MISMATCH:", repr(r[:120]))
+    if mismatches:
+        # Khác drain3 masker = khác template/EventId lúc train -> không được coi là benchmark hợp lệ
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
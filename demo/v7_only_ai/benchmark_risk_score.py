@@ -0,0 +1,187 @@
+import os
+import sys
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Thêm đường dẫn root để import được các module trong src
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.risk import RiskScorer
+
+# ================= CONFIG =================
+load_dotenv()
+LOG_FOLDER = os.getenv("LOG_FOLDER", "logs")
+DATA_FILES = [
+    os.path.join(ROOT_DIR, "data", "anomalousTrafficTest.txt"),
+    os.path.join(ROOT_DIR, "data", "normalTrafficTest.txt"),
+]
+REPEAT = 5
+
+# Một vài request mẫu kiểu CSIC để phủ hết các nhóm rule
+SAMPLE_REQUESTS = [
+    "GET http://localhost:8080/tienda1/index.jsp HTTP/1.1\nUser-Agent: Mozilla/5.0 (compatible; Konqueror/3.5; Linux) KHTML/3.5.8 (like Gecko)\nHost: localhost:8080\nCookie: JSESSIONID=EA414B3E327DED6875848530C864BD8F\nConnection: close",
+    "GET http://localhost:8080/tienda1/publico/anadir.jsp?id=2&nombre=Jam%F3n+Ib%E9rico&precio=85&cantidad=%27%3B+DROP+TABLE+usuarios%3B+SELECT+*+FROM+datos+WHERE+nombre+LIKE+%27%25&B1=A%F1adir+al+carrito HTTP/1.1",
+    "POST http://localhost:8080/tienda1/publico/autenticar.jsp HTTP/1.1\n\nmodo=entrar&login=admin' or '1'='1&pwd=x&B1=Entrar",
+    "GET http://localhost:8080/tienda1/imagenes/../../../../etc/passwd HTTP/1.1",
+    "GET http://localhost:8080/tienda1/%2e%2e%2f%2e%2e/%2e/ HTTP/1.1",
+    "GET http://localhost:8080/search?q=\"><script>alert(1)</script><img src=x onerror=alert(1)> HTTP/1.1",
+    "GET http://localhost:8080/page?x=<!--#exec cmd=\"ls\"--><!--#include file=x> HTTP/1.1",
+    "TRACE http://localhost:8080/tienda1/index.jsp/ HTTP/1.1",
+    "GET http://localhost:8080/a?cmd=;ls | id | whoami $(id) || wget http://x curl http://y HTTP/1.1",
+    "GET http://localhost:8080/wp-admin/phpmyadmin?x=sleep(5) union select @@version from information_schema'||'%20or%20 or 1=1 svg/onload= javascript: c:\\windows HTTP/1.1",
+]
+
+
+# ================= LEGACY (Copy từ analyzer.py) =================
+def risk_score_legacy(text):
+    score = 0
+    low = text.lower()
+
+    sql_patterns = [
+        ("' or '1'='1", 8), (" or 1=1", 6), ("union select", 10), ("--", 4),
+        ("sleep(", 6), ("@@version", 4), ("information_schema", 6), ("'||", 3),
+        ("'%20or%20", 6),
+    ]
+    for pat, w in sql_patterns:
+        if pat in low:
+            score += w
+
+    xss_patterns = [
+        ("<script", 10), ("javascript:", 6), ("onerror=", 6), ("onload=", 5),
+        ("<img", 3), ("svg/on", 6),
+    ]
+    for pat, w in xss_patterns:
+        if pat in low:
+            score += w
+
+    traversal_patterns = [
+        ("../", 8), ("%2e%2e%2f", 8), ("%2e%2e/", 7), ("/etc/passwd", 10),
+        ("c:\\windows", 7),
+    ]
+    for pat, w in traversal_patterns:
+        if pat in low:
+            score += w
+
+    cmd_patterns = [
+        (";ls", 8), ("| ls", 8), ("| id", 8), ("| whoami", 8), ("wget http", 6),
+        ("curl http", 6), ("$(id)", 10), ("||", 4),
+    ]
+    for pat, w in cmd_patterns:
+        if pat in low:
+            score += w
+
+    brute_patterns = [("/phpmyadmin", 5), ("/wp-admin", 5), ("admin", 1), ("login", 1)]
+    ssi_patterns = [("<!--#exec", 10), ("<!--#include", 10), ("<!--#", 6)]
+    for pat, w in ssi_patterns:
+        if pat in low:
+            score += w
+
+    html_inject_patterns = [('"><', 8), ("</script>", 8), ("<script", 8)]
+    for pat, w in html_inject_patterns:
+        if pat in low:
+            score += w
+
+    encoded_traversal = [("%2e%2e%2f", 10), ("%2e%2e/", 10), ("%2e/", 8)]
+    for pat, w in encoded_traversal:
+        if pat in low:
+            score += w
+
+    faulty_body_patterns = [("precio=", 1), ("B1=", 1)]
+    for pat, w in faulty_body_patterns:
+        if pat in low:
+            score += w
+
+    for pat, w in brute_patterns:
+        if pat in low:
+            score += w
+
+    if low.startswith(("trace", "connect", "debug")):
+        score += 10
+
+    if ".jsp/" in low:
+        score += 5
+
+    return score
+
+
+# ================= HELPER FUNCTIONS =================
+def load_requests():
+    """Lấy request từ LOG_FOLDER (file đã split), nếu không có thì dùng data/*.txt"""
+    reqs = list(SAMPLE_REQUESTS)
+
+    if os.path.exists(LOG_FOLDER):
+        for file_path in sorted(Path(LOG_FOLDER).glob("*.txt")):
+            current = []
+            for line in file_path.read_text(errors="ignore").splitlines():
+                if line.strip() in ("SAFE|", "MALICIOUS|"):
+                    if current:
+                        reqs.append("\n".join(current).strip())
+                        current = []
+                    continue
+                current.append(line)
+            if current:
+                reqs.append("\n".join(current).strip())
+
+    for path in DATA_FILES:
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                reqs.extend(line.strip() for line in f if line.strip())
+
+    return reqs
+
+
+def bench(fn, reqs):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for r in reqs:
+            fn(r)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+# ================= MAIN BENCHMARK =================
+def main():
+    reqs = load_requests()
+    scorer = RiskScorer()
+    fallback = RiskScorer(use_automaton=False)
+
+    mismatches = [
+        r for r in reqs
+        if not risk_score_legacy(r) == scorer.score(r) == fallback.score(r)
+    ]
+
+    t_legacy = bench(risk_score_legacy, reqs)
+    t_new = bench(scorer.score, reqs)
+    t_fallback = bench(fallback.score, reqs)
+    t_batch = bench(lambda r: scorer.score_batch(reqs), [None])
+
+    scores, hits = scorer.score_batch(reqs)
+    mismatches += [r for r, s in zip(reqs, scores) if int(s) != risk_score_legacy(r)]
+
+    print("=" * 40)
+    print("📊 BENCHMARK RISK SCORE (LAYER 1)")
+    print("=" * 40)
+    print(f"Requests:      {len(reqs)}")
+    print(f"Mismatches:    {len(mismatches)}")
+    print(f"Legacy:        {t_legacy / len(reqs) * 1e6:.2f} µs/request")
+    print(f"RiskScorer:    {t_new / len(reqs) * 1e6:.2f} µs/request ({scorer.backend})")
+    print(f"Speedup:       {t_legacy / t_new:.2f}x")
+    print(f"Fallback:      {t_fallback / len(reqs) * 1e6:.2f} µs/request ({fallback.backend})")
+    print(f"score_batch:   {t_batch / len(reqs) * 1e6:.2f} µs/request (hits {hits.shape})")
+    print("-" * 40)
+    for r in SAMPLE_REQUESTS[:3]:
+        score, fired = scorer.explain(r)
+        print(f"score={score} fired={fired}")
+    print("=" * 40)
+
+    for r in mismatches[:5]:
+        print("❌ MISMATCH:", repr(r[:120]), risk_score_legacy(r), scorer.score(r))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+import re
+import sys
+import time
+import tracemalloc
+import urllib.parse
+
+# Thêm đường dẫn root để import được các module trong src
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.masking import selective_mask
+
+# ================= CONFIG =================
+DATA_FILES = [
+    os.path.join(ROOT_DIR, "data", "anomalousTrafficTest.txt"),
+    os.path.join(ROOT_DIR, "data", "normalTrafficTest.txt"),
+]
+REPEAT = 5
+
+# Request kiểu CSIC có IP/UUID/token/time để cả 4 nhánh mask đều chạy
+SAMPLE_REQUESTS = [
+    "GET http://localhost:8080/tienda1/index.jsp HTTP/1.1\r\nUser-Agent: Mozilla/5.0 (compatible; Konqueror/3.5; Linux) KHTML/3.5.8 (like Gecko)\r\nHost: localhost:8080\r\nCookie: JSESSIONID=EA414B3E327DED6875848530C864BD8F\r\nConnection: close",
+    "GET http://192.168.1.20:8080/tienda1/publico/anadir.jsp?id=2&nombre=Jam%F3n+Ib%E9rico&precio=85&cantidad=%27%3B+DROP+TABLE+usuarios HTTP/1.1\r\nX-Forwarded-For: 10.0.0.7\r\nDate: 12:31:05",
+    "POST http://localhost:8080/api/login?token=eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9abc HTTP/1.1\r\n\r\nsessionid=0123456789abcdefghijKLMNOP&request_id=550e8400-e29b-41d4-a716-446655440000",
+]
+
+
+# ================= LEGACY (Copy từ analyzer.py) =================
+def selective_mask_legacy(text):
+    text = text.replace("\r", "").replace("\t", " ")
+    decoded = urllib.parse.unquote(text)
+
+    decoded = re.sub(r"\b\d{1,3}(\.\d{1,3}){3}\b", "<IP>", decoded)
+    decoded = re.sub(
+        r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b",
+        "<UUID>",
+        decoded,
+    )
+    decoded = re.sub(
+        r"(token|sessionid|jwt|auth)=([A-Za-z0-9\-_]{20,})",
+        r"\1=<TOKEN>",
+        decoded,
+        flags=re.IGNORECASE,
+    )
+    decoded = re.sub(r"\b\d{2}:\d{2}:\d{2}\b", "<TIME>", decoded)
+
+    return decoded
+
+
+# ================= HELPER FUNCTIONS =================
+def load_requests():
+    reqs = []
+    for path in DATA_FILES:
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                reqs.extend(line.rstrip("\n") for line in f if line.strip())
+    # Trộn thêm request đầy đủ header để giống traffic thật
+    return reqs + SAMPLE_REQUESTS * max(1, len(reqs) // 10)
+
+
+def bench(fn, reqs):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for r in reqs:
+            fn(r)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def alloc_peak(fn, reqs):
+    """Peak bộ nhớ (bytes) cấp phát thêm trung bình cho mỗi request"""
+    peak = 0
+    tracemalloc.start()
+    for r in reqs:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        out = fn(r)
+        peak += tracemalloc.get_traced_memory()[1] - base
+        del out
+    tracemalloc.stop()
+    return peak / len(reqs)
+
+
+# ================= MAIN BENCHMARK =================
+def main():
+    reqs = load_requests()
+    mismatches = [r for r in reqs if selective_mask_legacy(r) != selective_mask(r)]
+
+    # Warm-up cache regex của module re cho bản cũ
+    selective_mask_legacy(reqs[0])
+
+    t_legacy = bench(selective_mask_legacy, reqs)
+    t_new = bench(selective_mask, reqs)
+
+    sample = SAMPLE_REQUESTS * 20
+    peak_legacy = alloc_peak(selective_mask_legacy, sample)
+    peak_new = alloc_peak(selective_mask, sample)
+
+    print("=" * 40)
+    print("📊 BENCHMARK SELECTIVE MASK")
+    print("=" * 40)
+    print(f"Requests:      {len(reqs)}")
+    print(f"Mismatches:    {len(mismatches)}")
+    print(f"Legacy:        {t_legacy / len(reqs) * 1e6:.2f} µs/request")
+    print(f"Single pass:   {t_new / len(reqs) * 1e6:.2f} µs/request")
+    print(f"Speedup:       {t_legacy / t_new:.2f}x")
+    print("-" * 40)
+    print(f"Legacy:        4 regex passes, {peak_legacy:.0f} B peak/request")
+    print(f"Single pass:   1 regex pass, {peak_new:.0f} B peak/request")
+    print("=" * 40)
+
+    for r in mismatches[:5]:
+        print("❌ MISMATCH:", repr(r[:120]))
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import os
+import random
+import sys
+import time
+
+# Thêm đường dẫn root để import được các module trong src
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.sessionizer import Sessionizer
+
+# ================= CONFIG =================
+N_REQUESTS = 100000
+N_ACTIVE_CLIENTS = 20        # Số client đang xen kẽ nhau tại 1 thời điểm
+SESSION_LENGTH = 30          # Số request trung bình mỗi session
+CONTEXT_REQUESTS = 5         # = CONTEXT_REQUESTS trong analyzer.py
+TTL = 60
+REQUESTS_PER_SECOND = 200    # Đồng hồ giả lập cho TTL
+SEED = 7
+
+PAGES = ["/tienda1/index.jsp", "/tienda1/publico/productos.jsp", "/tienda1/publico/anadir.jsp",
+         "/tienda1/publico/pagar.jsp", "/tienda1/miembros/editar.jsp", "/tienda1/publico/autenticar.jsp"]
+USER_AGENTS = ["Mozilla/5.0 (compatible; Konqueror/3.5; Linux) KHTML/3.5.8 (like Gecko)",
+               "Mozilla/5.0 (Windows NT 10.0; Win64; x64)", "curl/7.68.0"]
+
+
+# ================= HELPER FUNCTIONS =================
+def synthetic_traffic(rnd):
+    """(client_id, request thô CSIC) xen kẽ giữa N_ACTIVE_CLIENTS session đang mở"""
+    next_client = 0
+    active = {}
+    traffic = []
+    while len(traffic) < N_REQUESTS:
+        while len(active) < N_ACTIVE_CLIENTS:
+            active[next_client] = (f"{rnd.getrandbits(128):032X}", rnd.choice(USER_AGENTS), rnd.randint(1, 2 * SESSION_LENGTH))
+            next_client += 1
+        client = rnd.choice(list(active))
+        sid, ua, remaining = active[client]
+        req = (
+            f"SAFE|\nGET http://localhost:8080{rnd.choice(PAGES)} HTTP/1.1\nUser-Agent: {ua}\n"
+            f"Host: localhost:8080\nCookie: JSESSIONID={sid}\nConnection: close"
+        )
+        traffic.append((client, req))
+        if remaining <= 1:
+            del active[client]
+        else:
+            active[client] = (sid, ua, remaining - 1)
+    return traffic
+
+
+def purity(windows):
+    """Tỉ lệ request ngữ cảnh (không tính request hiện tại) thuộc cùng client với request hiện tại"""
+    same = total = 0
+    for client, window in windows:
+        for other in window[:-1]:
+            same += other == client
+            total += 1
+    return same / total if total else 0.0
+
+
+# ================= MAIN BENCHMARK =================
+def main():
+    traffic = synthetic_traffic(random.Random(SEED))
+
+    # Cửa sổ theo thứ tự trong file (analyzer.py hiện tại)
+    clients = [c for c, _ in traffic]
+    file_windows = [(c, clients[max(0, i - CONTEXT_REQUESTS + 1):i + 1]) for i, c in enumerate(clients)]
+
+    # Cửa sổ theo session
+    now = [0.0]
+    sessionizer = Sessionizer(ttl=TTL, max_items=CONTEXT_REQUESTS, clock=lambda: now[0])
+    session_windows = []
+    peak = 0
+    start = time.perf_counter()
+    for i, (client, req) in enumerate(traffic):
+        now[0] = i / REQUESTS_PER_SECOND
+        _, window = sessionizer.add(req, client)
+        session_windows.append((client, window))
+        peak = max(peak, sessionizer.stats()["sessions"])
+    elapsed = time.perf_counter() - start
+
+    stats = sessionizer.stats()
+    print("=" * 50)
+    print("📊 BENCHMARK SESSIONIZER")
+    print("=" * 50)
+    print(f"Requests: {N_REQUESTS}, {N_ACTIVE_CLIENTS} client xen kẽ, TTL {TTL}s ở {REQUESTS_PER_SECOND} req/s")
+    print(f"Ngữ cảnh cùng client - theo file:    {purity(file_windows):.1%}")
+    print(f"Ngữ cảnh cùng client - theo session: {purity(session_windows):.1%}")
+    print(f"Sessionizer: {elapsed / N_REQUESTS * 1e6:.1f} µs/request")
+    print(f"Session: đỉnh {peak}, còn {stats['sessions']}, hết hạn {stats['expired']}, bị đẩy {stats['evicted']}")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import subprocess
+import sys
+import time
+
+# Thêm đường dẫn root để import được các module trong src
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.serving import INT8_PATH
+
+# ================= CONFIG =================
+VOCAB_SIZE = 3551
+REPEAT = 3
+TOP_MODULES = 5
+
+# Bản trước khi lazy: src/__init__ import mọi module, transformers + google.generativeai + Drain3 lúc import
+EAGER_IMPORTS = (
+    "import src.parser, src.detector, src.explainer, src.risk; "
+    "from transformers import BertForMaskedLM; import google.generativeai; "
+    "from src.parser import template_cache"
+)
+SCENARIOS = [
+    ("import src (cũ, eager)", EAGER_IMPORTS),
+    ("import src", "import src"),
+    ("import analyzer.py (phần src)", "from src import parsing_http_requests, LlmExplainer, RiskRuleWatcher, TemplateMatcher; LlmExplainer()"),
+    ("from src import LogBertAnalyzer", "from src import LogBertAnalyzer"),
+    ("warm-up eager", f"from src.serving import load_analyzer; load_analyzer({VOCAB_SIZE}).warm_up()"),
+    ("warm-up int8", f"from src.serving import load_analyzer; load_analyzer({VOCAB_SIZE}, 'int8').warm_up()"),
+    ("warm-up Gemini", "from src import LlmExplainer; LlmExplainer().warm_up()"),
+]
+
+
+# ================= HELPER FUNCTIONS =================
+def parse_importtime(stderr):
+    """Dòng `import time: self | cumulative | package` -> {package top-level: cumulative µs}"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        if name.startswith("  "):  # thụt lề = import lồng bên trong module khác
+            continue
+        modules[name.strip()] = int(cumulative_us)
+    return modules
+
+
+def run_scenario(code):
+    """(giây wall tốt nhất, {module: µs}) khi chạy code trong 1 interpreter mới"""
+    best, modules = None, {}
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=ROOT_DIR, capture_output=True, text=True,
+        )
+        elapsed = time.perf_counter() - start
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+        if best is None or elapsed < best:
+            best, modules = elapsed, parse_importtime(proc.stderr)
+    return best, modules
+
+
+# ================= MAIN BENCHMARK =================
+def main():
+    print("=" * 70)
+    print("📊 BENCHMARK STARTUP (python -X importtime, interpreter mới mỗi lần)")
+    print("=" * 70)
+    for name, code in SCENARIOS:
+        if "'int8'" in code and not INT8_PATH.exists():
+            print(f"{name:<34} bỏ qua (chưa có {INT8_PATH.name}, chạy benchmark_bert_export.py)")
+            continue
+        try:
+            elapsed, modules = run_scenario(code)
+        except RuntimeError as e:
+            print(f"{name:<34} lỗi: {e}")
+            continue
+        heaviest = sorted(modules.items(), key=lambda x: -x[1])[:TOP_MODULES]
+        top = ", ".join(f"{m} {us / 1e6:.2f}s" for m, us in heaviest)
+        print(f"{name:<34} {elapsed:>6.2f} s   {top}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
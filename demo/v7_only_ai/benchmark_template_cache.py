@@ -0,0 +1,166 @@
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+# Thêm đường dẫn root để import được các module trong src
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from drain3 import TemplateMiner
+from drain3.template_miner_config import TemplateMinerConfig
+from demo.drain3_instance import SnapshotPersistence
+from src.masking import CONFIG_PATH
+from src.template_cache import TemplateCache
+
+# ================= CONFIG =================
+DATA_FILES = [
+    os.path.join(ROOT_DIR, "data", "anomalousTrafficTest.txt"),
+    os.path.join(ROOT_DIR, "data", "normalTrafficTest.txt"),
+]
+N_SYNTHETIC = 20000
+SEED = 7
+THREADS = 8
+
+PATHS = [
+    "/tienda1/index.jsp", "/tienda1/publico/anadir.jsp", "/tienda1/publico/autenticar.jsp",
+    "/tienda1/publico/pagar.jsp", "/tienda1/miembros/editar.jsp", "/tienda1/imagenes/logo.gif",
+]
+AGENTS = [
+    "Mozilla/5.0 (compatible; Konqueror/3.5; Linux) KHTML/3.5.8 (like Gecko)",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/115.0",
+]
+PAYLOADS = ["", "%27+or+%271%27%3D%271", "<script>alert(1)</script>", "../../etc/passwd", "1 union select 1,2,3"]
+
+
+# ================= HELPER FUNCTIONS =================
+def new_miner(persistence=None):
+    config = TemplateMinerConfig()
+    config.load(str(CONFIG_PATH))
+    config.profiling_enabled = False
+    return TemplateMiner(persistence, config=config)
+
+
+def synthetic_requests(n, seed=SEED):
+    """Request kiểu CSIC (đã nối 1 dòng như parsing_http_requests): header lặp lại, id/session thay đổi"""
+    rnd = random.Random(seed)
+    reqs = []
+    for _ in range(n):
+        params = f"id={rnd.randint(1, 9)}&cantidad={rnd.randint(1, 99)}"
+        if rnd.random() < 0.2:
+            params += "&nombre=" + rnd.choice(PAYLOADS)
+        reqs.append(
+            f"{rnd.choice(['GET', 'POST'])} http://localhost:8080{rnd.choice(PATHS)}?{params} HTTP/1.1 "
+            f"User-Agent: {rnd.choice(AGENTS)} Pragma: no-cache Cache-control: no-cache "
+            "Accept: text/xml,application/xml,application/xhtml+xml,text/html;q=0.9 "
+            "Accept-Encoding: x-gzip, x-deflate, gzip, deflate Accept-Charset: utf-8, utf-8;q=0.5, * ;q=0.5 "
+            f"Host: localhost:8080 Cookie: JSESSIONID={rnd.getrandbits(128):032X} Connection: close"
+        )
+    return reqs
+
+
+def load_requests():
+    reqs = []
+    for path in DATA_FILES:
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                reqs.extend(line.strip() for line in f if line.strip())
+    return reqs + synthetic_requests(N_SYNTHETIC)
+
+
+def run(add, reqs):
+    start = time.perf_counter()
+    out = [add(r) for r in reqs]
+    return time.perf_counter() - start, out
+
+
+def run_threads(cache, reqs, n_threads):
+    """Chia request cho n_threads cùng ghi vào 1 TemplateCache, trả về (thời gian, số lỗi)"""
+    errors = []
+
+    def feed(chunk):
+        for r in chunk:
+            try:
+                cache.add_log_message(r)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=feed, args=(reqs[i::n_threads],)) for i in range(n_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, errors
+
+
+# ================= MAIN BENCHMARK =================
+def main():
+    reqs = load_requests()
+
+    plain = new_miner()
+    t_plain, out_plain = run(plain.add_log_message, reqs)
+
+    cache = TemplateCache(new_miner())
+    t_cache, out_cache = run(cache.add_log_message, reqs)
+
+    mismatches = [
+        (r, a, b) for r, a, b in zip(reqs, out_plain, out_cache)
+        if (a["cluster_id"], a["template_mined"], a["cluster_size"])
+        != (b["cluster_id"], b["template_mined"], b["cluster_size"])
+    ]
+    stats = cache.stats()
+
+    print("=" * 40)
+    print("📊 BENCHMARK TEMPLATE CACHE (DRAIN3)")
+    print("=" * 40)
+    print(f"Requests:       {len(reqs)}")
+    print(f"Clusters:       {len(plain.drain.clusters)}")
+    print(f"Mismatches:     {len(mismatches)} (cluster_id/template/size so với Drain3 không cache)")
+    print(f"Drain3:         {t_plain / len(reqs) * 1e6:.2f} µs/request")
+    print(f"TemplateCache:  {t_cache / len(reqs) * 1e6:.2f} µs/request")
+    print(f"Speedup:        {t_plain / t_cache:.2f}x")
+    print(f"Hit rate:       {stats['hit_rate']:.2%} ({stats['size']} entry, {stats['invalidations']} invalidation)")
+    print("-" * 40)
+
+    # Nhiều thread ghi chung: tổng size các cluster phải đúng bằng số request
+    # (max_clusters bỏ qua để không cluster nào bị đẩy ra khi đếm)
+    miner = new_miner()
+    miner.drain.max_clusters = None
+    miner.drain.id_to_cluster = {}
+    shared = TemplateCache(miner)
+    t_threads, errors = run_threads(shared, reqs, THREADS)
+    total_size = sum(c.size for c in miner.drain.clusters)
+    print(f"{THREADS} threads:      {t_threads / len(reqs) * 1e6:.2f} µs/request, {len(errors)} lỗi")
+    print(f"Cluster size:   {total_size}/{len(reqs)} ({len(miner.drain.clusters)} clusters)")
+    print("-" * 40)
+
+    # Snapshot nền + khôi phục lúc khởi động (file tạm, không đụng models/)
+    with tempfile.TemporaryDirectory() as tmp:
+        persistence = SnapshotPersistence(os.path.join(tmp, "state.bin"), os.path.join(tmp, "missing.bin"))
+        live = TemplateCache(new_miner(persistence)).start_snapshots(interval=3600)
+        t_live, _ = run(live.add_log_message, reqs)
+        start = time.perf_counter()
+        size = live.snapshot()
+        t_save = time.perf_counter() - start
+        live.stop_snapshots()
+
+        start = time.perf_counter()
+        restored = new_miner(SnapshotPersistence(os.path.join(tmp, "state.bin")))
+        t_restore = time.perf_counter() - start
+        same = [c.get_template() for c in restored.drain.clusters] == [c.get_template() for c in live.miner.drain.clusters]
+
+    print(f"Snapshot nền:   {t_live / len(reqs) * 1e6:.2f} µs/request (hot path chỉ đánh dấu dirty)")
+    print(f"Snapshot:       {size} bytes, ghi {t_save * 1000:.1f} ms")
+    print(f"Restore:        {t_restore * 1000:.1f} ms, {len(restored.drain.clusters)} clusters, khớp: {same}")
+    print("=" * 40)
+
+    for r, a, b in mismatches[:5]:
+        print("❌ MISMATCH:", repr(r[:100]), a["cluster_id"], b["cluster_id"])
+
+
+if __name__ == "__main__":
+    main()
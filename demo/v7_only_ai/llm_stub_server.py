@@ -0,0 +1,98 @@
+"""
+Stub KoboldCPP (POST /api/v1/generate, GET /) cho benchmark client LLM, không cần GPU/model.
+Chạy riêng: python llm_stub_server.py --port 5001 --delay 0.005
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LABELS = ("safe", "malicious", "unknown")
+# Prompt lô (src/prompt_batch.py): "Request 1:\n...\n\nRequest 2:\n..."
+BATCH_ITEM_RE = re.compile(r"^Request (\d+):\n(.*?)(?=^Request \d+:|^Answers:)", re.MULTILINE | re.DOTALL)
+
+
+def stub_label(text):
+    text = text.lower()
+    return "malicious" if "select" in text or "<script" in text else "safe"
+
+
+def stub_answer(prompt):
+    """Câu trả lời giả: request có 'select' / '<script' -> malicious, còn lại safe; prompt lô -> mỗi dòng '<số>: <nhãn>'"""
+    items = BATCH_ITEM_RE.findall(prompt)
+    if items:
+        return "\n".join(f"{n}: {stub_label(req)}" for n, req in items)
+    return stub_label(prompt)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive như KoboldCPP
+    # Header và body gửi 2 lần write: không tắt Nagle thì kết nối keep-alive dính delayed ACK ~40 ms
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._send_json({"result": "KoboldCpp stub"})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        self.server.requests_served += 1
+        prompt = payload.get("prompt", "")
+        answer = self.server.answer(prompt)
+        # Giả lập thời gian sinh: cố định + theo độ dài prompt (prefill) + theo độ dài câu trả lời (decode)
+        time.sleep(
+            self.server.delay
+            + len(prompt) * self.server.delay_per_char
+            + len(answer) * self.server.delay_per_output_char
+        )
+        self._send_json({"results": [{"text": " " + answer}]})
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, delay=0.0, delay_per_char=0.0, delay_per_output_char=0.0, answer=stub_answer):
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.delay = delay
+        self.delay_per_char = delay_per_char
+        self.delay_per_output_char = delay_per_output_char
+        self.answer = answer
+        self.requests_served = 0
+        self.connections = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api/v1/generate"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+    print(f"KoboldCPP stub: http://127.0.0.1:{args.port}/api/v1/generate")
+    StubServer(args.port, args.delay).serve_forever()
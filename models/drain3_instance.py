@@ -1,8 +1,3 @@
-from drain3 import TemplateMiner
-from drain3.template_miner_config import TemplateMinerConfig
-
-CONFIG_PATH = 'D:/Projects/TTTN/detect-anomalous-application-logging/drain3.ini'
-
-config = TemplateMinerConfig()
-config.load(CONFIG_PATH)
-drain3_instance = TemplateMiner(config=config)
+# Dùng chung đúng 1 TemplateMiner với demo/drain3_instance.py, mọi luồng ghi đi qua
+# src.parser.template_cache (có lock) thay vì tạo thêm 1 instance không được bảo vệ
+from demo.drain3_instance import config, drain3_instance
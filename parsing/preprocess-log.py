@@ -1,8 +1,12 @@
 import os
 import re
-import urllib.parse
+import sys
 
-from models.drain3_instance import drain3_instance
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.masking import masker
 
 # --- CẤU HÌNH ---
 INPUT_FOLDER = "output_logs/csic_2010_anomalous"       # Thư mục chứa các file log gốc cần xử lý
@@ -16,11 +20,9 @@ def preprocess_log(log_string):
     try:
         # 1. URL Decode: Chuyển %20 -> space, %3C -> <, ...
         # Giúp model học được ký tự thật thay vì mã hex
-        log_string = urllib.parse.unquote(log_string)
-
-        # 2. Selective Masking (Masking chọn lọc)
-
-        log_string = drain3_instance.masker.mask(log_string)
+        # 2. Selective Masking (Masking chọn lọc) theo [MASKING] trong drain3.ini
+        # -> cả 2 bước nằm trong masker dùng chung (src/masking.py), giống hệt lúc suy luận
+        log_string = masker.mask(log_string)
         # Mask Session ID (Hex 32 ký tự) -> <UUID>
         # Regex này bắt chuỗi JSESSIONID= theo sau là 32 ký tự hex
         # log_string = re.sub(r'(JSESSIONID=)[a-fA-F0-9]{32}', r'\1<UUID>', log_string)
@@ -1,4 +1,25 @@
-from src.parser import parsing_http_requests, process_log_string
-from src.detector import LogBertAnalyzer
-from src.explainer import LlmExplainer
+import importlib
 
+# Export lười: `from src import X` chỉ import module chứa X,
+# torch / transformers / google.generativeai / Drain3 chỉ nạp khi thật sự dùng tới
+_EXPORTS = {
+    "parsing_http_requests": "src.parser",
+    "process_log_string": "src.parser",
+    "TemplateMatcher": "src.parser",
+    "LogBertAnalyzer": "src.detector",
+    "InferenceBatcher": "src.detector",
+    "StreamingDetector": "src.streaming",
+    "LlmExplainer": "src.explainer",
+    "RiskScorer": "src.risk",
+    "RiskRuleWatcher": "src.risk",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module 'src' has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
@@ -1,96 +1,464 @@
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from pathlib import Path
+
 import torch
-from transformers import BertConfig, BertForMaskedLM
 
-MODEL_PATH = "models/saved_bert/logbert_trained.pth"
+MODEL_DIR = Path(__file__).resolve().parent.parent / "models" / "saved_bert"
+MODEL_PATH = MODEL_DIR / "logbert_trained.pth"
+# Số dòng logits xử lý mỗi lần trong rank_logits
+RANK_CHUNK = 1024
+# Số verdict cửa sổ giữ trong VerdictCache (0 = tắt)
+VERDICT_CACHE_SIZE = 65536
+
+
+def last_positions(event_ids, last_n):
+    return range(max(0, len(event_ids) - last_n), len(event_ids))
+
+
+def sliding_windows(event_ids, max_len, pad_token_id, positions=None):
+    """Cửa sổ (max_len event đứng trước, pad bên trái) + label + vị trí cho từng vị trí trong positions"""
+    sequences = []
+    labels = []
+    indices = []
+
+    # Tạo cửa sổ trượt
+    if len(event_ids) < 1: 
+        return [], [], []
+
+    if positions is None:
+        positions = range(len(event_ids))
+
+    for i in positions:
+        label = event_ids[i]
+        context = event_ids[max(0, i - max_len) : i]
+        
+        if len(context) < max_len:
+            padding_len = max_len - len(context)
+            context = [pad_token_id] * padding_len + context
+        
+        sequences.append(context)
+        labels.append(label)
+        indices.append(i)
+
+    return sequences, labels, indices
+
+
+def model_version(model_path):
+    """Định danh checkpoint (tên + kích thước + mtime): thay file model là verdict cũ trong cache mất hiệu lực"""
+    try:
+        stat = os.stat(model_path)
+        return f"{Path(model_path).name}:{stat.st_size}:{stat.st_mtime_ns}"
+    except OSError:
+        return str(model_path)
+
+
+class VerdictCache:
+    """
+    LRU cho verdict từng cửa sổ: (phiên bản model, top_k, ngưỡng, cửa sổ, event thật) -> (is_anomalous, prob, rank).
+    File unknown hay kết thúc bằng cùng 1 chuỗi request boilerplate -> cùng cửa sổ, chấm lại là thừa.
+    Chỉ các cửa sổ chưa có trong cache mới đi qua model (cửa sổ trùng nhau trong 1 lô chỉ chấm 1 lần).
+    Thread-safe; forward chạy ngoài lock.
+    """
+
+    def __init__(self, max_size=VERDICT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def score(self, keys, compute):
+        """
+        keys: 1 key mỗi cửa sổ. compute(indices) chấm các cửa sổ keys[i] chưa có trong cache,
+        trả về list kết quả cùng thứ tự. Trả về kết quả cho mọi key.
+        """
+        results = []
+        pending = {}  # key -> các vị trí trong lô cần kết quả này
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                elif key in pending:
+                    self.hits += 1
+                    pending[key].append(i)
+                else:
+                    self.misses += 1
+                    pending[key] = [i]
+                results.append(entry)
+
+        if not pending:
+            return results
+
+        computed = compute([indices[0] for indices in pending.values()])
+        with self._lock:
+            for (key, indices), value in zip(pending.items(), computed):
+                self._entries[key] = value
+                for i in indices:
+                    results[i] = value
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+        }
+
+
+def build_logbert(vocab_size):
+    """Cấu trúc LogBERT (BertForMaskedLM nhỏ) dùng chung cho train, detect và export"""
+    # Import ở đây: transformers mất vài giây để import, runtime int8/ONNX không cần tới
+    from transformers import BertConfig, BertForMaskedLM
+
+    config = BertConfig(
+        vocab_size=vocab_size + 10,
+        hidden_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        max_position_embeddings=512
+    )
+    return BertForMaskedLM(config)
+
+
+def last_token_logits(model, input_ids):
+    """
+    Chạy encoder rồi chỉ đưa hidden state ở vị trí cuối ([MASK]) qua MLM head,
+    thay vì tính logits cho cả max_len + 1 vị trí rồi bỏ đi.
+    """
+    hidden = model.bert(input_ids=input_ids, return_dict=False)[0][:, -1, :]
+    return model.cls.predictions(hidden)
 
 
 class LogBertAnalyzer:
-    def __init__(self, vocab_size, max_len=5):
+    def __init__(self, vocab_size, max_len=5, scoring="rank", model_path=MODEL_PATH, cache_size=VERDICT_CACHE_SIZE):
         self.vocab_size = vocab_size
         self.max_len = max_len
+        # "rank": rank + prob từ logits (rank_logits); "topk": softmax + topk như bản gốc
+        self.scoring = scoring
         self.device = torch.device("cpu")
 
         self.mask_token_id = vocab_size
+        # vocab_size + 1 = [PAD], vocab_size + 2 = EventId cho request không khớp template nào (TemplateMatcher)
+        self.unknown_token_id = vocab_size + 2
+
+        self.model_path = model_path
+        self.model = self._load_model(model_path)
 
+        # Tập EventId cần chấm (restrict_to_events), None = toàn bộ vocab
+        self._subset_ids = None
+        self._label_columns = None
+        self._head = None
+
+        # Verdict cửa sổ đã chấm; key gồm cache_version nên đổi checkpoint / scoring / tập event không dùng nhầm
+        self.verdict_cache = VerdictCache(cache_size) if cache_size else None
+        self.model_version = f"{type(self).__name__}:{model_version(model_path)}"
+        self.cache_version = f"{self.model_version}|{scoring}|all"
+
+    def _load_model(self, model_path):
         # 1. Khởi tạo cấu trúc LogBERT
-        config = BertConfig(
-            vocab_size=vocab_size + 10,
-            hidden_size=128,
-            num_hidden_layers=2,
-            num_attention_heads=2,
-            max_position_embeddings=512
-        )
-        self.model = BertForMaskedLM(config).to(self.device)
-        self.model.load_state_dict(torch.load(MODEL_PATH, map_location=self.device))
-        self.model.eval()
-
-    def prepare_sequences(self, event_ids):
-        sequences = []
-        labels = []
-        indices = []
-
-        pad_token_id = self.vocab_size + 1
-        # Tạo cửa sổ trượt
-        if len(event_ids) < 1: 
-            return [], [], []
-        
-        for i in range(len(event_ids)):
-            label = event_ids[i]
-            context = event_ids[max(0, i - self.max_len) : i]
-            
-            if len(context) < self.max_len:
-                padding_len = self.max_len - len(context)
-                context = [pad_token_id] * padding_len + context
-            
-            sequences.append(context)
-            labels.append(label)
-            indices.append(i)
-
-        return sequences, labels, indices
+        model = build_logbert(self.vocab_size).to(self.device)
+        model.load_state_dict(torch.load(model_path, map_location=self.device))
+        model.eval()
+        return model
 
-    def detect_anomalies(self, event_ids, top_k=20, confidence_threshold=0.0):
-        sequences, labels, line_indices = self.prepare_sequences(event_ids)
-        if not sequences:
-            return {
-                "total_logs": len(event_ids),
-                "total_windows": 0,
-                "anomaly_count": 0,
-                "anomalies": []
-            }
+    def warm_up(self):
+        """Chạy thử 1 forward: lần forward đầu tiên chậm hơn hẳn (khởi tạo kernel/allocator)"""
+        self._last_token_logits([[self.vocab_size + 1] * self.max_len])
+        return self
+
+    def _forward(self, masked_input):
+        """
+        Logits ở vị trí cuối (vị trí [MASK]), shape [batch, vocab_size + 10],
+        hoặc [batch, số event + 1] nếu đã restrict_to_events.
+        """
+        if self._head is None:
+            # Chúng ta chỉ quan tâm dự đoán ở vị trí cuối cùng của chuỗi
+            return self._select_events(last_token_logits(self.model, masked_input))
+
+        hidden = self.model.bert(input_ids=masked_input, return_dict=False)[0][:, -1, :]
+        hidden = self.model.cls.predictions.transform(hidden)
+        weight, bias = self._head
+        return self._pad_unknown_column(torch.nn.functional.linear(hidden, weight, bias))
+
+    def restrict_to_events(self, event_ids):
+        """
+        Chỉ chiếu hidden state lên các dòng decoder của event_ids (ví dụ các cluster trong snapshot Drain3)
+        thay vì cả vocab_size + 10 token. Rank/prob khi đó tính trong tập event này,
+        EventId ngoài tập coi như prob = 0 (luôn bất thường). event_ids=None: quay lại toàn bộ vocab.
+        """
+        if event_ids is None:
+            self._subset_ids = self._label_columns = self._head = None
+            self.cache_version = f"{self.model_version}|{self.scoring}|all"
+            return
 
+        ids = sorted(set(event_ids))
+        self.cache_version = f"{self.model_version}|{self.scoring}|{hash(tuple(ids))}"
+        self._subset_ids = torch.tensor(ids, dtype=torch.long, device=self.device)
+        # EventId -> cột logits; EventId ngoài tập -> cột cuối (luôn -inf)
+        self._label_columns = torch.full((self.vocab_size + 10,), len(ids), dtype=torch.long)
+        self._label_columns[self._subset_ids] = torch.arange(len(ids))
+
+        decoder = getattr(self.model, "cls", None)
+        if isinstance(decoder, torch.nn.Module) and isinstance(decoder.predictions.decoder, torch.nn.Linear):
+            decoder = decoder.predictions.decoder
+            self._head = (
+                decoder.weight.detach()[self._subset_ids].clone(),
+                decoder.bias.detach()[self._subset_ids].clone(),
+            )
+
+    def _select_events(self, logits):
+        """Cho runtime không tách được head (TorchScript/ONNX): cắt logits đầy đủ theo tập event"""
+        if self._subset_ids is None:
+            return logits
+        return self._pad_unknown_column(logits.index_select(1, self._subset_ids))
+
+    @staticmethod
+    def _pad_unknown_column(logits):
+        pad = torch.full((logits.shape[0], 1), float("-inf"), dtype=logits.dtype, device=logits.device)
+        return torch.cat([logits, pad], dim=1)
+
+    def make_input(self, sequences):
+        """Cửa sổ -> tensor input_ids có thêm cột [MASK] ở cuối"""
         # Chuyển sang Tensor
         input_ids = torch.tensor(sequences, dtype=torch.long).to(self.device)
 
         batch_size = input_ids.shape[0]
         mask_column = torch.full((batch_size, 1), self.mask_token_id, dtype=torch.long).to(self.device)
-        masked_input = torch.cat([input_ids, mask_column], dim=1)
+        return torch.cat([input_ids, mask_column], dim=1)
 
-        anomalies = []
+    def prepare_sequences(self, event_ids, positions=None):
+        """
+        Tạo cửa sổ trượt cho từng vị trí (0-based) trong positions, mặc định là mọi vị trí.
+        Mỗi cửa sổ chỉ cần max_len event đứng trước nên chi phí chỉ phụ thuộc số vị trí cần chấm.
+        """
+        return sliding_windows(event_ids, self.max_len, self.vocab_size + 1, positions)
 
+    def _last_token_logits(self, sequences):
+        masked_input = self.make_input(sequences)
         with torch.no_grad():
-            outputs = self.model(masked_input)
-            predictions = outputs.logits  # Shape: [batch, sequence_length, vocab_size]
+            return self._forward(masked_input)
 
-            # Chúng ta chỉ quan tâm dự đoán ở vị trí cuối cùng của chuỗi
-            last_token_logits = predictions[:, -1, :]
+    def score_windows(self, sequences, labels, top_k=20, confidence_threshold=0.0):
+        """
+        Chấm 1 lô cửa sổ (có thể gom từ nhiều file) trong 1 forward pass.
+        Trả về list (is_anomalous, prob của token thật, rank) theo đúng thứ tự cửa sổ.
+        Có verdict_cache: cửa sổ đã chấm (cùng model + top_k + ngưỡng) lấy từ cache, không qua model.
+        """
+        if self.verdict_cache is None:
+            return self.score_logits(self._last_token_logits(sequences), labels, top_k, confidence_threshold)
+
+        def compute(indices):
+            logits = self._last_token_logits([sequences[i] for i in indices])
+            return self.score_logits(logits, [labels[i] for i in indices], top_k, confidence_threshold)
+
+        keys = [
+            (self.cache_version, top_k, confidence_threshold, tuple(seq), label)
+            for seq, label in zip(sequences, labels)
+        ]
+        return self.verdict_cache.score(keys, compute)
+
+    def score_logits(self, last_token_logits, labels, top_k=20, confidence_threshold=0.0):
+        """
+        Hậu xử lý logits vị trí [MASK] -> list (is_anomalous, prob của token thật, rank).
+        scoring="rank": dùng rank_logits; scoring="topk": softmax + topk như bản gốc (rank = None).
+        """
+        if self._label_columns is not None:
+            labels = self._label_columns[torch.tensor(labels, dtype=torch.long)].tolist()
+
+        if self.scoring == "rank":
+            ranks, log_probs = self.rank_logits(last_token_logits, labels)
+            current_probs = log_probs.exp()
+            # Token thật nằm trong top K <=> có ít hơn K token có logit lớn hơn nó
+            anomalous = (ranks >= top_k) | (current_probs < confidence_threshold)
+            return list(zip(anomalous.tolist(), current_probs.tolist(), ranks.tolist()))
 
+        with torch.no_grad():
             # Lấy top K dự đoán có xác suất cao nhất
             probs = torch.softmax(last_token_logits, dim=-1)
             top_preds = torch.topk(probs, k=top_k, dim=-1).indices
 
-        # Kiểm tra: Nếu token thực tế (labels) KHÔNG nằm trong top K dự đoán -> Bất thường
-        for idx, (real_token, pred_tokens) in enumerate(zip(labels, top_preds)):
-                current_prob = probs[idx, real_token].item()
-                if (real_token not in pred_tokens.tolist()) or (current_prob < confidence_threshold):
-                    anomalies.append({
-                        "LineId": line_indices[idx] + 1,
-                        "EventId": real_token,
-                        "Confidence": current_prob
-                    })
+            # Kiểm tra: Nếu token thực tế (labels) KHÔNG nằm trong top K dự đoán -> Bất thường
+            # Làm trên cả tensor, chỉ chuyển về Python 1 lần ở cuối (không .item()/.tolist() từng dòng)
+            real_tokens = torch.tensor(labels, dtype=torch.long, device=probs.device).unsqueeze(1)
+            current_probs = probs.gather(1, real_tokens).squeeze(1)
+            in_top_k = (top_preds == real_tokens).any(dim=1)
+            anomalous = ~in_top_k | (current_probs < confidence_threshold)
+
+        return [(a, p, None) for a, p in zip(anomalous.tolist(), current_probs.tolist())]
+
+    def rank_logits(self, last_token_logits, labels, chunk_size=RANK_CHUNK):
+        """
+        Rank và log-prob của token thật tính thẳng từ logits, không softmax toàn vocab, không topk:
+        - rank = số token có logit lớn hơn logit của token thật (0 = đúng dự đoán số 1)
+        - log_prob = logit thật - logsumexp(logits)
+        Chạy theo từng khúc chunk_size dòng để mỗi khúc logits nằm gọn trong cache CPU.
+        """
+        real_tokens = torch.tensor(labels, dtype=torch.long, device=last_token_logits.device).unsqueeze(1)
+        ranks, log_probs = [], []
+        with torch.no_grad():
+            for start in range(0, len(labels), chunk_size):
+                logits = last_token_logits[start:start + chunk_size]
+                true_logits = logits.gather(1, real_tokens[start:start + chunk_size])
+                ranks.append(torch.gt(logits, true_logits).sum(dim=1, dtype=torch.int32))
+                log_probs.append(true_logits.squeeze(1) - torch.logsumexp(logits, dim=1))
+        return torch.cat(ranks), torch.cat(log_probs)
+
+    @staticmethod
+    def build_report(event_ids, labels, line_indices, window_results):
+        anomalies = []
+        ranks = {}
+        for real_token, line_idx, (is_anomalous, current_prob, rank) in zip(labels, line_indices, window_results):
+            if rank is not None:
+                # Rank liên tục cho dashboard (càng lớn càng bất thường), có cho cả cửa sổ bình thường
+                ranks[line_idx + 1] = rank
+            if is_anomalous:
+                anomaly = {
+                    "LineId": line_idx + 1,
+                    "EventId": real_token,
+                    "Confidence": current_prob
+                }
+                if rank is not None:
+                    anomaly["Rank"] = rank
+                anomalies.append(anomaly)
 
         return {
             "total_logs": len(event_ids),
-            "total_windows": len(sequences),
+            "total_windows": len(labels),
             "anomaly_count": len(anomalies),
-            "anomalies": anomalies
+            "anomalies": anomalies,
+            "ranks": ranks
         }
+
+    def detect_anomalies(self, event_ids, top_k=20, confidence_threshold=0.0):
+        sequences, labels, line_indices = self.prepare_sequences(event_ids)
+        if not sequences:
+            return self.build_report(event_ids, [], [], [])
+
+        window_results = self.score_windows(sequences, labels, top_k, confidence_threshold)
+        return self.build_report(event_ids, labels, line_indices, window_results)
+
+    def detect_positions(self, event_ids, positions, top_k=20, confidence_threshold=0.0):
+        """
+        Giống detect_anomalies nhưng chỉ chấm các vị trí (0-based) trong positions.
+        Verdict của mỗi vị trí giống hệt khi quét toàn bộ.
+        """
+        sequences, labels, line_indices = self.prepare_sequences(event_ids, positions)
+        if not sequences:
+            return self.build_report(event_ids, [], [], [])
+
+        window_results = self.score_windows(sequences, labels, top_k, confidence_threshold)
+        return self.build_report(event_ids, labels, line_indices, window_results)
+
+    def detect_last(self, event_ids, last_n=1, top_k=20, confidence_threshold=0.0):
+        """Chỉ chấm last_n request cuối (process_single_file chỉ cần request cuối cùng)"""
+        return self.detect_positions(event_ids, last_positions(event_ids, last_n), top_k, confidence_threshold)
+
+
+class InferenceBatcher:
+    """
+    Micro-batching cho LogBERT: gom cửa sổ của nhiều file (nhiều caller) vào chung
+    1 forward pass thay vì mỗi file 1 lần với batch 1-5 cửa sổ.
+    - submit(event_ids) trả về Future, kết quả giống hệt analyzer.detect_anomalies.
+    - Thread nền flush khi đủ max_batch cửa sổ hoặc khi job đầu tiên đã chờ quá max_wait giây.
+    """
+
+    def __init__(self, analyzer, max_batch=256, max_wait=0.02, top_k=20, confidence_threshold=0.0):
+        self.analyzer = analyzer
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.top_k = top_k
+        self.confidence_threshold = confidence_threshold
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self.batches = 0
+        self.windows = 0
+
+    def submit(self, event_ids, last_n=None):
+        """last_n=None: chấm mọi vị trí; last_n=k: chỉ chấm k request cuối"""
+        future = Future()
+        positions = None if last_n is None else last_positions(event_ids, last_n)
+        sequences, labels, line_indices = self.analyzer.prepare_sequences(event_ids, positions)
+        if not sequences:
+            future.set_result(self.analyzer.build_report(event_ids, [], [], []))
+        else:
+            self._queue.put((event_ids, sequences, labels, line_indices, future))
+        return future
+
+    def detect_anomalies(self, event_ids, last_n=None, timeout=None):
+        return self.submit(event_ids, last_n).result(timeout)
+
+    def _collect(self):
+        """Chờ job đầu tiên, sau đó gom thêm tới khi đủ max_batch cửa sổ hoặc hết max_wait"""
+        try:
+            jobs = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+
+        n_windows = len(jobs[0][1])
+        deadline = time.monotonic() + self.max_wait
+        while n_windows < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            jobs.append(job)
+            n_windows += len(job[1])
+        return jobs
+
+    def _run(self, jobs):
+        sequences, labels = [], []
+        for _, seqs, labs, _, _ in jobs:
+            sequences.extend(seqs)
+            labels.extend(labs)
+
+        try:
+            window_results = self.analyzer.score_windows(sequences, labels, self.top_k, self.confidence_threshold)
+        except Exception as e:
+            for job in jobs:
+                job[4].set_exception(e)
+            return
+
+        self.batches += 1
+        self.windows += len(sequences)
+
+        # Trả kết quả từng đoạn về đúng caller
+        offset = 0
+        for event_ids, seqs, labs, line_indices, future in jobs:
+            part = window_results[offset:offset + len(seqs)]
+            offset += len(seqs)
+            future.set_result(self.analyzer.build_report(event_ids, labs, line_indices, part))
+
+    def _loop(self):
+        while not self._stop.is_set():
+            jobs = self._collect()
+            if jobs:
+                self._run(jobs)
+
+    def start(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
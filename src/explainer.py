@@ -1,5 +1,5 @@
 import os
-import google.generativeai as genai
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,8 +9,24 @@ API_KEY = os.getenv("GOOGLE_API_KEY")
 class LlmExplainer:
     def __init__(self, api_key=None):
         self.api_key = API_KEY
-        genai.configure(api_key=self.api_key)
-        self.model_name = genai.GenerativeModel('gemini-2.5-flash')
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model_name(self):
+        """GenerativeModel tạo lần dùng đầu tiên (chỉ import google.generativeai lúc này)"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel('gemini-2.5-flash')
+        return self._model
+
+    def warm_up(self):
+        self.model_name
+        return self
 
     def get_context_for_llm(self, anomaly_line_index, raw_logs, window=10):
         # Lưu ý: anomaly_line_index ở đây là số thứ tự dòng (bắt đầu từ 1)
@@ -0,0 +1,400 @@
+import json
+import os
+import queue
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from src.detector import VERDICT_CACHE_SIZE, InferenceBatcher, LogBertAnalyzer, VerdictCache, sliding_windows
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+# Thư mục RAM (Linux) cho vùng nhớ chung, không có thì dùng thư mục tạm
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+AUTHKEY_ENV = "LOGBERT_WORKER_AUTHKEY"
+# Thời gian tối đa để 1 worker kết nối + tải xong model
+CONNECT_TIMEOUT = 120
+# Thời gian tối đa chờ 1 worker rảnh cho 1 lô
+ACQUIRE_TIMEOUT = 60
+
+
+class SharedWindowSlot:
+    """
+    Vùng nhớ chung (file mmap trong /dev/shm) giữa process chính và 1 worker:
+    - windows: [capacity, max_len + 1] int64, max_len cột cửa sổ + 1 cột label (process chính ghi)
+    - results: [capacity, 3] float64 = (is_anomalous, prob, rank; -1 nếu không có rank) (worker ghi)
+    Qua pipe chỉ còn gửi số cửa sổ, không pickle dữ liệu.
+    """
+
+    def __init__(self, path, capacity, max_len, create=False):
+        self.path = path
+        self.capacity = capacity
+        self.max_len = max_len
+        mode = "w+" if create else "r+"
+        self.windows = np.memmap(path, dtype=np.int64, mode=mode, shape=(capacity, max_len + 1))
+        self.results = np.memmap(
+            path, dtype=np.float64, mode=mode, shape=(capacity, 3), offset=self.windows.nbytes
+        )
+
+    @classmethod
+    def create(cls, capacity, max_len):
+        fd, path = tempfile.mkstemp(prefix="logbert_", suffix=".shm", dir=SHM_DIR)
+        os.close(fd)
+        return cls(path, capacity, max_len, create=True)
+
+    def write(self, sequences, labels):
+        n = len(sequences)
+        self.windows[:n, :self.max_len] = sequences
+        self.windows[:n, self.max_len] = labels
+        return n
+
+    def read(self, n):
+        return [(bool(a), float(p), None if r < 0 else int(r)) for a, p, r in self.results[:n].tolist()]
+
+    def close(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class PoolWorker:
+    """1 process LogBERT riêng (python -m src.inference_pool), nhận job qua SharedWindowSlot"""
+
+    def __init__(self, vocab_size, max_len, capacity, runtime, threads, analyzer_kwargs):
+        self.slot = SharedWindowSlot.create(capacity, max_len)
+        authkey = os.urandom(16)
+        self._listener = Listener(("127.0.0.1", 0), authkey=authkey)
+        self.conn = None
+        spec = {
+            "address": self._listener.address,
+            "slot": self.slot.path,
+            "capacity": capacity,
+            "vocab_size": vocab_size,
+            "max_len": max_len,
+            "runtime": runtime,
+            "threads": threads,
+            "analyzer_kwargs": analyzer_kwargs,
+        }
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "src.inference_pool", json.dumps(spec, default=str)],
+            cwd=str(ROOT_DIR),
+            env={**os.environ, AUTHKEY_ENV: authkey.hex()},
+        )
+
+    def connect(self, timeout=CONNECT_TIMEOUT):
+        """
+        Chờ worker kết nối và tải xong model (tách khỏi __init__ để nhiều worker khởi động song song).
+        RuntimeError nếu worker thoát hoặc quá timeout giây vẫn chưa sẵn sàng.
+        """
+        deadline = time.monotonic() + timeout
+        # Listener.accept() không có timeout -> chạy ở thread phụ, ở đây chờ có giới hạn + kiểm tra worker còn sống
+        accepted = []
+        done = threading.Event()
+
+        def accept():
+            try:
+                accepted.append(self._listener.accept())
+            except Exception as e:
+                accepted.append(e)
+            done.set()
+
+        threading.Thread(target=accept, daemon=True).start()
+        try:
+            self._wait(done.wait, deadline)
+        except RuntimeError:
+            # accept() vẫn đang chờ: kết nối rồi đóng ngay -> bắt tay xác thực lỗi, thread accept thoát
+            try:
+                socket.create_connection(self._listener.address, timeout=1).close()
+            except OSError:
+                pass
+            if done.wait(1) and not isinstance(accepted[0], Exception):
+                accepted[0].close()
+            raise
+        finally:
+            self._listener.close()
+        if isinstance(accepted[0], Exception):
+            raise RuntimeError(f"LogBERT worker kết nối lỗi: {accepted[0]!r}") from accepted[0]
+        self.conn = accepted[0]
+        self._wait(self.conn.poll, deadline)
+        self.cache_version = self._call(None)
+        return self
+
+    def _wait(self, ready, deadline):
+        """Gọi ready(t) (chờ tối đa t giây) tới khi True, kiểm tra worker còn sống sau mỗi 0.1 s"""
+        while True:
+            code = self.process.poll()
+            if code is not None:
+                raise RuntimeError(f"LogBERT worker thoát (exit code {code}) trước khi sẵn sàng")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError("LogBERT worker không sẵn sàng sau thời gian chờ")
+            if ready(min(0.1, remaining)):
+                return
+
+    def _call(self, message):
+        if message is not None:
+            self.conn.send(message)
+        status, payload = self.conn.recv()
+        if status == "error":
+            raise RuntimeError(f"LogBERT worker lỗi: {payload}")
+        return payload
+
+    def score_windows(self, sequences, labels, top_k, confidence_threshold):
+        # Lô lớn hơn slot thì chia nhỏ (1 job có thể nhiều cửa sổ hơn max_batch)
+        results = []
+        for start in range(0, len(sequences), self.slot.capacity):
+            n = self.slot.write(sequences[start:start + self.slot.capacity], labels[start:start + self.slot.capacity])
+            self._call(("score", n, top_k, confidence_threshold))
+            results.extend(self.slot.read(n))
+        return results
+
+    def restrict_to_events(self, event_ids):
+        self.cache_version = self._call(("restrict", None if event_ids is None else sorted(set(event_ids))))
+
+    def close(self):
+        try:
+            self._listener.close()
+            self.conn.send(None)
+            self.conn.close()
+            self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+            self.process.wait()
+        self.slot.close()
+
+
+class ProcessInferencePool(InferenceBatcher):
+    """
+    InferenceBatcher chạy forward LogBERT ở process riêng thay vì thread trong process chính:
+    - processes worker, mỗi worker torch.set_num_threads(threads) và giữ 1 bản model riêng.
+    - processes thread gom lô (giống InferenceBatcher), mỗi lô gửi cho 1 worker đang rảnh
+      -> nhiều lô chạy song song trên nhiều core, process chính (asyncio, worker L1) không bị giữ GIL.
+    - submit / detect_anomalies / kết quả giống hệt InferenceBatcher.
+    - VerdictCache nằm ở process chính (worker không cache): cửa sổ lặp lại không phải gửi sang worker.
+    - Worker chết được tạo lại; không tạo lại được và hết worker -> job đang chờ + job mới nhận exception.
+    """
+
+    def __init__(
+        self, vocab_size, processes=2, threads=1, runtime="eager", max_len=5,
+        max_batch=256, max_wait=0.02, top_k=20, confidence_threshold=0.0,
+        cache_size=VERDICT_CACHE_SIZE, **analyzer_kwargs
+    ):
+        super().__init__(self, max_batch, max_wait, top_k, confidence_threshold)
+        self.vocab_size = vocab_size
+        self.max_len = max_len
+        self.processes = processes
+        self.threads = threads
+        self.runtime = runtime
+        self.analyzer_kwargs = {**analyzer_kwargs, "cache_size": 0}
+        self.unknown_token_id = vocab_size + 2
+        self.verdict_cache = VerdictCache(cache_size) if cache_size else None
+        self._workers = []
+        self._idle = queue.Queue()
+        self._workers_lock = threading.Lock()
+        # Số worker còn sống (kể cả worker đang được tạo lại); về 0 -> pool hỏng, mọi job lỗi ngay thay vì treo
+        self._live = 0
+        self._error = None
+        # Tập event hiện tại (restrict_to_events), áp lại cho worker được tạo thay thế
+        self._event_ids = None
+        self.respawns = 0
+
+    # API giống analyzer mà InferenceBatcher cần: cắt cửa sổ + build report ở process chính, forward ở worker
+    def prepare_sequences(self, event_ids, positions=None):
+        return sliding_windows(event_ids, self.max_len, self.vocab_size + 1, positions)
+
+    build_report = staticmethod(LogBertAnalyzer.build_report)
+
+    def submit(self, event_ids, last_n=None):
+        if self._error is not None:
+            future = Future()
+            future.set_exception(self._error)
+            return future
+        return super().submit(event_ids, last_n)
+
+    def score_windows(self, sequences, labels, top_k=20, confidence_threshold=0.0):
+        if self._error is not None:
+            raise self._error
+        if self.verdict_cache is None:
+            return self._score_on_worker(sequences, labels, top_k, confidence_threshold)
+
+        def compute(indices):
+            return self._score_on_worker(
+                [sequences[i] for i in indices], [labels[i] for i in indices], top_k, confidence_threshold
+            )
+
+        # Mọi worker chạy cùng model + cùng tập event nên chung 1 cache_version
+        version = self.cache_version
+        keys = [(version, top_k, confidence_threshold, tuple(seq), label) for seq, label in zip(sequences, labels)]
+        return self.verdict_cache.score(keys, compute)
+
+    @property
+    def cache_version(self):
+        with self._workers_lock:
+            if not self._workers:
+                raise self._error or RuntimeError("LogBERT process pool chưa có worker")
+            return self._workers[0].cache_version
+
+    def _acquire(self, timeout=ACQUIRE_TIMEOUT):
+        """Lấy 1 worker rảnh; lỗi nếu pool đã hết worker hoặc quá timeout giây không có worker nào rảnh"""
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._error is not None:
+                raise self._error
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Không có LogBERT worker rảnh sau {timeout} s")
+            try:
+                return self._idle.get(timeout=min(0.5, remaining))
+            except queue.Empty:
+                pass
+
+    def _score_on_worker(self, sequences, labels, top_k, confidence_threshold, retries=1):
+        worker = self._acquire()
+        try:
+            results = worker.score_windows(sequences, labels, top_k, confidence_threshold)
+        except (EOFError, OSError) as e:
+            # Worker chết giữa chừng: không trả lại hàng đợi, tạo worker mới thay thế rồi chấm lại lô 1 lần
+            self._replace(worker)
+            if retries <= 0:
+                raise RuntimeError(f"LogBERT worker chết khi chấm lô: {e!r}") from e
+            return self._score_on_worker(sequences, labels, top_k, confidence_threshold, retries - 1)
+        except BaseException:
+            # Lỗi phía worker (worker vẫn sống): dùng tiếp
+            self._idle.put(worker)
+            raise
+        self._idle.put(worker)
+        return results
+
+    def _spawn(self):
+        return PoolWorker(self.vocab_size, self.max_len, self.max_batch, self.runtime, self.threads, self.analyzer_kwargs)
+
+    def _replace(self, dead):
+        dead.close()
+        with self._workers_lock:
+            if dead in self._workers:
+                self._workers.remove(dead)
+        try:
+            worker = self._spawn().connect()
+            if self._event_ids is not None:
+                worker.restrict_to_events(self._event_ids)
+        except Exception as e:
+            print(f"⚠️ Không tạo lại được LogBERT worker: {e}")
+            with self._workers_lock:
+                self._live -= 1
+                live = self._live
+            if live <= 0:
+                self._fail(RuntimeError(f"LogBERT process pool không còn worker nào (tạo lại lỗi: {e!r})"))
+            return
+        with self._workers_lock:
+            self._workers.append(worker)
+        self.respawns += 1
+        self._idle.put(worker)
+
+    def _fail(self, error):
+        """Hết worker: job đang chờ trong hàng đợi và job mới đều nhận exception thay vì chờ mãi"""
+        self._error = error
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            job[4].set_exception(error)
+
+    def restrict_to_events(self, event_ids):
+        """Như LogBertAnalyzer.restrict_to_events, áp dụng cho mọi worker"""
+        self._event_ids = event_ids
+        with self._workers_lock:
+            count = len(self._workers)
+        workers = []
+        try:
+            for _ in range(count):
+                workers.append(self._acquire())
+            for i, worker in enumerate(workers):
+                try:
+                    worker.restrict_to_events(event_ids)
+                except (EOFError, OSError):
+                    # Worker chết: worker thay thế nhận _event_ids lúc tạo
+                    workers[i] = None
+                    self._replace(worker)
+        finally:
+            for worker in workers:
+                if worker is not None:
+                    self._idle.put(worker)
+
+    def start(self):
+        self._workers = [self._spawn() for _ in range(self.processes)]
+        try:
+            for worker in self._workers:
+                worker.connect()
+        except Exception:
+            for worker in self._workers:
+                worker.close()
+            self._workers = []
+            raise
+        self._live = len(self._workers)
+        self._error = None
+        for worker in self._workers:
+            self._idle.put(worker)
+        for _ in range(self.processes):
+            threading.Thread(target=self._loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        super().stop()
+        for worker in self._workers:
+            worker.close()
+        self._workers = []
+        self._idle = queue.Queue()
+
+
+# ==========================
+# WORKER PROCESS
+# ==========================
+def worker_main(spec):
+    from src.serving import load_analyzer
+
+    torch.set_num_threads(spec["threads"])
+    conn = Client(tuple(spec["address"]), authkey=bytes.fromhex(os.environ[AUTHKEY_ENV]))
+    try:
+        analyzer = load_analyzer(spec["vocab_size"], spec["runtime"], max_len=spec["max_len"], **spec["analyzer_kwargs"])
+        analyzer.warm_up()
+        slot = SharedWindowSlot(spec["slot"], spec["capacity"], spec["max_len"])
+    except Exception as e:
+        conn.send(("error", repr(e)))
+        return
+    conn.send(("ok", analyzer.cache_version))
+
+    max_len = spec["max_len"]
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        try:
+            if message[0] == "restrict":
+                analyzer.restrict_to_events(message[1])
+                conn.send(("ok", analyzer.cache_version))
+                continue
+            _, n, top_k, confidence_threshold = message
+            sequences = slot.windows[:n, :max_len].tolist()
+            labels = slot.windows[:n, max_len].tolist()
+            results = analyzer.score_windows(sequences, labels, top_k, confidence_threshold)
+            slot.results[:n] = [(a, p, -1 if r is None else r) for a, p, r in results]
+            conn.send(("ok", None))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+
+
+if __name__ == "__main__":
+    worker_main(json.loads(sys.argv[1]))
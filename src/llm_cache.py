@@ -0,0 +1,133 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+LLM_CACHE_SIZE = 65536
+# Verdict cũ hơn LLM_CACHE_TTL giây bị bỏ (model/prompt đổi thì phiên bản prompt trong key đã đổi theo)
+LLM_CACHE_TTL = 7 * 24 * 3600
+
+
+def prompt_version(*templates):
+    """Phiên bản prompt = hash nội dung template: sửa prompt là verdict cũ tự hết hiệu lực"""
+    return hashlib.sha1("\0".join(templates).encode("utf-8")).hexdigest()[:12]
+
+
+def cache_key(masked, version):
+    return hashlib.sha256(f"{version}\0{masked}".encode("utf-8")).hexdigest()
+
+
+class LlmVerdictCache:
+    """
+    Cache verdict LLM theo request đã mask: cùng payload tấn công bị replay, cùng trang sản phẩm bình thường
+    -> không gọi LLM lại.
+    - Tầng 1: LRU trong RAM, tối đa max_size verdict.
+    - Tầng 2 (tùy chọn, path): sqlite trên đĩa, giữ verdict qua các lần chạy; hit ở tầng 2 được đưa lên tầng 1.
+    - Verdict quá ttl giây coi như không có (cả 2 tầng).
+    Lưu cả latency của lần gọi LLM gốc (phần của 1 request nếu gọi theo lô) để hit vẫn được tính vào stats latency
+    như lúc gọi thật và saved_latency không bị nhân lên theo kích thước lô.
+    max_size = 0 và không có path: tắt cache. Thread-safe.
+    """
+
+    def __init__(self, max_size=LLM_CACHE_SIZE, path=None, ttl=LLM_CACHE_TTL, clock=time.time):
+        self.max_size = max_size
+        self.path = path
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (label, latency, stored_at)
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_latency = 0.0
+        if path is not None:
+            self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, label TEXT, latency REAL, stored_at REAL)"
+            )
+            self.purge()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 or self._db is not None
+
+    def get(self, key):
+        """(label, latency) nếu có verdict còn hạn, ngược lại None"""
+        if not self.enabled:
+            return None
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[2] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            elif self._db is not None:
+                row = self._db.execute(
+                    "SELECT label, latency, stored_at FROM verdicts WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[2] <= self.ttl:
+                    entry = row
+                    self._store(key, entry)
+                    self.hits += 1
+                    self.disk_hits += 1
+            if entry is None:
+                self.misses += 1
+                return None
+            self.saved_latency += entry[1]
+            return entry[0], entry[1]
+
+    def put(self, key, label, latency):
+        if not self.enabled:
+            return
+        entry = (label, latency, self.clock())
+        with self._lock:
+            self._store(key, entry)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?)", (key, *entry))
+
+    def _store(self, key, entry):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def purge(self):
+        """Xóa verdict hết hạn trên đĩa (gọi lúc mở; trong RAM hết hạn được bỏ khi tra)"""
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.execute("DELETE FROM verdicts WHERE stored_at < ?", (self.clock() - self.ttl,))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM verdicts")
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "saved_latency": self.saved_latency,
+        }
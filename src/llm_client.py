@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp  # chỉ cần cho chế độ dispatch async (LLM_DISPATCH=async)
+except ImportError:
+    aiohttp = None
+
+
+def health_url(srv):
+    """URL health check của service KoboldCPP (GET /)"""
+    return srv.replace("/api/v1/generate", "/")
+
+
+class ServiceSessions:
+    """
+    1 requests.Session cho mỗi service LLM thay vì requests.post/get mở kết nối mới mỗi lần:
+    - Keep-alive: kết nối TCP tới KoboldCPP được giữ lại và dùng lại giữa các request.
+    - Pool mỗi service = concurrency (số request sinh đồng thời tối đa, SERVICE_CONCURRENCY)
+      + 1 kết nối cho health check, nên health check không phải chờ request sinh đang chạy.
+    Session dùng chung giữa các worker thread (urllib3 pool thread-safe).
+    """
+
+    def __init__(self, services, concurrency):
+        self.pool_size = concurrency + 1
+        self._sessions = {srv: self._make_session() for srv in services}
+
+    def _make_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def post(self, srv, payload, timeout):
+        return self._sessions[srv].post(srv, json=payload, timeout=timeout)
+
+    def health(self, srv, timeout):
+        return self._sessions[srv].get(health_url(srv), timeout=timeout)
+
+    def close(self):
+        for session in self._sessions.values():
+            session.close()
+
+
+class AsyncServiceClient:
+    """
+    Client aiohttp cho chế độ dispatch async: hàng trăm request LLM đang chờ mà không cần 1 thread mỗi request.
+    - Mỗi service tối đa concurrency request đang gửi (asyncio.Semaphore), kết nối keep-alive dùng lại.
+    - Request quá timeout giây bị hủy hẳn (kết nối bị đóng), caller nhận asyncio.TimeoutError
+      như requests timeout ở bản thread.
+    Phải tạo và dùng trong cùng 1 event loop: await client.open() trước, await client.close() khi tắt.
+    """
+
+    def __init__(self, services, concurrency, timeout):
+        if aiohttp is None:
+            raise ImportError("Cần cài aiohttp để chạy dispatch async (LLM_DISPATCH=async)")
+        self.services = list(services)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._limits = {}
+        self._session = None
+        # Số request đang chờ slot hoặc đang gửi, theo service
+        self.in_flight = {srv: 0 for srv in self.services}
+        self.timeouts = 0
+
+    async def open(self):
+        self._limits = {srv: asyncio.Semaphore(self.concurrency) for srv in self.services}
+        connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.concurrency + 1)
+        self._session = aiohttp.ClientSession(connector=connector)
+        return self
+
+    async def post(self, srv, payload):
+        """
+        POST tới service, trả về (status, JSON body, latency tính từ lúc có slot).
+        Trả về None nếu chờ quá timeout vẫn chưa có slot (giống sem.acquire(timeout) ở send_request: thử service khác).
+        """
+        self.in_flight[srv] += 1
+        try:
+            try:
+                await asyncio.wait_for(self._limits[srv].acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                return None
+            try:
+                start = time.time()
+                status, body = await asyncio.wait_for(self._post(srv, payload), self.timeout)
+                return status, body, time.time() - start
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+            finally:
+                self._limits[srv].release()
+        finally:
+            self.in_flight[srv] -= 1
+
+    async def _post(self, srv, payload):
+        async with self._session.post(srv, json=payload) as resp:
+            return resp.status, await resp.json(content_type=None)
+
+    async def health(self, srv, timeout):
+        async with self._session.get(health_url(srv), timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+            return resp.status
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
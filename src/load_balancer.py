@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+from collections import deque
+
+POLICIES = ("p2c", "least", "round_robin")
+# Trọng số mẫu mới trong EWMA latency
+EWMA_ALPHA = 0.2
+# Latency giả định cho service chưa có mẫu nào (khi chưa service nào có mẫu)
+INITIAL_LATENCY = 1.0
+# Số quyết định gần nhất giữ lại cho dashboard
+RECENT_CHOICES = 50
+
+
+class LoadBalancer:
+    """
+    Chọn service LLM cho từng request:
+    - Mỗi service theo dõi số request đang chạy (in-flight, tính cả lúc chờ slot) và EWMA latency.
+    - Chi phí ước lượng = (in_flight + 1) * EWMA / weight: weight theo sức GPU của từng máy.
+    - policy "least": service có chi phí thấp nhất; "p2c" (power of two choices): bốc ngẫu nhiên 2 service,
+      lấy service rẻ hơn (gần tốt bằng "least" nhưng không dồn cả loạt request vào cùng 1 service);
+      "round_robin": xoay vòng, không xét tải, để so sánh.
+    - Service bị mark(srv, False) bị bỏ qua; nếu tất cả đều lỗi thì chọn trong toàn bộ (như fallback cũ).
+    Mỗi acquire() phải đi kèm 1 release(). Thread-safe.
+    """
+
+    def __init__(self, services, weights=None, policy="p2c", alpha=EWMA_ALPHA, rng=None):
+        if policy not in POLICIES:
+            raise ValueError(f"policy phải là 1 trong {POLICIES}, nhận {policy!r}")
+        weights = list(weights) if weights is not None else [1.0] * len(services)
+        if len(weights) != len(services) or any(w <= 0 for w in weights):
+            raise ValueError("Cần đúng 1 trọng số dương cho mỗi service")
+        self.services = list(services)
+        self.policy = policy
+        self.alpha = alpha
+        self.rng = rng or random.Random()
+        self.weights = dict(zip(self.services, weights))
+        self.healthy = {srv: True for srv in self.services}
+        self.in_flight = {srv: 0 for srv in self.services}
+        self.ewma = {srv: None for srv in self.services}
+        self.picks = {srv: 0 for srv in self.services}
+        self.errors = {srv: 0 for srv in self.services}
+        self.recent = deque(maxlen=RECENT_CHOICES)
+        self._rr = 0
+        self._lock = threading.Lock()
+
+    def _latency(self, srv):
+        if self.ewma[srv] is not None:
+            return self.ewma[srv]
+        # Service chưa có mẫu: lấy latency tốt nhất đang biết để nó sớm được thử
+        known = [v for v in self.ewma.values() if v is not None]
+        return min(known) if known else INITIAL_LATENCY
+
+    def _cost(self, srv):
+        return (self.in_flight[srv] + 1) * self._latency(srv) / self.weights[srv]
+
+    def _choose(self, candidates):
+        if self.policy == "round_robin":
+            self._rr += 1
+            return candidates[self._rr % len(candidates)]
+        if self.policy == "p2c" and len(candidates) > 2:
+            candidates = self.rng.sample(candidates, 2)
+        return min(candidates, key=self._cost)
+
+    def acquire(self):
+        """Chọn service cho 1 request và tính nó vào in-flight"""
+        with self._lock:
+            candidates = [srv for srv in self.services if self.healthy[srv]] or self.services
+            srv = self._choose(candidates)
+            self.recent.append({
+                "time": time.time(),
+                "service": srv,
+                "in_flight": self.in_flight[srv],
+                "ewma_ms": self._latency(srv) * 1000,
+            })
+            self.in_flight[srv] += 1
+            self.picks[srv] += 1
+            return srv
+
+    def release(self, srv, latency=None, ok=True):
+        """Request xong (latency = None nếu không gửi được / không đo được)"""
+        with self._lock:
+            self.in_flight[srv] -= 1
+            if not ok:
+                self.errors[srv] += 1
+            if latency is not None:
+                prev = self.ewma[srv]
+                self.ewma[srv] = latency if prev is None else prev + self.alpha * (latency - prev)
+
+    def mark(self, srv, healthy):
+        with self._lock:
+            self.healthy[srv] = healthy
+
+    def stats(self):
+        with self._lock:
+            total = sum(self.picks.values())
+            return {
+                "policy": self.policy,
+                "services": {
+                    srv: {
+                        "weight": self.weights[srv],
+                        "healthy": self.healthy[srv],
+                        "in_flight": self.in_flight[srv],
+                        "ewma_ms": self.ewma[srv] * 1000 if self.ewma[srv] is not None else None,
+                        "picks": self.picks[srv],
+                        "share": self.picks[srv] / total if total else 0.0,
+                        "errors": self.errors[srv],
+                    }
+                    for srv in self.services
+                },
+                "recent": list(self.recent),
+            }
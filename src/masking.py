@@ -0,0 +1,126 @@
+import configparser
+import functools
+import json
+import re
+import urllib.parse
+from pathlib import Path
+
+# Cấu hình masking dùng chung với Drain3 (section [MASKING] trong drain3.ini)
+CONFIG_PATH = Path(__file__).resolve().parent.parent / "drain3.ini"
+CACHE_SIZE = 4096
+
+
+class Masker:
+    """
+    Masking dùng chung cho mọi luồng (LLM prompt, dữ liệu train, Drain3/LogBERT),
+    để lúc train và lúc suy luận thấy cùng một chuỗi token.
+    - Đọc [MASKING] trong drain3.ini (masking, mask_prefix, mask_suffix), biên dịch regex 1 lần.
+    - URL decode cả request rồi áp dụng lần lượt từng instruction trên toàn chuỗi, giống hệt
+      drain3 LogMasker.mask(unquote(text)) (cách tạo models/drain3_state.bin và vocab LogBERT).
+      Không tách dòng: rule neo "$" (vd. SAFE_VAL) chỉ khớp ở cuối chuỗi như lúc train.
+    - LRU cache theo request gốc: request lặp lại (payload bị replay, trang tĩnh) không phải chạy regex.
+    """
+
+    def __init__(self, config_path=CONFIG_PATH, cache_size=CACHE_SIZE):
+        parser = configparser.ConfigParser()
+        parser.read(config_path)
+
+        prefix = parser.get("MASKING", "mask_prefix", fallback="<")
+        suffix = parser.get("MASKING", "mask_suffix", fallback=">")
+        masking_list = json.loads(parser.get("MASKING", "masking", fallback="[]"))
+
+        self.instructions = [
+            (re.compile(mi["regex_pattern"]), prefix + mi["mask_with"] + suffix)
+            for mi in masking_list
+        ]
+        self._mask = functools.lru_cache(maxsize=cache_size)(self._mask_uncached)
+
+    def _mask_uncached(self, text):
+        text = urllib.parse.unquote(text)
+        for regex, mask in self.instructions:
+            text = regex.sub(mask, text)
+        return text
+
+    def mask(self, text):
+        """URL decode rồi mask cả request theo drain3.ini"""
+        return self._mask(text)
+
+    def mask_many(self, texts):
+        """Mask cả 1 file / 1 lô request trong 1 lần gọi"""
+        return [self.mask(t) for t in texts]
+
+    def cache_info(self):
+        return self._mask.cache_info()
+
+    def cache_clear(self):
+        self._mask.cache_clear()
+
+
+masker = Masker()
+
+
+# ==========================
+# SELECTIVE MASK (IP/UUID/TOKEN/TIME)
+# ==========================
+# Masking cũ của prompt LLM trong analyzer.py. Mọi luồng hiện tại (LLM prompt, dữ liệu train, Drain3) dùng
+# `masker` ở trên để khớp với lúc train; selective_mask giữ lại cho ai cần mask nhẹ không phụ thuộc drain3.ini,
+# benchmark_selective_mask.py kiểm tra nó vẫn ra đúng như chuỗi re.sub gốc.
+
+# Gộp 4 lần re.sub (IP, UUID, TOKEN, TIME) thành 1 regex biên dịch sẵn, quét 1 lần.
+# Kết quả giống hệt chuỗi re.sub tuần tự cũ:
+# - TIME không khớp nếu giây là đầu của 1 IP (bản cũ thay IP trước)
+# - TOKEN phải dừng trước vị trí IP/UUID (bản cũ thay IP/UUID trước nên "<" cắt ngang giá trị),
+#   việc cắt này làm trong selective_mask bằng _GUARD_RE để regex chính giữ được dạng lặp đơn giản
+# Lookahead ký tự đầu (\d, hex, t/s/j/a, "ſ" khớp "s" khi IGNORECASE) + (?<!\w) thay cho \b
+# giúp re bỏ qua nhanh các vị trí không thể khớp.
+_IP = r"\d{1,3}(?:\.\d{1,3}){3}\b"
+_UUID = r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"
+MASK_RE = re.compile(
+    r"(?=[\da-fA-FtTsSjJſ])"
+    r"(?:(?<!\w)"
+    rf"(?:(?P<IP>{_IP})"
+    rf"|(?P<UUID>{_UUID})"
+    rf"|(?P<TIME>\d{{2}}:\d{{2}}:(?!\b{_IP})\d{{2}}\b))"
+    r"|(?P<TOKEN>(?i:(?P<key>token|sessionid|jwt|auth)=[A-Za-z0-9\-_]{20,})))"
+)
+_GUARD_RE = re.compile(rf"\b(?:{_IP}|{_UUID})")
+# IP/UUID bắt đầu trước cuối token có thể kéo dài thêm tối đa 36 ký tự
+_GUARD_SPAN = 37
+MASK_WITH = {"IP": "<IP>", "UUID": "<UUID>", "TIME": "<TIME>"}
+
+
+def selective_mask(text):
+    """Bỏ \\r, đổi \\t -> space, URL decode rồi mask IP/UUID/TOKEN/TIME trong 1 lần quét"""
+    text = text.replace("\r", "").replace("\t", " ")
+    decoded = urllib.parse.unquote(text)
+
+    m = MASK_RE.search(decoded)
+    if m is None:
+        return decoded
+
+    out = []
+    pos = 0
+    while m is not None:
+        start, end = m.span()
+        kind = m.lastgroup
+
+        if kind == "TOKEN":
+            value_start = m.end("key") + 1
+            g = _GUARD_RE.search(decoded, value_start, end + _GUARD_SPAN)
+            if g is not None and g.start() < end:
+                end = g.start()
+                if end - value_start < 20:
+                    # Giá trị bị IP/UUID cắt còn < 20 ký tự -> bản cũ không mask token ở đây
+                    m = MASK_RE.search(decoded, start + 1)
+                    continue
+            repl = m.group("key") + "=<TOKEN>"
+        else:
+            repl = MASK_WITH[kind]
+
+        out.append(decoded[pos:start])
+        out.append(repl)
+        pos = end
+        m = MASK_RE.search(decoded, pos)
+
+    out.append(decoded[pos:])
+    return "".join(out)
@@ -1,5 +1,39 @@
+import functools
 import re
-from demo.drain3_instance import drain3_instance
+import threading
+from pathlib import Path
+
+from drain3 import TemplateMiner
+from drain3.file_persistence import FilePersistence
+from drain3.template_miner_config import TemplateMinerConfig
+
+from src.masking import CONFIG_PATH, masker
+from src.template_cache import TemplateCache
+
+# Snapshot cây Drain3 lúc train LogBERT (EventId nằm trong vocab của model)
+STATE_PATH = Path(__file__).resolve().parent.parent / "models" / "drain3_state.bin"
+
+# Cache request đã mask -> cluster, tránh đi lại cây Drain cho header lặp lại.
+# Tạo lần dùng đầu tiên (get_template_cache / src.parser.template_cache), import module không khôi phục Drain3
+_template_cache = None
+_template_cache_lock = threading.Lock()
+
+
+def get_template_cache():
+    global _template_cache
+    if _template_cache is None:
+        with _template_cache_lock:
+            if _template_cache is None:
+                from demo.drain3_instance import drain3_instance
+
+                _template_cache = TemplateCache(drain3_instance)
+    return _template_cache
+
+
+def __getattr__(name):
+    if name == "template_cache":
+        return get_template_cache()
+    raise AttributeError(f"module 'src.parser' has no attribute {name!r}")
 
 
 def parsing_http_requests(file):
@@ -57,7 +91,7 @@ def parsing_http_requests(file):
 
 def process_log_string(log_string):
     try:
-        log_line = drain3_instance.add_log_message(log_string)
+        log_line = get_template_cache().add_log_message(log_string)
         template_str = log_line.get("template_mined")
         return {
             "Original Content": log_string,
@@ -69,6 +103,56 @@ def process_log_string(log_string):
         return log_string, {}
 
 
+class TemplateMatcher:
+    """
+    Chế độ chỉ đọc cho lúc detect: nạp snapshot models/drain3_state.bin 1 lần rồi đóng băng.
+    - Không gọi add_log_message -> không tạo cluster mới, không đổi template, không vượt max_clusters,
+      EventId luôn nằm trong tập id LogBERT đã học.
+    - Request không khớp cluster nào -> unknown_event_id (id dành riêng, do bên gọi chọn theo vocab).
+    - So khớp giống add_log_message (sim_th trong drain3.ini, không tính tham số <*>),
+      chỉ đọc cây nên nhiều worker thread dùng chung được mà không cần lock.
+    - Cây không đổi nên kết quả theo request đã mask được cache vĩnh viễn (LRU).
+    """
+
+    def __init__(self, unknown_event_id, state_path=STATE_PATH, config_path=CONFIG_PATH, cache_size=8192):
+        config = TemplateMinerConfig()
+        config.load(str(config_path))
+        config.profiling_enabled = False
+        miner = TemplateMiner(FilePersistence(str(state_path)), config)
+        if not miner.drain.clusters:
+            raise ValueError(f"Không nạp được snapshot Drain3: {state_path}")
+
+        self.drain = miner.drain
+        # Cùng masker với dữ liệu train (drain3 masker không URL decode)
+        self.masker = masker
+        self.unknown_event_id = unknown_event_id
+        self._match_masked = functools.lru_cache(maxsize=cache_size)(self._match_masked_uncached)
+
+    def _match_masked_uncached(self, masked):
+        drain = self.drain
+        tokens = drain.get_content_as_tokens(masked)
+        cluster = drain.tree_search(drain.root_node, tokens, drain.sim_th, False)
+        if cluster is None:
+            return self.unknown_event_id, None
+        return cluster.cluster_id, cluster.get_template()
+
+    def match(self, log_string):
+        """Giống process_log_string nhưng không sửa cây Drain3"""
+        event_id, template_str = self._match_masked(self.masker.mask(log_string))
+        return {
+            "Original Content": log_string,
+            "EventId": event_id,
+            "EventTemplate": template_str,
+        }
+
+    def event_ids(self):
+        """Mọi EventId match() có thể trả về (cluster trong snapshot + unknown_event_id)"""
+        return sorted(self.drain.id_to_cluster.keys()) + [self.unknown_event_id]
+
+    def cache_info(self):
+        return self._match_masked.cache_info()
+
+
 def extract_label(log_string):
     label = 0
     if "class: attack" in log_string.lower():
@@ -0,0 +1,75 @@
+import re
+
+LABELS = ("safe", "malicious", "unknown")
+
+# Ước lượng token thô (không cần tokenizer của model): ~4 ký tự / token với request HTTP đã mask
+CHARS_PER_TOKEN = 4
+# "Request 12:\n" + dòng trống
+ITEM_OVERHEAD_TOKENS = 6
+# "12: malicious\n"
+ANSWER_TOKENS_PER_ITEM = 6
+# Context mặc định của KoboldCPP
+CONTEXT_TOKENS = 2048
+MAX_BATCH_ITEMS = 16
+
+BATCH_HEADER = (
+    "Classify each HTTP request below.\n"
+    "For every request write one line '<number>: <answer>', where <answer> is one of the following words exactly:\n"
+    "safe\nmalicious\nunknown\n\n"
+)
+BATCH_FOOTER = "Answers:\n"
+
+ANSWER_RE = re.compile(r"^\W*(?:request\s*)?(\d+)\s*[:.)\-]\s*\W*(safe|malicious|unknown)\b", re.IGNORECASE | re.MULTILINE)
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def build_prompt_batch(masked_list):
+    """1 prompt đánh số cho nhiều request đã mask (Request 1..N), model trả lời mỗi dòng '<số>: <nhãn>'"""
+    parts = [BATCH_HEADER]
+    for i, masked in enumerate(masked_list, 1):
+        parts.append(f"Request {i}:\n{masked}\n\n")
+    parts.append(BATCH_FOOTER)
+    return "".join(parts)
+
+
+def answer_tokens(n):
+    """max_length cần cho câu trả lời của lô n request"""
+    return n * ANSWER_TOKENS_PER_ITEM
+
+
+def parse_batch_labels(text, n):
+    """
+    Nhãn theo thứ tự 1..n từ câu trả lời; item thiếu/sai số thứ tự/nhãn lạ -> None (caller hỏi lại riêng).
+    Trả về None nếu không đọc được nhãn nào.
+    """
+    labels = [None] * n
+    for match in ANSWER_RE.finditer(text):
+        idx = int(match.group(1)) - 1
+        # Số thứ tự lặp lại: giữ câu trả lời đầu tiên
+        if 0 <= idx < n and labels[idx] is None:
+            labels[idx] = match.group(2).lower()
+    return labels if any(label is not None for label in labels) else None
+
+
+def plan_batches(masked_list, context_tokens=CONTEXT_TOKENS, max_items=MAX_BATCH_ITEMS):
+    """
+    Chia request (đã mask) thành các lô index liên tiếp: mỗi lô tối đa max_items request và
+    prompt + câu trả lời ước lượng không vượt context_tokens. Số request mỗi lô vì vậy tự co lại
+    khi request dài. Request quá dài nằm riêng 1 lô (caller dùng prompt đơn).
+    """
+    fixed = estimate_tokens(BATCH_HEADER) + estimate_tokens(BATCH_FOOTER)
+    batches = []
+    current, used = [], fixed
+    for i, masked in enumerate(masked_list):
+        cost = estimate_tokens(masked) + ITEM_OVERHEAD_TOKENS + ANSWER_TOKENS_PER_ITEM
+        if current and (len(current) >= max_items or used + cost > context_tokens):
+            batches.append(current)
+            current, used = [], fixed
+        current.append(i)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
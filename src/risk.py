@@ -0,0 +1,279 @@
+import json
+import os
+import re
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import ahocorasick  # pyahocorasick: automaton Aho–Corasick viết bằng C
+except ImportError:
+    ahocorasick = None
+
+# Một rule = (category, pattern, weight, anchor)
+# anchor = "any"   -> pattern xuất hiện ở bất kỳ đâu trong request (đã lowercase)
+# anchor = "start" -> request bắt đầu bằng pattern
+RiskRule = namedtuple("RiskRule", ["category", "pattern", "weight", "anchor"])
+
+# Rule pack mặc định (có version + thresholds + rules), sửa file này thay vì sửa code.
+# Các pattern trùng nhau giữa các nhóm (<script, %2e%2e%2f, %2e%2e/) được cộng điểm 2 lần,
+# "B1=" không bao giờ khớp vì text đã lowercase -> giữ nguyên để điểm giống bản cũ.
+RULES_PATH = Path(__file__).resolve().parent.parent / "risk_rules.json"
+
+DEFAULT_THRESHOLDS = {"high": 12, "low": 1}
+
+
+def load_rule_pack(path=RULES_PATH):
+    """
+    Đọc rule pack JSON:
+    {"version": 1, "thresholds": {"high": 12, "low": 1}, "rules": [{"category", "pattern", "weight", "anchor"}]}
+    Trả về (version, thresholds, rules). Raise ValueError nếu file sai định dạng.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    if not isinstance(data, dict) or not isinstance(data.get("rules"), list):
+        raise ValueError(f"Rule pack {path} thiếu danh sách 'rules'")
+
+    rules = []
+    for i, item in enumerate(data["rules"]):
+        try:
+            rule = RiskRule(
+                category=str(item.get("category", "misc")),
+                pattern=item["pattern"],
+                weight=int(item["weight"]),
+                anchor=item.get("anchor", "any"),
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Rule #{i} trong {path} không hợp lệ: {e}")
+        if not isinstance(rule.pattern, str) or not rule.pattern:
+            raise ValueError(f"Rule #{i} trong {path} có pattern rỗng")
+        if rule.anchor not in ("any", "start"):
+            raise ValueError(f"Rule #{i} trong {path} có anchor '{rule.anchor}' không hợp lệ")
+        rules.append(rule)
+
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    thresholds.update({k: int(v) for k, v in data.get("thresholds", {}).items()})
+
+    return data.get("version"), thresholds, rules
+
+
+class _TrieNode:
+    __slots__ = ("children", "rule_ids")
+
+    def __init__(self):
+        self.children = {}
+        self.rule_ids = []
+
+
+def _build_trie(rules):
+    root = _TrieNode()
+    for rid, rule in enumerate(rules):
+        if rule.anchor != "any":
+            continue
+        node = root
+        for ch in rule.pattern:
+            node = node.children.setdefault(ch, _TrieNode())
+        node.rule_ids.append(rid)
+    return root
+
+
+def _compile_trie(node, group_rules, inherited, root=True):
+    """
+    Biến trie thành regex (không backtrack qua marker):
+    - Mỗi node kết thúc pattern sinh 1 group rỗng "()" làm marker.
+    - Sau một marker, phần con là tùy chọn nên match không bao giờ fail -> marker sâu nhất
+      (m.lastindex) xác định toàn bộ rule đã khớp tại vị trí đó.
+    - Node không kết thúc pattern bắt buộc phải đi tiếp tới một node kết thúc,
+      nên regex chỉ trả match ở những vị trí thật sự có pattern.
+    """
+    branches = []
+    for ch in sorted(node.children):
+        child = node.children[ch]
+        # Nén các chuỗi node chỉ có 1 con (path compression)
+        edge = ch
+        while not child.rule_ids and len(child.children) == 1:
+            (next_ch, next_child), = child.children.items()
+            edge += next_ch
+            child = next_child
+
+        fired = inherited
+        part = re.escape(edge)
+        if child.rule_ids:
+            fired = inherited + tuple(child.rule_ids)
+            group_rules.append(fired)
+            part += "()"
+
+        sub = _compile_trie(child, group_rules, fired, False)
+        if sub:
+            part += "(?:%s)?" % sub if child.rule_ids else "(?:%s)" % sub
+
+        if root:
+            # Chỉ tiêu thụ ký tự đầu, phần còn lại nằm trong lookahead:
+            # - re dùng được bảng ký tự đầu để nhảy nhanh qua đoạn không liên quan
+            # - vẫn bắt được các pattern chồng lấn nhau ("'||" và "||")
+            part = "%s(?=%s)" % (re.escape(edge[0]), part[len(re.escape(edge[0])):])
+        branches.append(part)
+
+    return "|".join(branches)
+
+
+class RiskScorer:
+    """
+    Rule engine cho layer-1: biên dịch toàn bộ pattern 1 lần và quét mỗi request đúng 1 lần.
+    - Có pyahocorasick: dùng automaton Aho–Corasick (nhanh nhất).
+    - Không có: fallback sang 1 regex dạng trie (chỉ dùng thư viện chuẩn).
+    Điểm trả về giống hệt risk_score_advanced cũ.
+    Mặc định nạp rule từ RULES_PATH.
+    """
+
+    def __init__(self, rules=None, use_automaton=True, version=None, thresholds=None):
+        if rules is None:
+            version, thresholds, rules = load_rule_pack()
+        self.rules = list(rules)
+        self.version = version
+        self.thresholds = dict(DEFAULT_THRESHOLDS if thresholds is None else thresholds)
+        self.weights = [r.weight for r in self.rules]
+        self.weight_vector = np.array(self.weights, dtype=np.int32)
+        self.names = [f"{r.category}:{r.pattern}" for r in self.rules]
+
+        self._automaton = None
+        self._regex = None
+
+        # pattern -> tuple rule id (1 pattern có thể thuộc nhiều rule, ví dụ "<script")
+        pattern_rules = {}
+        for rid, r in enumerate(self.rules):
+            if r.anchor == "any":
+                pattern_rules.setdefault(r.pattern, []).append(rid)
+
+        if use_automaton and ahocorasick is not None:
+            if pattern_rules:
+                self._automaton = ahocorasick.Automaton()
+                for pat, rids in pattern_rules.items():
+                    self._automaton.add_word(pat, tuple(rids))
+                self._automaton.make_automaton()
+            self.backend = "aho-corasick"
+        else:
+            # group index (1-based) -> tuple rule id đã khớp
+            group_rules = [()]
+            body = _compile_trie(_build_trie(self.rules), group_rules, ())
+            self._regex = re.compile(body, re.DOTALL) if body else None
+            self._group_rules = group_rules
+            self.backend = "regex"
+
+        self._prefix_rules = [
+            (r.pattern, rid) for rid, r in enumerate(self.rules) if r.anchor == "start"
+        ]
+
+    def match(self, text):
+        """Trả về tập rule id đã khớp với request."""
+        low = text.lower()
+        hits = set()
+
+        if self._automaton is not None:
+            for _, rids in self._automaton.iter(low):
+                hits.update(rids)
+        elif self._regex is not None:
+            group_rules = self._group_rules
+            for m in self._regex.finditer(low):
+                hits.update(group_rules[m.lastindex])
+
+        for prefix, rid in self._prefix_rules:
+            if low.startswith(prefix):
+                hits.add(rid)
+
+        return hits
+
+    def score(self, text):
+        weights = self.weights
+        return sum(weights[rid] for rid in self.match(text))
+
+    def explain(self, text):
+        """
+        Trả về (score, fired) với fired là danh sách tên rule đã khớp
+        (theo thứ tự khai báo), ví dụ ["sqli:union select", "scanning:admin"].
+        """
+        hits = sorted(self.match(text))
+        score = sum(self.weights[rid] for rid in hits)
+        return score, [self.names[rid] for rid in hits]
+
+    def score_batch(self, texts):
+        """
+        Chấm điểm cả 1 file (hoặc 1 lần rút queue) trong 1 lần gọi.
+        Trả về (scores, hits):
+        - scores: np.ndarray int32 shape [n]
+        - hits:   np.ndarray bool shape [n, số rule], hits[i, j] = rule j khớp request i
+        Dùng để lọc ngưỡng dạng vector, ví dụ: scores >= HIGH.
+        """
+        rows, cols = [], []
+        for i, text in enumerate(texts):
+            rids = self.match(text)
+            rows.extend([i] * len(rids))
+            cols.extend(rids)
+
+        hits = np.zeros((len(texts), len(self.rules)), dtype=bool)
+        if rows:
+            hits[rows, cols] = True
+
+        scores = hits.astype(np.int32) @ self.weight_vector
+        return scores, hits
+
+
+class RiskRuleWatcher:
+    """
+    Giữ RiskScorer đang dùng và tự nạp lại khi file rule pack thay đổi.
+    Rule mới được biên dịch trên thread riêng rồi mới gán vào `current`
+    (gán tham chiếu là atomic), nên worker không phải dừng và không cần lock:
+    mỗi job chỉ cần lấy `scorer = watcher.current` 1 lần rồi dùng suốt job.
+    Nếu file mới bị lỗi thì giữ nguyên bộ rule cũ.
+    """
+
+    def __init__(self, path=RULES_PATH, interval=2.0, use_automaton=True):
+        self.path = path
+        self.interval = interval
+        self.use_automaton = use_automaton
+        self._mtime = None
+        self._stop = threading.Event()
+        self.current = None
+        self.reload()
+        if self.current is None:
+            # Lần nạp đầu tiên phải thành công, không có rule thì không chấm điểm được
+            raise ValueError(f"Không nạp được rule pack: {self.path}")
+
+    def reload(self):
+        """Nạp lại rule pack nếu file đã đổi. Trả về True nếu đã swap."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            print(f"[RiskRuleWatcher] Không đọc được {self.path}: {e}")
+            return False
+        if mtime == self._mtime:
+            return False
+        # Ghi nhận mtime trước để file lỗi không bị nạp lại (và in lỗi) liên tục
+        self._mtime = mtime
+
+        try:
+            version, thresholds, rules = load_rule_pack(self.path)
+            scorer = RiskScorer(rules, self.use_automaton, version, thresholds)
+        except Exception as e:
+            print(f"[RiskRuleWatcher] Lỗi nạp {self.path}: {e}")
+            return False
+
+        old = self.current
+        self.current = scorer
+        if old is not None:
+            print(f"[RiskRuleWatcher] Rule pack v{old.version} -> v{scorer.version} ({len(scorer.rules)} rules)")
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            self.reload()
+
+    def start(self):
+        threading.Thread(target=self._watch, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
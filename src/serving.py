@@ -0,0 +1,98 @@
+import torch
+
+from src.detector import MODEL_DIR, VERDICT_CACHE_SIZE, LogBertAnalyzer, last_token_logits
+
+try:
+    import onnxruntime  # chỉ cần khi chạy bản ONNX
+except ImportError:
+    onnxruntime = None
+
+# File export nằm cạnh checkpoint gốc
+INT8_PATH = MODEL_DIR / "logbert_int8.pt"
+ONNX_PATH = MODEL_DIR / "logbert.onnx"
+
+
+class LastTokenLogits(torch.nn.Module):
+    """Bọc BertForMaskedLM: input_ids -> logits ở vị trí [MASK] cuối (đầu ra dạng tensor để trace/export)"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids):
+        return last_token_logits(self.model, input_ids)
+
+
+def quantize_int8(model):
+    """Dynamic int8: weight các lớp Linear lưu int8, activation lượng tử hóa lúc chạy"""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def export_torchscript(analyzer, out_path=INT8_PATH, quantize=True):
+    """Quantize (tùy chọn) + trace model của analyzer (bản eager) rồi lưu TorchScript"""
+    model = quantize_int8(analyzer.model) if quantize else analyzer.model
+    example = analyzer.make_input([[0] * analyzer.max_len] * 2)
+    with torch.no_grad():
+        traced = torch.jit.trace(LastTokenLogits(model).eval(), example, check_trace=False)
+    torch.jit.save(traced, str(out_path))
+    return out_path
+
+
+def export_onnx(analyzer, out_path=ONNX_PATH):
+    """Export bản fp32 sang ONNX (cần package onnx), batch động"""
+    example = analyzer.make_input([[0] * analyzer.max_len] * 2)
+    torch.onnx.export(
+        LastTokenLogits(analyzer.model).eval(),
+        (example,),
+        str(out_path),
+        input_names=["input_ids"],
+        output_names=["logits"],
+        dynamic_axes={"input_ids": {0: "batch"}, "logits": {0: "batch"}},
+        dynamo=False,
+    )
+    return out_path
+
+
+class TorchScriptLogBertAnalyzer(LogBertAnalyzer):
+    """LogBertAnalyzer chạy bản TorchScript (int8) đã export, mọi API detect giữ nguyên"""
+
+    def __init__(self, vocab_size, max_len=5, scoring="rank", model_path=INT8_PATH, cache_size=VERDICT_CACHE_SIZE):
+        super().__init__(vocab_size, max_len, scoring, model_path, cache_size)
+
+    def _load_model(self, model_path):
+        model = torch.jit.load(str(model_path), map_location=self.device)
+        model.eval()
+        return model
+
+    def _forward(self, masked_input):
+        return self._select_events(self.model(masked_input))
+
+
+class OnnxLogBertAnalyzer(LogBertAnalyzer):
+    """LogBertAnalyzer chạy bản ONNX qua onnxruntime (CPUExecutionProvider)"""
+
+    def __init__(self, vocab_size, max_len=5, scoring="rank", model_path=ONNX_PATH, cache_size=VERDICT_CACHE_SIZE):
+        if onnxruntime is None:
+            raise ImportError("Cần cài onnxruntime để chạy LogBERT bản ONNX")
+        super().__init__(vocab_size, max_len, scoring, model_path, cache_size)
+
+    def _load_model(self, model_path):
+        return onnxruntime.InferenceSession(str(model_path), providers=["CPUExecutionProvider"])
+
+    def _forward(self, masked_input):
+        logits = self.model.run(None, {"input_ids": masked_input.numpy()})[0]
+        return self._select_events(torch.from_numpy(logits))
+
+
+RUNTIMES = {
+    "eager": LogBertAnalyzer,
+    "int8": TorchScriptLogBertAnalyzer,
+    "onnx": OnnxLogBertAnalyzer,
+}
+
+
+def load_analyzer(vocab_size, runtime="eager", **kwargs):
+    """Tạo analyzer theo runtime: "eager" (checkpoint gốc), "int8" (TorchScript) hoặc "onnx" """
+    if runtime not in RUNTIMES:
+        raise ValueError(f"Runtime LogBERT không hợp lệ: {runtime} (chọn {', '.join(RUNTIMES)})")
+    return RUNTIMES[runtime](vocab_size, **kwargs)
@@ -0,0 +1,103 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Session không có request mới sau SESSION_TTL giây thì bị bỏ
+SESSION_TTL = 1800
+MAX_SESSIONS = 10000
+# Số phần tử gần nhất giữ cho mỗi session (LogBERT chỉ cần max_len + 1)
+MAX_ITEMS = 64
+
+JSESSIONID_RE = re.compile(r"JSESSIONID=([^;\s]+)", re.IGNORECASE)
+FORWARDED_RE = re.compile(r"^(?:X-Forwarded-For|X-Real-IP):\s*([^,\s]+)", re.IGNORECASE | re.MULTILINE)
+USER_AGENT_RE = re.compile(r"User-Agent:\s*(.*?)(?:\s+[A-Z][A-Za-z-]+:\s|$)", re.MULTILINE)
+
+
+def session_key(req_text, client_ip=None):
+    """
+    Khóa session của 1 request, ưu tiên lần lượt:
+    JSESSIONID trong Cookie -> IP client (tham số hoặc X-Forwarded-For / X-Real-IP) -> hash User-Agent.
+    """
+    match = JSESSIONID_RE.search(req_text)
+    if match:
+        return "sid:" + match.group(1)
+
+    if client_ip is None:
+        match = FORWARDED_RE.search(req_text)
+        client_ip = match.group(1) if match else None
+    if client_ip:
+        return "ip:" + client_ip
+
+    match = USER_AGENT_RE.search(req_text)
+    if match:
+        return "ua:" + hashlib.sha1(match.group(1).strip().encode("utf-8")).hexdigest()[:16]
+    return "anonymous"
+
+
+class Sessionizer:
+    """
+    Gom request theo session thay vì theo thứ tự trong file log (nhiều client xen kẽ nhau):
+    - Mỗi session giữ deque max_items phần tử gần nhất (request thô, EventId... tùy caller).
+    - Bộ nhớ có giới hạn: tối đa max_sessions session, session im lặng quá ttl giây bị bỏ.
+    - Session xếp theo lần hoạt động cuối (OrderedDict) nên dọn TTL / vượt giới hạn chỉ cần
+      bỏ từ đầu danh sách, không quét toàn bộ.
+    Thread-safe.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=MAX_SESSIONS, max_items=MAX_ITEMS, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_items = max_items
+        self.clock = clock
+        self._sessions = OrderedDict()  # key -> (last_seen, deque)
+        self._lock = threading.Lock()
+        self.expired = 0
+        self.evicted = 0
+
+    def add(self, req_text, item=None, client_ip=None):
+        """
+        Thêm 1 request (item mặc định là chính req_text) vào session của nó.
+        Trả về (key, list phần tử gần nhất của session, kết thúc bằng item vừa thêm).
+        """
+        key = session_key(req_text, client_ip)
+        return key, self.add_to(key, req_text if item is None else item)
+
+    def add_to(self, key, item):
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            entry = self._sessions.pop(key, None)
+            items = entry[1] if entry is not None else deque(maxlen=self.max_items)
+            items.append(item)
+            self._sessions[key] = (now, items)
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+            return list(items)
+
+    def items(self, key):
+        with self._lock:
+            entry = self._sessions.get(key)
+            return list(entry[1]) if entry is not None else []
+
+    def _expire(self, now):
+        while self._sessions:
+            key, (last_seen, _) = next(iter(self._sessions.items()))
+            if now - last_seen <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+
+    def expire(self):
+        """Dọn session hết hạn ngay (bình thường add tự dọn)"""
+        with self._lock:
+            self._expire(self.clock())
+
+    def stats(self):
+        return {
+            "sessions": len(self._sessions),
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
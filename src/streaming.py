@@ -0,0 +1,85 @@
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+# Số nguồn (host / session / file) giữ ring buffer cùng lúc, nguồn lâu không có event bị bỏ trước
+MAX_SOURCES = 10000
+
+
+class StreamingDetector:
+    """
+    LogBERT cho luồng event trực tiếp (tail log ứng dụng), thay vì đọc lại cả file mỗi lần:
+    - Mỗi nguồn giữ ring buffer max_len EventId gần nhất (deque), push 1 event là có ngay cửa sổ
+      của event đó -> tiền xử lý O(max_len) = O(1) mỗi event, không phụ thuộc độ dài lịch sử.
+    - Chấm qua batcher (InferenceBatcher / ProcessInferencePool đã start()), nên event của nhiều
+      nguồn đến gần nhau vẫn được gom chung 1 forward pass; verdict cache của analyzer vẫn áp dụng.
+    - Verdict giống hệt detect_last(toàn bộ lịch sử của nguồn) vì cửa sổ chỉ cần max_len event trước.
+    - Giới hạn max_sources nguồn (LRU), nguồn bị bỏ sẽ bắt đầu lại với lịch sử rỗng.
+    """
+
+    def __init__(self, batcher, max_sources=MAX_SOURCES, matcher=None, on_verdict=None):
+        self.batcher = batcher
+        self.max_len = batcher.analyzer.max_len
+        self.max_sources = max_sources
+        # TemplateMatcher cho push_log (log thô -> EventId)
+        self.matcher = matcher
+        # Callback(verdict) gọi khi có kết quả, ngoài Future trả về từ push
+        self.on_verdict = on_verdict
+        self._buffers = OrderedDict()  # source -> deque(maxlen=max_len)
+        self._lock = threading.Lock()
+        self.events = 0
+        self.evicted_sources = 0
+
+    def push(self, source, event_id):
+        """Thêm 1 event của source, trả về Future của verdict dict (source, event_id, is_anomalous, confidence, rank)"""
+        with self._lock:
+            buffer = self._buffers.get(source)
+            if buffer is None:
+                buffer = self._buffers[source] = deque(maxlen=self.max_len)
+                if len(self._buffers) > self.max_sources:
+                    self._buffers.popitem(last=False)
+                    self.evicted_sources += 1
+            else:
+                self._buffers.move_to_end(source)
+            window = list(buffer)
+            window.append(event_id)
+            buffer.append(event_id)
+            self.events += 1
+
+        future = Future()
+        report = self.batcher.submit(window, last_n=1)
+        report.add_done_callback(lambda done: self._resolve(done, future, source, event_id, len(window)))
+        return future
+
+    def push_log(self, source, log_string):
+        """Như push nhưng nhận request/log thô, EventId lấy qua matcher"""
+        return self.push(source, self.matcher.match(log_string)["EventId"])
+
+    def _resolve(self, done, future, source, event_id, line_id):
+        try:
+            report = done.result()
+        except Exception as e:
+            future.set_exception(e)
+            return
+
+        verdict = {"source": source, "event_id": event_id, "is_anomalous": False, "confidence": None,
+                   "rank": report["ranks"].get(line_id)}
+        for a in report["anomalies"]:
+            if a["LineId"] == line_id:
+                verdict["is_anomalous"] = True
+                verdict["confidence"] = a["Confidence"]
+        future.set_result(verdict)
+        if self.on_verdict is not None:
+            self.on_verdict(verdict)
+
+    def forget(self, source):
+        """Bỏ lịch sử của source (ví dụ file đã xoay vòng, session đã đóng)"""
+        with self._lock:
+            self._buffers.pop(source, None)
+
+    def stats(self):
+        return {
+            "events": self.events,
+            "sources": len(self._buffers),
+            "evicted_sources": self.evicted_sources,
+        }
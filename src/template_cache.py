@@ -0,0 +1,180 @@
+import atexit
+import base64
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import jsonpickle
+
+from src.masking import masker
+
+CACHE_SIZE = 8192
+
+
+class TemplateCache:
+    """
+    Cache trước Drain3: request đã mask (đúng chuỗi Drain nhìn thấy) -> cluster_id.
+    Traffic CSIC lặp lại header (User-Agent, Accept-*, Connection...) nên phần lớn request
+    sau khi mask là trùng nhau, không cần đi lại cây Drain.
+    - LRU theo thứ tự truy cập, giới hạn max_size entry.
+    - Template luôn đọc trực tiếp từ cluster, nên khi cluster được tổng quát hóa thì
+      template trả về vẫn là bản mới nhất.
+    - Drain chỉ so khớp request với cluster cùng số token. Mỗi khi Drain tạo cluster mới
+      hoặc đổi template (change_type != "none"), kết quả so khớp cũ của các request cùng
+      số token có thể đổi -> xóa toàn bộ entry cùng số token đó.
+    - Cluster bị Drain đẩy ra (max_clusters) thì entry trỏ tới nó bị coi là miss.
+    Khi hit vẫn tăng size và "chạm" cluster trong LRU của Drain giống add_log_message,
+    nên cluster_id trả về giống hệt khi không dùng cache.
+
+    Thread-safe: mask (phần tốn nhất, không có state) chạy song song ngoài lock,
+    chỉ tra cache + đi/sửa cây Drain là đi qua 1 lock ghi duy nhất.
+    Mọi thread phải đi qua object này, không gọi thẳng drain3_instance.add_log_message.
+
+    Nếu miner có persistence_handler: sau start_snapshots(), state chỉ được đánh dấu "dirty"
+    trên hot path, thread nền mới là nơi serialize + nén + ghi file (không chặn request).
+    """
+
+    def __init__(self, miner, max_size=CACHE_SIZE):
+        self.miner = miner
+        self.max_size = max_size
+        self._entries = OrderedDict()  # masked -> (cluster_id, token_count)
+        self._by_length = {}           # token_count -> set(masked)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+        self._snapshot_thread = None
+
+    def add_log_message(self, log_string):
+        """Thay cho miner.add_log_message, trả về dict cùng định dạng."""
+        # Masker dùng chung với dữ liệu train (URL decode + [MASKING] drain3.ini), không dùng masker riêng của drain3
+        masked = masker.mask(log_string)
+        with self._lock:
+            return self._add_masked(masked)
+
+    def _add_masked(self, masked):
+        miner = self.miner
+        drain = miner.drain
+
+        self._dirty = True
+        entry = self._entries.get(masked)
+        if entry is not None:
+            cluster = drain.id_to_cluster.get(entry[0])
+            if cluster is not None:
+                self._entries.move_to_end(masked)
+                self.hits += 1
+                cluster.size += 1
+                # Chạm cluster để LRU của Drain cập nhật giống như khi add_log_message
+                drain.id_to_cluster[cluster.cluster_id]
+                return {
+                    "change_type": "none",
+                    "cluster_id": cluster.cluster_id,
+                    "cluster_size": cluster.size,
+                    "template_mined": cluster.get_template(),
+                    "cluster_count": len(drain.clusters),
+                }
+            self._remove(masked)
+
+        self.misses += 1
+        # Gọi thẳng Drain với chuỗi đã mask (tránh mask lần 2 trong miner.add_log_message)
+        cluster, change_type = drain.add_log_message(masked)
+        token_count = len(drain.get_content_as_tokens(masked))
+
+        if change_type != "none":
+            self._invalidate_length(token_count)
+
+        if miner.persistence_handler is not None and self._snapshot_thread is None:
+            # Chưa bật snapshot nền -> giữ cách lưu đồng bộ của drain3
+            snapshot_reason = miner.get_snapshot_reason(change_type, cluster.cluster_id)
+            if snapshot_reason:
+                miner.save_state(snapshot_reason)
+                miner.last_save_time = time.time()
+
+        self._entries[masked] = (cluster.cluster_id, token_count)
+        self._by_length.setdefault(token_count, set()).add(masked)
+        if len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+        return {
+            "change_type": change_type,
+            "cluster_id": cluster.cluster_id,
+            "cluster_size": cluster.size,
+            "template_mined": cluster.get_template(),
+            "cluster_count": len(drain.clusters),
+        }
+
+    def _remove(self, masked):
+        _, token_count = self._entries.pop(masked)
+        keys = self._by_length[token_count]
+        keys.discard(masked)
+        if not keys:
+            del self._by_length[token_count]
+
+    def _invalidate_length(self, token_count):
+        keys = self._by_length.pop(token_count, ())
+        for masked in keys:
+            del self._entries[masked]
+        self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_length.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "invalidations": self.invalidations,
+            "size": len(self._entries),
+        }
+
+    # ================= SNAPSHOT NỀN =================
+    def snapshot(self):
+        """
+        Ghi state Drain3 nếu đã đổi từ lần ghi trước. Trả về số bytes đã ghi (0 nếu không ghi).
+        Chỉ giữ lock lúc serialize cây (cần state nhất quán); nén + ghi file chạy ngoài lock.
+        """
+        miner = self.miner
+        if miner.persistence_handler is None or not self._dirty:
+            return 0
+
+        with self._lock:
+            state = jsonpickle.dumps(miner.drain, keys=True).encode("utf-8")
+            self._dirty = False
+
+        if miner.config.snapshot_compress_state:
+            state = base64.b64encode(zlib.compress(state))
+        miner.persistence_handler.save_state(state)
+        miner.last_save_time = time.time()
+        return len(state)
+
+    def _snapshot_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.snapshot()
+            except Exception as e:
+                print(f"[TemplateCache] Lỗi ghi snapshot Drain3: {e}")
+
+    def start_snapshots(self, interval=None):
+        """
+        Bật thread ghi snapshot định kỳ (mặc định theo snapshot_interval_minutes trong drain3.ini)
+        và ghi lần cuối khi thoát chương trình.
+        """
+        if self.miner.persistence_handler is None or self._snapshot_thread is not None:
+            return self
+        if interval is None:
+            interval = self.miner.config.snapshot_interval_minutes * 60
+        self._snapshot_thread = threading.Thread(target=self._snapshot_loop, args=(interval,), daemon=True)
+        self._snapshot_thread.start()
+        atexit.register(self.snapshot)
+        return self
+
+    def stop_snapshots(self):
+        self._stop.set()
+        self.snapshot()
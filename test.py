@@ -1,13 +1,9 @@
-import urllib
-import urllib.parse
-from models.drain3_instance import drain3_instance
+from src.masking import masker
 
 
 def preprocess_log(log_string):
     try:
-        log_string = urllib.parse.unquote(log_string)
-        log_string = drain3_instance.masker.mask(log_string)
-        return log_string
+        return masker.mask(log_string)
     except Exception as e:
         print(f"Lỗi khi xử lý log: {e}")
         return log_string
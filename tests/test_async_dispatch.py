@@ -0,0 +1,115 @@
+import asyncio
+import os
+import shutil
+import sys
+import threading
+import time
+
+import pytest
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ANALYZER_DIR = os.path.join(ROOT_DIR, "demo", "v7_only_ai")
+for path in (ROOT_DIR, ANALYZER_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from src.llm_cache import LlmVerdictCache
+
+REQUESTS = [
+    ("SAFE|", "GET http://localhost:8080/tienda1/index.jsp HTTP/1.1\nHost: localhost:8080\nConnection: close"),
+    ("SAFE|", "GET http://localhost:8080/tienda1/publico/productos.jsp?id=2 HTTP/1.1\nHost: localhost:8080"),
+    ("MALICIOUS|", "GET http://localhost:8080/tienda1/publico/anadir.jsp?id=2&cantidad=%27 HTTP/1.1\nHost: localhost:8080"),
+    ("SAFE|", "GET http://localhost:8080/tienda1/index.jsp HTTP/1.1\nHost: localhost:8080\nConnection: close"),
+]
+
+
+class StubAsyncClient:
+    """Thay AsyncServiceClient (không cần aiohttp): luôn trả lời " safe", đếm số lần gọi"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def post(self, srv, payload):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return 200, {"results": [{"text": " safe"}]}, 0.01
+
+
+class ThreadRecordingCache(LlmVerdictCache):
+    """Ghi lại thread gọi get/put để kiểm tra cache (có thể là sqlite) không chạy trên event loop"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threads = set()
+
+    def get(self, key):
+        self.threads.add(threading.get_ident())
+        return super().get(key)
+
+    def put(self, key, label, latency):
+        self.threads.add(threading.get_ident())
+        super().put(key, label, latency)
+
+
+@pytest.fixture(scope="module")
+def analyzer(tmp_path_factory):
+    log_dir = os.path.join(ROOT_DIR, "logs")
+    created = not os.path.exists(log_dir)
+    os.environ["LOG_FOLDER"] = str(tmp_path_factory.mktemp("log_folder"))
+    os.environ["LLM_DISPATCH"] = "async"
+    import analyzer as module
+
+    yield module
+    if created:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop, thread
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def wait_for_queue(queue, timeout=30):
+    deadline = time.time() + timeout
+    while queue.unfinished_tasks and time.time() < deadline:
+        time.sleep(0.01)
+    return queue.unfinished_tasks == 0
+
+
+def test_dispatch_against_stub_client(analyzer, loop, tmp_path, monkeypatch):
+    loop, loop_thread = loop
+    client = StubAsyncClient()
+    cache = ThreadRecordingCache(path=tmp_path / "llm_verdicts.sqlite")
+    monkeypatch.setattr(analyzer, "async_llm_client", client)
+    monkeypatch.setattr(analyzer, "llm_verdict_cache", cache)
+    for name in ("FN_PATH", "FP_PATH", "UNK_PATH"):
+        monkeypatch.setattr(analyzer, name, str(tmp_path / f"{name}.txt"))
+
+    log_file = tmp_path / "a.txt"
+    reqs = [f"{label}\n{req}" for label, req in REQUESTS]
+    log_file.write_text("\n".join(reqs), encoding="utf-8")
+    total_before = analyzer.stats_l1["total"]
+
+    threading.Thread(
+        target=analyzer.async_dispatcher, args=(loop, threading.Semaphore(8)), daemon=True
+    ).start()
+
+    def dispatch_round():
+        for i, req in enumerate(reqs):
+            analyzer.job_queue.put({"file": log_file.name, "path": str(log_file), "request": req, "index": i, "all_request": reqs})
+        assert wait_for_queue(analyzer.job_queue)
+        return client.calls
+
+    first_round = dispatch_round()
+    assert first_round > 0
+    # Lượt 2 lấy verdict từ cache, không gọi LLM lại
+    assert dispatch_round() == first_round
+    assert analyzer.stats_l1["total"] - total_before == 2 * len(reqs)
+    assert cache.threads and loop_thread.ident not in cache.threads
+    cache.close()
@@ -0,0 +1,95 @@
+import importlib.util
+import os
+import sys
+import urllib.parse
+
+import pytest
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from drain3 import TemplateMiner
+from drain3.file_persistence import FilePersistence
+from drain3.template_miner_config import TemplateMinerConfig
+
+from src.masking import CONFIG_PATH, masker
+from src.parser import TemplateMatcher
+from src.template_cache import TemplateCache
+
+# Request có tham số URL-encode (drain3 masker không tự decode) và request nhiều dòng có query ở cuối dòng đầu
+# (rule SAFE_VAL neo "$" chỉ được khớp ở cuối cả request, như lúc train)
+RAW_REQUESTS = [
+    "GET http://localhost:8080/tienda1/publico/anadir.jsp?id=3&nombre=Jam%F3n+Ib%E9rico&precio=85&cantidad=4"
+    "&B1=A%F1adir+al+carrito HTTP/1.1 Host: localhost:8080 Cookie: JSESSIONID=EA414B3E327DED6875848530C864BD8F",
+    "GET http://localhost:8080/tienda1/publico/anadir.jsp?id=2&nombre=Queso+Manchego&precio=39&cantidad=1"
+    "&B1=A%F1adir+al+carrito HTTP/1.1 Host: localhost:8080 Cookie: JSESSIONID=81C6F5A3D0B1E2947A3C5D6E7F801234",
+    "POST http://localhost:8080/tienda1/publico/autenticar.jsp HTTP/1.1 Host: localhost:8080"
+    " Content-Type: application/x-www-form-urlencoded Content-Length: 68"
+    " modo=entrar&login=grimshaw&pwd=%27+or+%271%27%3D%271&remember=off&B1=Entrar",
+    "GET /tienda1/publico/anadir.jsp?id=3&cantidad=4\nHost: localhost:8080",
+    "GET http://localhost:8080/tienda1/publico/pagar.jsp?modo=insertar&precio=1764&B1=Confirmar\r\n"
+    "User-Agent: Mozilla/5.0 (compatible; Konqueror/3.5; Linux) KHTML/3.5.8 (like Gecko)\r\n"
+    "Host: localhost:8080\r\nCookie: JSESSIONID=B92A8B48B9008CD29F622A994E0F650D\r\nConnection: close",
+]
+
+
+def load_preprocess_log():
+    # parsing/preprocess-log.py có dấu "-" trong tên nên không import thường được
+    spec = importlib.util.spec_from_file_location("preprocess_log", os.path.join(ROOT_DIR, "parsing", "preprocess-log.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.preprocess_log
+
+
+def reference_mask(miner, raw):
+    """preprocess-log.py lúc tạo drain3_state.bin + vocab LogBERT: drain3 masker trên cả request đã unquote"""
+    return miner.masker.mask(urllib.parse.unquote(raw))
+
+
+def new_miner(state_path):
+    config = TemplateMinerConfig()
+    config.load(str(CONFIG_PATH))
+    config.profiling_enabled = False
+    return TemplateMiner(FilePersistence(str(state_path)), config)
+
+
+@pytest.fixture
+def trained(tmp_path):
+    """Train như lúc tạo dữ liệu LogBERT: mask theo reference rồi đưa thẳng vào Drain3 (không mask lại)"""
+    state_path = tmp_path / "drain3_state.bin"
+    miner = new_miner(state_path)
+    templates = []
+    for raw in RAW_REQUESTS:
+        result = miner.drain.add_log_message(reference_mask(miner, raw))[0]
+        templates.append((result.cluster_id, result.get_template()))
+    miner.save_state("test")
+    final = [(cid, miner.drain.id_to_cluster[cid].get_template()) for cid, _ in templates]
+    return state_path, templates, final
+
+
+@pytest.mark.parametrize("raw", RAW_REQUESTS)
+def test_masker_matches_drain3_reference(raw, tmp_path):
+    miner = new_miner(tmp_path / "state.bin")
+    expected = reference_mask(miner, raw)
+    assert masker.mask(raw) == expected
+    # Script tạo dữ liệu train hiện tại cũng phải ra đúng chuỗi đó
+    assert load_preprocess_log()(raw) == expected
+
+
+def test_template_cache_matches_training(trained, tmp_path):
+    _, expected, _ = trained
+    cache = TemplateCache(new_miner(tmp_path / "live_state.bin"))
+    got = []
+    for raw in RAW_REQUESTS:
+        result = cache.add_log_message(raw)
+        got.append((result["cluster_id"], result["template_mined"]))
+    assert got == expected
+
+
+def test_template_matcher_matches_training(trained):
+    # Snapshot đã đóng băng -> so với template cuối cùng sau khi train
+    state_path, _, expected = trained
+    matcher = TemplateMatcher(unknown_event_id=-1, state_path=state_path)
+    got = [(r["EventId"], r["EventTemplate"]) for r in map(matcher.match, RAW_REQUESTS)]
+    assert got == expected